@@ -15,14 +15,10 @@ import csv
 from django.http import HttpResponse
 from django.utils.encoding import smart_str
 
-from utils.mikrotik_userman import init_mikrotik_manager
-from utils.data_preparation import prepare_user_data
-
 from appshere.billings.models import UserProfile, Profile, Payment, Session
-from .models import User, UserUsage, Organization, Dashboard
-
-# Initialize MikroTikUserManager
-mikrotik_manager = init_mikrotik_manager()
+from appshere.billings.push_jobs import start_push_job
+from .forms import NasForm
+from .models import User, UserUsage, Organization, Dashboard, Nas
 
 logger = logging.getLogger(__name__)
 
@@ -279,30 +275,8 @@ class UserAdmin(MultitenantAdminMixin, BaseUserAdmin):
     readonly_fields = ['mikrotik_id', 'last_login', 'date_joined', 'modified']
     
     def sync_user_to_mikrotik(self, request, queryset):
-        """Sync selected users with MikroTik."""
-        for obj in queryset:
-            try:
-                # Prepare user data using the prepare_user_data function
-                user_data = prepare_user_data(obj)
-                # Check if user exists in MikroTik
-                existing_user = next(
-                    (u for u in mikrotik_manager.get_users() if u['name'] == obj.username), None
-                )
-                # If user exists, update the user
-                if existing_user:
-                    mikrotik_manager.update_user(
-                        user_id=existing_user['.id'],  # Pass the existing user ID
-                        user_data=user_data  # Pass all user data in a dictionary
-                    )
-                    self.message_user(request, f"User '{obj.username}' updated in MikroTik UserManager.")
-                # If user doesn't exist, create a new user
-                else:
-                    mikrotik_manager.create_user(
-                        user_data=user_data  # Pass all user data in a dictionary
-                    )
-                    self.message_user(request, f"User '{obj.username}' created in MikroTik UserManager.")
-            except Exception as e:
-                self.message_user(request, f"Error syncing user '{obj.username}' with MikroTik UserManager: {e}", level='error')
+        """Push selected users to MikroTik in a background job."""
+        start_push_job(self, request, queryset)
 
     sync_user_to_mikrotik.short_description = "Sync selected users to MikroTik"
 
@@ -351,12 +325,27 @@ class UserAdmin(MultitenantAdminMixin, BaseUserAdmin):
 
 
 class UserUsageAdmin(MultitenantAdminMixin, admin.ModelAdmin):
-    list_display = ('mikrotik_id', 'user', 'formatted_user_download', 'formatted_user_upload', 'formatted_user_traffic', 'total_uptime', 'created', 'organization__slug')
+    list_display = ('mikrotik_id', 'user', 'formatted_user_download', 'formatted_user_upload', 'formatted_user_traffic', 'formatted_user_uptime', 'created', 'organization__slug')
     list_filter = ('created',)
     search_fields = ('user',)
     ordering = ('-created',)
     date_hierarchy = 'created'
-    readonly_fields = ('mikrotik_id', 'user', 'created', 'modified', 'formatted_user_download', 'formatted_user_upload', 'formatted_user_traffic', 'total_uptime', 'organization', 'active_sessions', 'active_sub_sessions', 'attributes_details')
+    readonly_fields = ('mikrotik_id', 'user', 'created', 'modified', 'formatted_user_download', 'formatted_user_upload', 'formatted_user_traffic', 'formatted_user_uptime', 'organization', 'active_sessions', 'active_sub_sessions', 'attributes_details')
+
+
+class NasAdmin(MultitenantAdminMixin, admin.ModelAdmin):
+    form = NasForm
+    list_display = ('name', 'short_name', 'type', 'api_url', 'sync_enabled', 'organization__slug')
+    search_fields = ('name', 'short_name', 'api_url')
+    list_filter = ('sync_enabled', 'type')
+    readonly_fields = ('created', 'modified')
+
+    fieldsets = (
+        (None, {'fields': ('organization', 'name', 'short_name', 'type', 'ports', 'secret', 'server', 'community')}),
+        (_('MikroTik API'), {'fields': ('api_url', 'api_username', 'api_password', 'sync_enabled')}),
+        (_('Details'), {'fields': ('description', 'gps_location', 'notes')}),
+        (_('Dates'), {'fields': ('created', 'modified')}),
+    )
 
 
 # Register models
@@ -364,6 +353,7 @@ admin.site.register(Organization, OrganizationAdmin)
 admin.site.register(Dashboard, DashboardAdmin) 
 admin.site.register(User, UserAdmin)
 admin.site.register(UserUsage, UserUsageAdmin)
+admin.site.register(Nas, NasAdmin)
 admin.site.register(admin.models.LogEntry, CacheAdmin)
 
 
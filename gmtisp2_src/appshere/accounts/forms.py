@@ -2,6 +2,7 @@
 
 from django import forms
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
+from django.utils.translation import gettext_lazy as _
 from .models import User, Organization, Nas
 from django_recaptcha.fields import ReCaptchaField
 
@@ -38,4 +39,16 @@ class NasForm(forms.ModelForm):
         fields = '__all__'
         widgets = {
             'notes': forms.Textarea(attrs={'rows': 5}),
-        }
\ No newline at end of file
+            # never echo the stored password back into the page
+            'api_password': forms.PasswordInput(render_value=False),
+        }
+        help_texts = {
+            'api_password': _('Leave empty to keep the current password.'),
+        }
+
+    def clean_api_password(self):
+        password = self.cleaned_data.get('api_password')
+        if not password and self.instance.pk:
+            # the field is rendered empty, so a blank submission keeps the stored value
+            return self.instance.api_password
+        return password
\ No newline at end of file
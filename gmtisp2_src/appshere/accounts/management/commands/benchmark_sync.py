@@ -0,0 +1,105 @@
+# mpi_src/usermanager/management/commands/benchmark_sync.py
+
+import logging
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from appshere.billings.routers import clear_router_managers
+from appshere.billings.scheduler import SYNC_STAGES
+from appshere.billings.tasks import sync_router_step
+from utils.mikrotik_fake import FakeRouter, FakeRouterAdapter
+
+logger = logging.getLogger(__name__)
+
+# Router address used while benchmarking, so the real router's cached snapshots and breaker are untouched
+FAKE_ROUTER_IP = 'http://fake-router.invalid'
+
+
+class Command(BaseCommand):
+    help = (
+        'Time a full MikroTik -> Django sync, step by step, against a fake router with synthesized '
+        'or replayed data. Every database change is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subscribers', type=int, nargs='+', default=[1000, 10000, 100000],
+                            help='Subscriber counts to benchmark (default: 1000 10000 100000)')
+        parser.add_argument('--sessions-per-user', type=int, default=3)
+        parser.add_argument('--replay', help='Recording made with RecordingAdapter to serve instead of synthesized data')
+        parser.add_argument('--latency', type=float, default=0, help='Router latency per request, in milliseconds')
+        parser.add_argument('--jitter', type=float, default=0, help='Random extra latency per request, in milliseconds')
+        parser.add_argument('--error-rate', type=float, default=0, help='Fraction of router requests that fail')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if options['replay']:
+            try:
+                routers = [('replay', FakeRouter.load(options['replay']))]
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot load recording {options['replay']}: {e}")
+        else:
+            routers = (
+                (f'{count} subscribers', lambda count=count: FakeRouter().synthesize(
+                    users=count, sessions_per_user=options['sessions_per_user'], seed=options['seed'],
+                ))
+                for count in options['subscribers']
+            )
+
+        for label, router in routers:
+            router = router() if callable(router) else router
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f"{label}: {len(router.rows['user'])} users, {len(router.rows['session'])} sessions"
+            ))
+            self.report(self.run_sync(router, options))
+
+    def run_sync(self, router, options):
+        """Run every sync step once, as the sync DAG would, returning (step, seconds, queries, calls, errors) rows."""
+        adapter = FakeRouterAdapter(
+            router,
+            latency=options['latency'] / 1000,
+            jitter=options['jitter'] / 1000,
+            error_rate=options['error_rate'],
+            seed=options['seed'],
+        )
+        results = []
+        with override_settings(ROUTER_IP=FAKE_ROUTER_IP, MIKROTIK_TRANSPORT_ADAPTER=lambda: adapter):
+            clear_router_managers()
+            try:
+                with transaction.atomic():
+                    for stage in SYNC_STAGES:
+                        stage_results = []
+                        for step in stage:
+                            calls = adapter.requests
+                            start = time.monotonic()
+                            with CaptureQueriesContext(connection) as queries:
+                                outcome = sync_router_step(None, step, full=True)
+                            stage_results.append((
+                                step, time.monotonic() - start, len(queries), adapter.requests - calls, outcome['errors'],
+                            ))
+                        results.append(stage_results)
+                    transaction.set_rollback(True)
+            finally:
+                clear_router_managers()
+        return results
+
+    def report(self, results):
+        self.stdout.write(f"  {'step':<16}{'seconds':>10}{'queries':>10}{'calls':>10}")
+        total = critical_path = 0
+        for stage_results in results:
+            for step, seconds, queries, calls, errors in stage_results:
+                self.stdout.write(f"  {step:<16}{seconds:>10.3f}{queries:>10}{calls:>10}")
+                for name, error in errors.items():
+                    self.stdout.write(self.style.ERROR(f"    {name} failed: {error}"))
+                total += seconds
+            # steps of a stage run in parallel in production
+            critical_path += max((seconds for _, seconds, *_ in stage_results), default=0)
+        self.stdout.write(self.style.SUCCESS(
+            f"  total {total:.3f}s sequential, {critical_path:.3f}s with parallel steps"
+        ))
+
+
+# Usage:
+# python manage.py benchmark_sync --subscribers 1000 10000 --latency 20
+# python manage.py benchmark_sync --replay router-recording.json
@@ -0,0 +1,39 @@
+# mpi_src/usermanager/management/commands/record_mikrotik.py
+
+import logging
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from utils.mikrotik_fake import RecordingAdapter
+from utils.mikrotik_userman import MikroTikError, MikroTikUserManager, transport_settings
+
+logger = logging.getLogger(__name__)
+
+LISTINGS = ['get_users', 'get_profiles', 'get_limitations', 'get_user_profiles', 'get_profile_limitations', 'get_payments', 'get_sessions']
+
+
+class Command(BaseCommand):
+    help = 'Record the MikroTik router listings to a JSON file, to be replayed with benchmark_sync --replay'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', type=str, help='Path of the recording to write')
+
+    def handle(self, *args, **options):
+        adapter = RecordingAdapter()
+        mikrotik_manager = MikroTikUserManager(
+            settings.ROUTER_IP, settings.ROUTER_USERNAME, settings.ROUTER_PASSWORD,
+            **{**transport_settings(), 'adapter': adapter},
+        )
+        for listing in LISTINGS:
+            try:
+                getattr(mikrotik_manager, listing)()
+            except MikroTikError as e:
+                logger.warning(f"Could not record {listing}: {e}")
+                self.stdout.write(self.style.WARNING(f"Could not record {listing}: {e}"))
+        adapter.save(options['output'])
+        recorded = ', '.join(f'{len(rows)} {resource}' for resource, rows in adapter.recording.items())
+        self.stdout.write(self.style.SUCCESS(f"Recorded {recorded} to {options['output']}"))
+
+
+# Usage:
+# python manage.py record_mikrotik router-recording.json
@@ -6,6 +6,11 @@ from django.db import transaction
 
 from accounts.models import User
 from billings.models import  Profile, UserProfile, Session
+from billings.outbound import sync_origin
+from billings.quotas import record_sessions
+from billings.sync import refresh_daily_usage
+from utils.durations import parse_duration
+from utils.metrics import parse_router_datetime
 from utils.mikrotik_userman import init_mikrotik_manager
 
 logger = logging.getLogger(__name__)
@@ -19,10 +24,12 @@ class Command(BaseCommand):
     def handle(self, *args, **kwargs):
         """Handles the command to sync MikroTik data."""
         try:
-            self.sync_users(mikrotik_manager)
-            self.sync_profiles(mikrotik_manager)
-            self.sync_user_profiles(mikrotik_manager)
-            self.sync_sessions(mikrotik_manager)
+            # Rows pulled from the router must not be pushed back to it
+            with sync_origin():
+                self.sync_users(mikrotik_manager)
+                self.sync_profiles(mikrotik_manager)
+                self.sync_user_profiles(mikrotik_manager)
+                self.sync_sessions(mikrotik_manager)
         except Exception as e:
             logger.error(f"Error syncing data: {e}")
             self.stdout.write(self.style.ERROR(f"Error syncing data: {e}"))
@@ -38,6 +45,7 @@ class Command(BaseCommand):
                 for mt_user in mikrotik_users:
                     user, created = User.objects.update_or_create(
                         username=mt_user['name'],
+                        nas__isnull=True,
                         defaults={
                             'group': mt_user['group'],
                             'disabled': mt_user['disabled'] == 'true',
@@ -63,8 +71,10 @@ class Command(BaseCommand):
             with transaction.atomic():
                 mikrotik_profiles = mikrotik_manager.get_profiles()
                 for mt_profile in mikrotik_profiles:
+                    # this command syncs the router from settings, whose rows are not tagged with a NAS
                     profile, created = Profile.objects.update_or_create(
                         name=mt_profile['name'],
+                        nas__isnull=True,
                         defaults={
                             'name_for_users': mt_profile.get('name-for-users', ''),
                             'price': mt_profile.get('price', '0.00'),
@@ -90,8 +100,8 @@ class Command(BaseCommand):
             with transaction.atomic():
                 mikrotik_user_profiles = mikrotik_manager.get_user_profiles()
                 for mt_user_profile in mikrotik_user_profiles:
-                    user = User.objects.filter(username=mt_user_profile['user']).first()
-                    profile = Profile.objects.filter(name=mt_user_profile['profile']).first()
+                    user = User.objects.filter(username=mt_user_profile['user'], nas__isnull=True).first()
+                    profile = Profile.objects.filter(name=mt_user_profile['profile'], nas__isnull=True).first()
 
                     if not user or not profile:
                         logger.warning(f"Skipping user profile sync: user '{mt_user_profile['user']}' or profile '{mt_user_profile['profile']}' not found.")
@@ -102,7 +112,7 @@ class Command(BaseCommand):
                         user=user,
                         profile=profile,
                         state=mt_user_profile.get('state'),
-                        end_time=mt_user_profile.get('end-time', 'unlimited')
+                        end_time=parse_router_datetime(mt_user_profile.get('end-time'))
                     )
 
                     if created:
@@ -110,7 +120,7 @@ class Command(BaseCommand):
                         self.stdout.write(self.style.SUCCESS(f'Created new user profile for user: {user.username} with profile: {profile.name}'))
                     else:
                         user_profile.state = mt_user_profile.get('state')
-                        user_profile.end_time = mt_user_profile.get('end-time', 'unlimited')
+                        user_profile.end_time = parse_router_datetime(mt_user_profile.get('end-time'))
                         user_profile.save()
                         logger.info(f'Updated user profile for user: {user.username} with profile: {profile.name}')
                         self.stdout.write(self.style.SUCCESS(f'Updated user profile for user: {user.username} with profile: {profile.name}'))
@@ -124,8 +134,10 @@ class Command(BaseCommand):
         try:
             with transaction.atomic():
                 mikrotik_sessions = mikrotik_manager.get_sessions()
+                synced = []
+                new_sessions = []
                 for mt_session in mikrotik_sessions:
-                    user = User.objects.filter(username=mt_session['user']).first()
+                    user = User.objects.filter(username=mt_session['user'], nas__isnull=True).first()
                     if not user:
                         logger.warning(f"User '{mt_session['user']}' not found. Skipping session '{mt_session['acct-session-id']}'")
                         self.stdout.write(self.style.WARNING(f"User '{mt_session['user']}' not found. Skipping session '{mt_session['acct-session-id']}'"))
@@ -139,25 +151,30 @@ class Command(BaseCommand):
                         'calling_station_id': mt_session.get('calling-station-id'),
                         'download': int(mt_session.get('download', 0)),
                         'upload': int(mt_session.get('upload', 0)),
-                        'uptime': mt_session.get('uptime'),
+                        'uptime': parse_duration(mt_session.get('uptime')),
                         'status': mt_session.get('status'),
-                        'started': mt_session.get('started'),
-                        'ended': mt_session.get('ended', None),
+                        'started': parse_router_datetime(mt_session.get('started')),
+                        'ended': parse_router_datetime(mt_session.get('ended')),
                         'terminate_cause': mt_session.get('terminate-cause', None),
                         'user_address': mt_session.get('user-address')
                     }
 
                     session, created = Session.objects.update_or_create(
                         session_id=mt_session['acct-session-id'],
+                        nas__isnull=True,
                         defaults=session_defaults
                     )
+                    synced.append(session)
 
                     if created:
+                        new_sessions.append(session)
                         logger.info(f'Created new session: {session.session_id}')
                         self.stdout.write(self.style.SUCCESS(f'Created new session: {session.session_id}'))
                     else:
                         logger.info(f'Updated session: {session.session_id}')
                         self.stdout.write(self.style.SUCCESS(f'Updated session: {session.session_id}'))
+                refresh_daily_usage(synced)
+                record_sessions(synced, new_sessions)
         except Exception as e:
             logger.error(f"Error syncing sessions: {e}", exc_info=True)
             self.stdout.write(self.style.ERROR(f"Error syncing sessions: {e}"))
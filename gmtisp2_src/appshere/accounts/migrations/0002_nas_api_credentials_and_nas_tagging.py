@@ -0,0 +1,97 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:02
+
+import django.contrib.auth.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='nas',
+            name='api_url',
+            field=models.CharField(blank=True, default='', help_text='RouterOS REST base URL, e.g. http://10.0.0.1', max_length=256, verbose_name='API URL'),
+        ),
+        migrations.AddField(
+            model_name='nas',
+            name='api_username',
+            field=models.CharField(blank=True, default='', max_length=67, verbose_name='API username'),
+        ),
+        migrations.AddField(
+            model_name='nas',
+            name='api_password',
+            field=models.CharField(blank=True, default='', max_length=256, verbose_name='API password'),
+        ),
+        migrations.AddField(
+            model_name='nas',
+            name='sync_enabled',
+            field=models.BooleanField(default=True, help_text='Pull users, profiles and sessions from this router', verbose_name='sync enabled'),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='nas',
+            field=models.ForeignKey(blank=True, help_text='Router this user was synced from', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='user_nas', to='accounts.nas'),
+        ),
+        migrations.AddField(
+            model_name='userusage',
+            name='nas',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='userusage_nas', to='accounts.nas'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='mikrotik_id',
+            field=models.CharField(blank=True, max_length=67, null=True),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='username',
+            field=models.CharField(db_index=True, help_text='Required. 150 characters or fewer. Letters, digits and @/./+/-/_ only.', max_length=150, validators=[django.contrib.auth.validators.UnicodeUsernameValidator()], verbose_name='username'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='name',
+            field=models.CharField(blank=True, db_index=True, max_length=67, null=True, verbose_name='name'),
+        ),
+        migrations.AlterField(
+            model_name='userusage',
+            name='mikrotik_id',
+            field=models.CharField(blank=True, max_length=67, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(fields=('nas', 'mikrotik_id'), name='user_unique_nas_mikrotik_id'),
+        ),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(condition=models.Q(('nas__isnull', True)), fields=('mikrotik_id',), name='user_unique_mikrotik_id'),
+        ),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(fields=('nas', 'username'), name='user_unique_nas_username'),
+        ),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(condition=models.Q(('nas__isnull', True)), fields=('username',), name='user_unique_username'),
+        ),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(fields=('nas', 'name'), name='user_unique_nas_name'),
+        ),
+        migrations.AddConstraint(
+            model_name='user',
+            constraint=models.UniqueConstraint(condition=models.Q(('nas__isnull', True)), fields=('name',), name='user_unique_name'),
+        ),
+        migrations.AddConstraint(
+            model_name='userusage',
+            constraint=models.UniqueConstraint(fields=('nas', 'mikrotik_id'), name='userusage_unique_nas_mikrotik_id'),
+        ),
+        migrations.AddConstraint(
+            model_name='userusage',
+            constraint=models.UniqueConstraint(condition=models.Q(('nas__isnull', True)), fields=('mikrotik_id',), name='userusage_unique_mikrotik_id'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_nas_api_credentials_and_nas_tagging'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='sync_hash',
+            field=models.CharField(blank=True, editable=False, help_text='Hash of the last payload synced from MikroTik', max_length=40, null=True, verbose_name='sync hash'),
+        ),
+        migrations.AddField(
+            model_name='userusage',
+            name='sync_hash',
+            field=models.CharField(blank=True, editable=False, help_text='Hash of the last payload synced from MikroTik', max_length=40, null=True, verbose_name='sync hash'),
+        ),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 5.1.4 on 2026-10-18 15:12
+
+import re
+
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+UPTIME_UNITS = {'w': 604800, 'd': 86400, 'h': 3600, 'm': 60, 's': 1}
+
+# old text field -> numeric field it is converted into
+COUNTERS = {
+    'active_sessions': 'active_sessions_count',
+    'active_sub_sessions': 'active_sub_sessions_count',
+    'total_download': 'total_download_bytes',
+    'total_upload': 'total_upload_bytes',
+}
+
+
+def to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def to_seconds(value):
+    # RouterOS durations such as '1d2h3m4s'; kept local so later changes to the app code don't alter this migration
+    return sum(int(number) * UPTIME_UNITS[unit] for number, unit in re.findall(r'(\d+)([wdhms])', value or ''))
+
+
+def to_duration(seconds):
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f'{hours}h{minutes}m{seconds}s'
+
+
+def convert(apps, schema_editor, forward):
+    UserUsage = apps.get_model('accounts', 'UserUsage')
+    fields = [*COUNTERS, *COUNTERS.values(), 'total_uptime', 'total_uptime_seconds']
+    written = [*COUNTERS.values(), 'total_uptime_seconds'] if forward else [*COUNTERS, 'total_uptime']
+    batch = []
+    for usage in UserUsage.objects.order_by().only('pk', *fields).iterator(chunk_size=BATCH_SIZE):
+        for old, new in COUNTERS.items():
+            if forward:
+                setattr(usage, new, to_int(getattr(usage, old)))
+            else:
+                setattr(usage, old, str(getattr(usage, new)))
+        if forward:
+            usage.total_uptime_seconds = to_seconds(usage.total_uptime)
+        else:
+            usage.total_uptime = to_duration(usage.total_uptime_seconds)
+        batch.append(usage)
+        if len(batch) == BATCH_SIZE:
+            UserUsage.objects.bulk_update(batch, written)
+            batch = []
+    if batch:
+        UserUsage.objects.bulk_update(batch, written)
+
+
+def forwards(apps, schema_editor):
+    convert(apps, schema_editor, forward=True)
+
+
+def backwards(apps, schema_editor):
+    convert(apps, schema_editor, forward=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_sync_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userusage',
+            name='active_sessions_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userusage',
+            name='active_sub_sessions_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userusage',
+            name='total_download_bytes',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userusage',
+            name='total_upload_bytes',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userusage',
+            name='total_uptime_seconds',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(forwards, backwards),
+    ]
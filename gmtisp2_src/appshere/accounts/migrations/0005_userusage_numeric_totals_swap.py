@@ -0,0 +1,73 @@
+# Generated by Django 5.1.4 on 2026-10-18 15:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_userusage_numeric_totals'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='userusage',
+            name='active_sessions',
+        ),
+        migrations.RemoveField(
+            model_name='userusage',
+            name='active_sub_sessions',
+        ),
+        migrations.RemoveField(
+            model_name='userusage',
+            name='total_download',
+        ),
+        migrations.RemoveField(
+            model_name='userusage',
+            name='total_upload',
+        ),
+        migrations.RemoveField(
+            model_name='userusage',
+            name='total_uptime',
+        ),
+        migrations.RenameField(
+            model_name='userusage',
+            old_name='active_sessions_count',
+            new_name='active_sessions',
+        ),
+        migrations.RenameField(
+            model_name='userusage',
+            old_name='active_sub_sessions_count',
+            new_name='active_sub_sessions',
+        ),
+        migrations.RenameField(
+            model_name='userusage',
+            old_name='total_download_bytes',
+            new_name='total_download',
+        ),
+        migrations.RenameField(
+            model_name='userusage',
+            old_name='total_upload_bytes',
+            new_name='total_upload',
+        ),
+        migrations.RenameField(
+            model_name='userusage',
+            old_name='total_uptime_seconds',
+            new_name='total_uptime',
+        ),
+        migrations.AlterField(
+            model_name='userusage',
+            name='total_download',
+            field=models.BigIntegerField(default=0, help_text='Bytes'),
+        ),
+        migrations.AlterField(
+            model_name='userusage',
+            name='total_upload',
+            field=models.BigIntegerField(default=0, help_text='Bytes'),
+        ),
+        migrations.AlterField(
+            model_name='userusage',
+            name='total_uptime',
+            field=models.BigIntegerField(default=0, help_text='Seconds'),
+        ),
+    ]
@@ -9,7 +9,7 @@ from django.db.models import Sum
 from django.core.exceptions import ObjectDoesNotExist
 from django.utils import timezone
 
-from utils.metrics import format_traffic_size
+from utils.metrics import format_traffic_size, format_uptime
 
 import logging
 logger = logging.getLogger(__name__)
@@ -17,6 +17,17 @@ logger = logging.getLogger(__name__)
 
 MAX_LEN = 67
 #    
+def mikrotik_id_constraints(prefix, field='mikrotik_id'):
+    '''
+    MikroTik `.id` values (and names, session ids) are only unique within one router, so synced
+    models are unique per (nas, field); rows that are not tagged with a NAS keep a global uniqueness.
+    '''
+    return [
+        models.UniqueConstraint(fields=['nas', field], name=f'{prefix}_unique_nas_{field}'),
+        models.UniqueConstraint(fields=[field], condition=models.Q(nas__isnull=True), name=f'{prefix}_unique_{field}'),
+    ]
+
+
 class BaseMixin(models.Model):  
     created  = models.DateTimeField(_('created'), auto_now_add=True, db_index=True)
     modified = models.DateTimeField(_('modified'), auto_now=True)
@@ -64,6 +75,10 @@ class Nas(BaseMixin):
     description = models.CharField(verbose_name=_('description'), max_length=MAX_LEN, null=True, blank=True)
     gps_location = models.CharField( verbose_name=_('GPS Location'), max_length=MAX_LEN, blank=True, null=True)
     notes = models.TextField(verbose_name=_('notes'), blank=True, null=True, help_text=_('Notes'))
+    api_url = models.CharField(verbose_name=_('API URL'), max_length=256, blank=True, default='', help_text=_('RouterOS REST base URL, e.g. http://10.0.0.1'))
+    api_username = models.CharField(verbose_name=_('API username'), max_length=MAX_LEN, blank=True, default='')
+    api_password = models.CharField(verbose_name=_('API password'), max_length=256, blank=True, default='')
+    sync_enabled = models.BooleanField(verbose_name=_('sync enabled'), default=True, help_text=_('Pull users, profiles and sessions from this router'))
 
     class Meta:
         ordering = ['-created']
@@ -77,9 +92,16 @@ class Nas(BaseMixin):
 
 class User(AbstractUser, BaseMixin):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    mikrotik_id = models.CharField(max_length=MAX_LEN, unique=True, blank=True, null=True)
+    mikrotik_id = models.CharField(max_length=MAX_LEN, blank=True, null=True)
+    sync_hash = models.CharField(_('sync hash'), max_length=40, blank=True, null=True, editable=False, help_text=_('Hash of the last payload synced from MikroTik'))
     organization = models.ForeignKey(Organization, on_delete=models.SET_NULL, null=True, blank=True, related_name='user_org')
-    name = models.CharField(_('name'), max_length=MAX_LEN, unique=True, blank=True, null=True)
+    nas = models.ForeignKey(Nas, on_delete=models.SET_NULL, null=True, blank=True, related_name='user_nas', help_text=_('Router this user was synced from'))
+    # subscriber names are only unique within one router (see Meta.constraints)
+    username = models.CharField(
+        _('username'), max_length=150, db_index=True, validators=[AbstractUser.username_validator],
+        help_text=_('Required. 150 characters or fewer. Letters, digits and @/./+/-/_ only.'),
+    )
+    name = models.CharField(_('name'), max_length=MAX_LEN, db_index=True, blank=True, null=True)
     group = models.CharField(_('group'), max_length=MAX_LEN, default='default')
     disabled = models.BooleanField(_('disabled'), default=False)
     otp_secret = models.CharField(_('otp-secret'), max_length=256, blank=True, null=True)
@@ -96,6 +118,11 @@ class User(AbstractUser, BaseMixin):
 
     class Meta:
         ordering = ['-created']
+        constraints = [
+            *mikrotik_id_constraints('user'),
+            *mikrotik_id_constraints('user', 'username'),
+            *mikrotik_id_constraints('user', 'name'),
+        ]
 
     def save(self, *args, **kwargs):
         if self.password and not self.plain_password:
@@ -108,43 +135,37 @@ class User(AbstractUser, BaseMixin):
 
 class UserUsage(BaseMixin):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    mikrotik_id = models.CharField(max_length=MAX_LEN, unique=True, blank=True, null=True)
+    mikrotik_id = models.CharField(max_length=MAX_LEN, blank=True, null=True)
+    sync_hash = models.CharField(_('sync hash'), max_length=40, blank=True, null=True, editable=False, help_text=_('Hash of the last payload synced from MikroTik'))
     organization = models.ForeignKey(Organization, on_delete=models.CASCADE, blank=True, null=True, related_name='userusage_org')
+    nas = models.ForeignKey(Nas, on_delete=models.SET_NULL, null=True, blank=True, related_name='userusage_nas')
     user = models.ForeignKey(User, on_delete=models.CASCADE, blank=True, null=True)
-    active_sessions = models.CharField(max_length=10, default='0')
-    active_sub_sessions = models.CharField(max_length=10, default='0')
-    total_download = models.CharField(max_length=MAX_LEN, default='0')
-    total_upload = models.CharField(max_length=MAX_LEN, default='0')
-    total_uptime = models.CharField(max_length=MAX_LEN, blank=True, null=True)
+    active_sessions = models.PositiveIntegerField(default=0)
+    active_sub_sessions = models.PositiveIntegerField(default=0)
+    total_download = models.BigIntegerField(default=0, help_text=_('Bytes'))
+    total_upload = models.BigIntegerField(default=0, help_text=_('Bytes'))
+    total_uptime = models.BigIntegerField(default=0, help_text=_('Seconds'))
     attributes_details = models.CharField(max_length=256, blank=True, null=True)
 
     class Meta:
         ordering = ['-created']
+        constraints = mikrotik_id_constraints('userusage')
 
     def __str__(self):
         return f"User ID: {self.user_id} - Download: {self.total_download} bytes, Upload: {self.total_upload} bytes"
 
     @property
     def total_traffic(self):
-        return str(int(self.total_download) + int(self.total_upload))  # Calculate total traffic dynamically
-    
+        return self.total_download + self.total_upload
+
     def formatted_user_upload(self):
-        try:
-            # bytes_size = int(self.total_upload)
-            return format_traffic_size(int(self.total_upload))
-        except (ValueError, TypeError):
-            return "Invalid upload size"
-        
+        return format_traffic_size(self.total_upload)
+
     def formatted_user_download(self):
-        try:
-            bytes_size = int(self.total_download)
-            return format_traffic_size(bytes_size)
-        except (ValueError, TypeError):
-            return "Invalid upload size"
-        
+        return format_traffic_size(self.total_download)
+
     def formatted_user_traffic(self):
-        try:
-            bytes_size = int(self.total_traffic)
-            return format_traffic_size(bytes_size)
-        except (ValueError, TypeError):
-            return "Invalid traffic size"
\ No newline at end of file
+        return format_traffic_size(self.total_traffic)
+
+    def formatted_user_uptime(self):
+        return format_uptime(self.total_uptime)
\ No newline at end of file
@@ -0,0 +1,39 @@
+from unittest import mock
+from django.contrib import admin
+from django.test import RequestFactory, TestCase
+
+from appshere.billings.tests.utils import BenchmarkMixin, SubscriberDataMixin, scaled, walk
+from ..admin import DashboardAdmin
+from ..models import Dashboard
+from ..views import UserDetailView, UserUsageListView
+
+
+class TestAccountsBenchmarks(SubscriberDataMixin, BenchmarkMixin, TestCase):
+    def test_user_usage_list(self):
+        view = self._view(UserUsageListView)
+        self.benchmark(lambda: walk(view.get_queryset(), 'organization.slug', 'formatted_user_traffic'), max_queries=1)
+
+    def test_user_detail(self):
+        view = self._view(UserDetailView, user=self.heavy_user)
+
+        def render_data():
+            data = view.get_user_related_data()
+            walk(data['recent_user_profiles'], 'profile.name_for_users', 'get_state')
+            walk(data['current_user_profile'], 'profile.name_for_users')
+            walk(data['running_active_profiles'], 'profile.name_for_users')
+            walk(data['recent_user_payments'], 'get_reference')
+            walk(data['user_sessions'], 'user.username', 'formatted_total_traffic')
+            walk(data['active_sessions'], 'user.username')
+            return data
+
+        # all-time traffic and uptime, the first user profile, the period usage (2) and one query per listing
+        self.benchmark(render_data, max_queries=11)
+
+    def test_admin_dashboard(self):
+        request = RequestFactory().get('/admin/dashboard/')
+        request.user = self.superuser
+        model_admin = DashboardAdmin(Dashboard, admin.site)
+        with mock.patch('appshere.accounts.admin.render') as render:
+            self.benchmark(model_admin.dashboard_view, request, max_queries=6)
+        context = render.call_args[0][2]
+        self.assertEqual(context['sessions_count'], scaled(200) * scaled(10) + scaled(2000))
@@ -0,0 +1,37 @@
+from django.test import TestCase
+
+from .forms import NasForm
+from .models import Nas
+
+
+class TestNasForm(TestCase):
+    def setUp(self):
+        self.nas = Nas.objects.create(
+            name='10.0.0.1', short_name='core', type='other', secret='s3cret',
+            api_url='http://10.0.0.1', api_username='api', api_password='router-pass',
+        )
+
+    def _data(self, **overrides):
+        data = {
+            'name': self.nas.name, 'short_name': self.nas.short_name, 'type': self.nas.type,
+            'secret': self.nas.secret, 'api_url': self.nas.api_url, 'api_username': self.nas.api_username,
+            'api_password': '', 'sync_enabled': True,
+        }
+        return {**data, **overrides}
+
+    def test_password_is_not_rendered(self):
+        self.assertNotIn('router-pass', NasForm(instance=self.nas).as_p())
+
+    def test_blank_password_keeps_the_stored_one(self):
+        form = NasForm(self._data(notes='moved rack'), instance=self.nas)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        self.nas.refresh_from_db()
+        self.assertEqual((self.nas.api_password, self.nas.notes), ('router-pass', 'moved rack'))
+
+    def test_new_password_replaces_the_stored_one(self):
+        form = NasForm(self._data(api_password='new-pass'), instance=self.nas)
+        self.assertTrue(form.is_valid(), form.errors)
+        form.save()
+        self.nas.refresh_from_db()
+        self.assertEqual(self.nas.api_password, 'new-pass')
@@ -164,7 +164,7 @@ class UserDetailView(OrganizationMixin, DetailView):
         return context
 
     def get_user_related_data(self):
-        user_profiles = UserProfile.objects.filter(user=self.request.user)
+        user_profiles = UserProfile.objects.filter(user=self.request.user).select_related('profile')
         recent_user_profiles = user_profiles.order_by('-created')[:5]
         current_user_profile = user_profiles.order_by('-created')[:1]
         running_active_profiles = user_profiles.filter(state='running-active')
@@ -183,8 +183,9 @@ class UserDetailView(OrganizationMixin, DetailView):
         }
 
         usage_for_a_period = {'error': 'No UserProfile found for this user.'}
-        if user_profiles.exists():
-            usage_for_a_period = get_user_traffic_and_time_for_a_period(user_profiles.first().id)
+        first_user_profile = user_profiles.first()
+        if first_user_profile:
+            usage_for_a_period = get_user_traffic_and_time_for_a_period(first_user_profile.id)
 
         usage_for_a_period.update({
             'total_download': format_traffic_size(usage_for_a_period.get('total_download', 0)),
@@ -211,7 +212,7 @@ class UserUsageListView(OrganizationMixin, ListView):
     context_object_name = 'user_usages'
 
     def get_queryset(self):
-        queryset = UserUsage.objects.all()
+        queryset = UserUsage.objects.select_related('organization')
         return self.get_queryset_filtered_by_organization(queryset)
 
     def get_context_data(self, **kwargs):
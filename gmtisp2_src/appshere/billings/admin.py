@@ -1,15 +1,16 @@
 # mpi_src/appshere/billings/admin.py
 import logging
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from django.utils.html import format_html_join
 from django.utils.translation import gettext_lazy as _
 
-from utils.mikrotik_userman import init_mikrotik_manager
-from utils.data_preparation import prepare_profile_data, prepare_limitation_data
+from utils.metrics import format_traffic_size, format_uptime
 from appshere.accounts.admin import MultitenantAdminMixin
-from .models import UserProfile, Profile, Payment, Session, Limitation, ProfileLimitation
-
-# Initialize MikroTikUserManager
-mikrotik_manager = init_mikrotik_manager()
+from .models import UserProfile, Profile, Payment, Session, Limitation, ProfileLimitation, SyncRun, OutboxEvent, PushJob, UserUsageDaily, QuotaBreach, get_user_profiles_usage
+from .push_jobs import start_push_job
 
 logger = logging.getLogger(__name__)
 
@@ -28,34 +29,42 @@ class ProfileAdmin(MultitenantAdminMixin, admin.ModelAdmin):
     )
 
     def sync_profiles_to_mikrotik(self, request, queryset):
-        """Sync selected profiles with MikroTik."""
-        for obj in queryset:
-            try:
-                profile_data = prepare_profile_data(obj)
-                existing_profile = next(
-                    (p for p in mikrotik_manager.get_profiles() if p['name'] == obj.name), None
-                )
-                if existing_profile:
-                    mikrotik_manager.update_profile(
-                        profile_id=existing_profile['.id'],  # Pass the existing profile ID
-                        profile_data=profile_data  # Pass all profile data
-                    )
-                    self.message_user(request, f"Profile '{obj.name}' updated in MikroTik UserManager.")
-                else:
-                    mikrotik_manager.create_profile(
-                        profile_data=profile_data  # Pass all profile data
-                    )
-                    self.message_user(request, f"Profile '{obj.name}' created in MikroTik UserManager.")
-            except Exception as e:
-                self.message_user(request, f"Error syncing profile '{obj.name}' with MikroTik UserManager: {e}", level='error')
+        """Push selected profiles to MikroTik in a background job."""
+        start_push_job(self, request, queryset)
 
     sync_profiles_to_mikrotik.short_description = "Sync selected profiles to MikroTik"
 
 
+class UserProfileChangeList(ChangeList):
+    """Attaches the validity-window usage of the listed user profiles, fetched for the whole page at once."""
+
+    def get_results(self, request):
+        super().get_results(request)
+        self.result_list = list(self.result_list)
+        usage = get_user_profiles_usage([user_profile.pk for user_profile in self.result_list])
+        for user_profile in self.result_list:
+            user_profile.period_usage = usage.get(user_profile.pk)
+
+
 class UserProfileAdmin(MultitenantAdminMixin, admin.ModelAdmin):
-    list_display = ('mikrotik_id', 'user', 'profile__name', 'state', 'end_time', 'created', 'organization__slug')
+    list_display = ('mikrotik_id', 'user', 'profile__name', 'state', 'end_time', 'period_traffic', 'period_uptime', 'created', 'organization__slug')
     readonly_fields = ['mikrotik_id', 'end_time', 'state', 'created', 'modified']
 
+    def get_changelist(self, request, **kwargs):
+        return UserProfileChangeList
+
+    def period_traffic(self, obj):
+        usage = getattr(obj, 'period_usage', None)
+        return format_traffic_size(usage['download'] + usage['upload']) if usage else '-'
+
+    period_traffic.short_description = _('traffic in period')
+
+    def period_uptime(self, obj):
+        usage = getattr(obj, 'period_usage', None)
+        return format_uptime(usage['uptime_seconds']) if usage else '-'
+
+    period_uptime.short_description = _('uptime in period')
+
 
 class PaymentAdmin(MultitenantAdminMixin, admin.ModelAdmin):
     list_display = ('user_profile', 'method', 'price', 'trans_end', 'trans_status', 'organization__slug')
@@ -72,11 +81,11 @@ class SessionAdmin(MultitenantAdminMixin, admin.ModelAdmin):
         'started', 'ended', 'terminate_cause'
     )
     search_fields = ('session_id', 'user__username', 'nas_ip_address')
-    list_filter = ('nas_ip_address', 'nas_port_type', 'status', 'terminate_cause')
+    list_filter = ('nas', 'nas_ip_address', 'nas_port_type', 'status', 'terminate_cause')
     readonly_fields = [
         'mikrotik_id', 'session_id', 'user', 'nas_ip_address', 
         'nas_port_id', 'nas_port_type', 'calling_station_id', 
-        'download', 'upload', 'uptime', 'status', 'started', 
+        'formatted_download', 'formatted_upload', 'formatted_uptime', 'status', 'started', 
         'ended', 'terminate_cause', 'user_address', 'last_accounting_packet'
     ]
 
@@ -89,30 +98,47 @@ class LimitationAdmin(MultitenantAdminMixin, admin.ModelAdmin):
     actions = ['sync_limitations_to_mikrotik']
 
     def sync_limitations_to_mikrotik(self, request, queryset):
-        """Sync selected limitations with MikroTik."""
-        for obj in queryset:
-            try:
-                limitation_data = prepare_limitation_data(obj)
-                existing_limitation = next(
-                    (l for l in mikrotik_manager.get_limitations() if l['name'] == obj.name), None
-                )
-                if existing_limitation:
-                    mikrotik_manager.update_limitation(
-                        limitation_id=existing_limitation['.id'],
-                        limitation_data=limitation_data
-                    )
-                    self.message_user(request, f"Limitation '{obj.name}' updated in MikroTik UserManager.")
-                else:
-                    mikrotik_manager.create_limitation(
-                        limitation_data=limitation_data
-                    )
-                    self.message_user(request, f"Limitation '{obj.name}' created in MikroTik UserManager.")
-            except Exception as e:
-                self.message_user(request, f"Error syncing limitation '{obj.name}' with MikroTik UserManager: {e}", level='error')
+        """Push selected limitations to MikroTik in a background job."""
+        start_push_job(self, request, queryset)
 
     sync_limitations_to_mikrotik.short_description = "Sync selected limitations to MikroTik"
 
 
+class UserUsageDailyAdmin(MultitenantAdminMixin, admin.ModelAdmin):
+    list_display = ('user', 'day', 'download', 'upload', 'uptime_seconds', 'session_count', 'organization__slug')
+    search_fields = ('user__username',)
+    date_hierarchy = 'day'
+    readonly_fields = ('user', 'organization', 'day', 'download', 'upload', 'uptime_seconds', 'session_count', 'created', 'modified')
+
+    def has_add_permission(self, request):
+        return False
+
+
+class QuotaBreachAdmin(MultitenantAdminMixin, admin.ModelAdmin):
+    list_display = ('user', 'limitation', 'metric', 'formatted_usage', 'formatted_limit', 'period_start', 'period_end', 'enforced', 'lifted', 'organization__slug')
+    list_filter = ('metric', 'limitation')
+    search_fields = ('user__username',)
+    list_select_related = ('user', 'limitation', 'organization')
+    readonly_fields = (
+        'user', 'user_profile', 'limitation', 'organization', 'metric', 'usage', 'limit',
+        'period_start', 'period_end', 'enforced', 'lifted', 'error', 'created', 'modified',
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    def _format(self, obj, value):
+        return format_uptime(value) if obj.metric == 'uptime' else format_traffic_size(value)
+
+    def formatted_usage(self, obj):
+        return self._format(obj, obj.usage)
+    formatted_usage.short_description = _('usage')
+
+    def formatted_limit(self, obj):
+        return self._format(obj, obj.limit)
+    formatted_limit.short_description = _('limit')
+
+
 class ProfileLimitationAdmin(MultitenantAdminMixin, admin.ModelAdmin):
     list_display = ('mikrotik_id', 'profile', 'limitation', 'organization__slug')
     search_fields = ('profile', 'limitation')
@@ -120,15 +146,69 @@ class ProfileLimitationAdmin(MultitenantAdminMixin, admin.ModelAdmin):
     readonly_fields = ('mikrotik_id', 'created', 'modified')
 
 
+class SyncRunAdmin(admin.ModelAdmin):
+    list_display = ('router', 'nas', 'started', 'duration', 'status')
+    list_filter = ('status', 'nas')
+    readonly_fields = ('nas', 'router', 'started', 'duration', 'status', 'timings', 'latency', 'error')
+
+    def has_add_permission(self, request):
+        return False
+
+
+class OutboxEventAdmin(admin.ModelAdmin):
+    list_display = ('model', 'object_id', 'status', 'attempts', 'next_attempt', 'modified')
+    list_filter = ('status', 'model')
+    search_fields = ('object_id',)
+    readonly_fields = ('model', 'object_id', 'status', 'revision', 'attempts', 'next_attempt', 'last_error', 'created', 'modified')
+    actions = ['retry_events']
+
+    def has_add_permission(self, request):
+        return False
+
+    def retry_events(self, request, queryset):
+        from .tasks import drain_outbox
+
+        queryset = queryset.filter(status='failed')
+        # a newer push of the same object is already queued
+        queued = OutboxEvent.objects.filter(status='pending', model=OuterRef('model'), object_id=OuterRef('object_id'))
+        queryset.filter(Exists(queued)).delete()
+        count = queryset.update(status='pending', attempts=0, next_attempt=timezone.now())
+        drain_outbox.delay()
+        self.message_user(request, f"{count} push(es) queued for retry.")
+
+    retry_events.short_description = "Retry selected pushes now"
+
+
+class PushJobAdmin(admin.ModelAdmin):
+    list_display = ('model', 'nas', 'status', 'progress', 'created_count', 'updated_count', 'unchanged_count', 'failed_count', 'requested_by', 'created')
+    list_filter = ('status', 'model', 'nas')
+    readonly_fields = (
+        'model', 'nas', 'status', 'requested_by', 'progress', 'created_count', 'updated_count', 'unchanged_count',
+        'failed_count', 'started', 'finished', 'error', 'failures', 'results', 'created',
+    )
+    exclude = ('object_ids',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def progress(self, obj):
+        return f"{obj.processed}/{obj.total}"
+
+    def failures(self, obj):
+        return format_html_join(
+            '\n', '<div>{}: {}</div>', ((result['object'], result['error']) for result in obj.results if result['error'])
+        ) or '-'
+
+
 # Register models
 admin.site.register(Profile, ProfileAdmin)
 admin.site.register(UserProfile, UserProfileAdmin)
 admin.site.register(Payment, PaymentAdmin)
 admin.site.register(Session, SessionAdmin)
+admin.site.register(UserUsageDaily, UserUsageDailyAdmin)
 admin.site.register(Limitation, LimitationAdmin)
 admin.site.register(ProfileLimitation, ProfileLimitationAdmin)
-
-
-
-
-
+admin.site.register(QuotaBreach, QuotaBreachAdmin)
+admin.site.register(SyncRun, SyncRunAdmin)
+admin.site.register(OutboxEvent, OutboxEventAdmin)
+admin.site.register(PushJob, PushJobAdmin)
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.4 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billings', '0002_alter_limitation_reset_counters_start_time_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='created')),
+                ('modified', models.DateTimeField(auto_now=True, verbose_name='modified')),
+                ('router', models.CharField(max_length=67, verbose_name='router')),
+                ('resource', models.CharField(max_length=67, verbose_name='resource')),
+                ('last_accounting_packet', models.DateTimeField(blank=True, null=True, verbose_name='last accounting packet')),
+                ('last_mikrotik_id', models.CharField(blank=True, max_length=67, null=True, verbose_name='last MikroTik ID')),
+            ],
+            options={
+                'unique_together': {('router', 'resource')},
+            },
+        ),
+    ]
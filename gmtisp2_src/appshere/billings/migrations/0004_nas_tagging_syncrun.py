@@ -0,0 +1,142 @@
+# Generated by Django 5.1.4 on 2026-10-18 10:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_nas_api_credentials_and_nas_tagging'),
+        ('billings', '0003_syncwatermark'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='nas',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='profile_nas', to='accounts.nas'),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='mikrotik_id',
+            field=models.CharField(blank=True, max_length=67, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='profile',
+            constraint=models.UniqueConstraint(fields=('nas', 'mikrotik_id'), name='profile_unique_nas_mikrotik_id'),
+        ),
+        migrations.AddConstraint(
+            model_name='profile',
+            constraint=models.UniqueConstraint(condition=models.Q(('nas__isnull', True)), fields=('mikrotik_id',), name='profile_unique_mikrotik_id'),
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='name',
+            field=models.CharField(db_index=True, max_length=67, verbose_name='name'),
+        ),
+        migrations.AddConstraint(
+            model_name='profile',
+            constraint=models.UniqueConstraint(fields=('nas', 'name'), name='profile_unique_nas_name'),
+        ),
+        migrations.AddConstraint(
+            model_name='profile',
+            constraint=models.UniqueConstraint(condition=models.Q(('nas__isnull', True)), fields=('name',), name='profile_unique_name'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='nas',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='userprofile_nas', to='accounts.nas'),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='mikrotik_id',
+            field=models.CharField(blank=True, max_length=67, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='userprofile',
+            constraint=models.UniqueConstraint(fields=('nas', 'mikrotik_id'), name='userprofile_unique_nas_mikrotik_id'),
+        ),
+        migrations.AddConstraint(
+            model_name='userprofile',
+            constraint=models.UniqueConstraint(condition=models.Q(('nas__isnull', True)), fields=('mikrotik_id',), name='userprofile_unique_mikrotik_id'),
+        ),
+        migrations.AddField(
+            model_name='limitation',
+            name='nas',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='limitation_nas', to='accounts.nas'),
+        ),
+        migrations.AlterField(
+            model_name='limitation',
+            name='mikrotik_id',
+            field=models.CharField(blank=True, max_length=67, null=True),
+        ),
+        migrations.AlterField(
+            model_name='limitation',
+            name='name',
+            field=models.CharField(blank=True, db_index=True, help_text='limit-1gb', max_length=67, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='limitation',
+            constraint=models.UniqueConstraint(fields=('nas', 'mikrotik_id'), name='limitation_unique_nas_mikrotik_id'),
+        ),
+        migrations.AddConstraint(
+            model_name='limitation',
+            constraint=models.UniqueConstraint(condition=models.Q(('nas__isnull', True)), fields=('mikrotik_id',), name='limitation_unique_mikrotik_id'),
+        ),
+        migrations.AddConstraint(
+            model_name='limitation',
+            constraint=models.UniqueConstraint(fields=('nas', 'name'), name='limitation_unique_nas_name'),
+        ),
+        migrations.AddConstraint(
+            model_name='limitation',
+            constraint=models.UniqueConstraint(condition=models.Q(('nas__isnull', True)), fields=('name',), name='limitation_unique_name'),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='nas',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='session_nas', to='accounts.nas'),
+        ),
+        migrations.AlterField(
+            model_name='session',
+            name='mikrotik_id',
+            field=models.CharField(blank=True, max_length=67, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='session',
+            constraint=models.UniqueConstraint(fields=('nas', 'mikrotik_id'), name='session_unique_nas_mikrotik_id'),
+        ),
+        migrations.AddConstraint(
+            model_name='session',
+            constraint=models.UniqueConstraint(condition=models.Q(('nas__isnull', True)), fields=('mikrotik_id',), name='session_unique_mikrotik_id'),
+        ),
+        migrations.AlterField(
+            model_name='session',
+            name='session_id',
+            field=models.CharField(db_index=True, max_length=67, verbose_name='Session ID'),
+        ),
+        migrations.AddConstraint(
+            model_name='session',
+            constraint=models.UniqueConstraint(fields=('nas', 'session_id'), name='session_unique_nas_session_id'),
+        ),
+        migrations.AddConstraint(
+            model_name='session',
+            constraint=models.UniqueConstraint(condition=models.Q(('nas__isnull', True)), fields=('session_id',), name='session_unique_session_id'),
+        ),
+        migrations.CreateModel(
+            name='SyncRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('router', models.CharField(max_length=256, verbose_name='router')),
+                ('started', models.DateTimeField(db_index=True, verbose_name='started')),
+                ('duration', models.FloatField(default=0, verbose_name='duration')),
+                ('status', models.CharField(choices=[('success', 'Success'), ('failed', 'Failed')], default='success', max_length=67, verbose_name='status')),
+                ('timings', models.JSONField(blank=True, default=dict, verbose_name='timings')),
+                ('error', models.TextField(blank=True, null=True, verbose_name='error')),
+                ('nas', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sync_runs', to='accounts.nas')),
+            ],
+            options={
+                'ordering': ['-started'],
+            },
+        ),
+    ]
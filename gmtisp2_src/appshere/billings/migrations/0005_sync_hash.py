@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billings', '0004_nas_tagging_syncrun'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='sync_hash',
+            field=models.CharField(blank=True, editable=False, help_text='Hash of the last payload synced from MikroTik', max_length=40, null=True, verbose_name='sync hash'),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='sync_hash',
+            field=models.CharField(blank=True, editable=False, help_text='Hash of the last payload synced from MikroTik', max_length=40, null=True, verbose_name='sync hash'),
+        ),
+        migrations.AddField(
+            model_name='limitation',
+            name='sync_hash',
+            field=models.CharField(blank=True, editable=False, help_text='Hash of the last payload synced from MikroTik', max_length=40, null=True, verbose_name='sync hash'),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='sync_hash',
+            field=models.CharField(blank=True, editable=False, help_text='Hash of the last payload synced from MikroTik', max_length=40, null=True, verbose_name='sync hash'),
+        ),
+    ]
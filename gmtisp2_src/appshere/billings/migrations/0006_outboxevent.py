@@ -0,0 +1,34 @@
+# Generated by Django 5.1.4 on 2026-10-18 12:05
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billings', '0005_sync_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='created')),
+                ('modified', models.DateTimeField(auto_now=True, verbose_name='modified')),
+                ('model', models.CharField(help_text='e.g. billings.profile', max_length=67, verbose_name='model')),
+                ('object_id', models.CharField(max_length=67, verbose_name='object ID')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('failed', 'Failed')], default='pending', max_length=10, verbose_name='status')),
+                ('revision', models.PositiveIntegerField(default=0, help_text='Bumped by every save while the push is pending', verbose_name='revision')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='attempts')),
+                ('next_attempt', models.DateTimeField(default=django.utils.timezone.now, verbose_name='next attempt')),
+                ('last_error', models.TextField(blank=True, null=True, verbose_name='last error')),
+            ],
+            options={
+                'ordering': ['created'],
+                'indexes': [models.Index(fields=['status', 'next_attempt'], name='outbox_status_next_attempt')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status', 'pending')), fields=('model', 'object_id'), name='unique_pending_outbox_event')],
+            },
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.4 on 2026-10-18 13:10
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_sync_hash'),
+        ('billings', '0006_outboxevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PushJob',
+            fields=[
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='created')),
+                ('modified', models.DateTimeField(auto_now=True, verbose_name='modified')),
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('model', models.CharField(help_text='e.g. billings.profile', max_length=67, verbose_name='model')),
+                ('object_ids', models.JSONField(blank=True, default=list, verbose_name='object IDs')),
+                ('requested_by', models.CharField(blank=True, max_length=67, verbose_name='requested by')),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10, verbose_name='status')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='total')),
+                ('processed', models.PositiveIntegerField(default=0, verbose_name='processed')),
+                ('created_count', models.PositiveIntegerField(default=0, verbose_name='created')),
+                ('updated_count', models.PositiveIntegerField(default=0, verbose_name='updated')),
+                ('unchanged_count', models.PositiveIntegerField(default=0, verbose_name='unchanged')),
+                ('failed_count', models.PositiveIntegerField(default=0, verbose_name='failed')),
+                ('results', models.JSONField(blank=True, default=list, verbose_name='results')),
+                ('started', models.DateTimeField(blank=True, null=True, verbose_name='started')),
+                ('finished', models.DateTimeField(blank=True, null=True, verbose_name='finished')),
+                ('error', models.TextField(blank=True, null=True, verbose_name='error')),
+                ('nas', models.ForeignKey(blank=True, help_text='Router the objects are pushed to', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='push_jobs', to='accounts.nas')),
+            ],
+            options={
+                'ordering': ['-created'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-18 14:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billings', '0007_pushjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='syncrun',
+            name='latency',
+            field=models.JSONField(blank=True, default=dict, help_text='Per-endpoint router latency histograms', verbose_name='latency'),
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 5.1.4 on 2026-10-18 15:10
+
+import re
+
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+UPTIME_UNITS = {'w': 604800, 'd': 86400, 'h': 3600, 'm': 60, 's': 1}
+
+
+def to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def to_seconds(value):
+    # RouterOS durations such as '1d2h3m4s'; kept local so later changes to the app code don't alter this migration
+    return sum(int(number) * UPTIME_UNITS[unit] for number, unit in re.findall(r'(\d+)([wdhms])', value or ''))
+
+
+def to_duration(seconds):
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f'{hours}h{minutes}m{seconds}s'
+
+
+# fields written by each direction of the conversion
+FIELDS = {
+    True: ['download_bytes', 'upload_bytes', 'uptime_seconds'],
+    False: ['download', 'upload', 'uptime'],
+}
+
+
+def convert(apps, schema_editor, forward):
+    Session = apps.get_model('billings', 'Session')
+    sessions = Session.objects.order_by().only('pk', 'download', 'upload', 'uptime', 'download_bytes', 'upload_bytes', 'uptime_seconds')
+    batch = []
+    for session in sessions.iterator(chunk_size=BATCH_SIZE):
+        if forward:
+            session.download_bytes = to_int(session.download)
+            session.upload_bytes = to_int(session.upload)
+            session.uptime_seconds = to_seconds(session.uptime)
+        else:
+            session.download = str(session.download_bytes)
+            session.upload = str(session.upload_bytes)
+            session.uptime = to_duration(session.uptime_seconds)
+        batch.append(session)
+        if len(batch) == BATCH_SIZE:
+            Session.objects.bulk_update(batch, FIELDS[forward])
+            batch = []
+    if batch:
+        Session.objects.bulk_update(batch, FIELDS[forward])
+
+
+def forwards(apps, schema_editor):
+    convert(apps, schema_editor, forward=True)
+
+
+def backwards(apps, schema_editor):
+    convert(apps, schema_editor, forward=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billings', '0008_syncrun_latency'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='download_bytes',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='upload_bytes',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='uptime_seconds',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.RunPython(forwards, backwards),
+    ]
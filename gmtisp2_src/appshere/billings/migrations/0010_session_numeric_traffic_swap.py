@@ -0,0 +1,55 @@
+# Generated by Django 5.1.4 on 2026-10-18 15:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billings', '0009_session_numeric_traffic'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='session',
+            name='download',
+        ),
+        migrations.RemoveField(
+            model_name='session',
+            name='upload',
+        ),
+        migrations.RemoveField(
+            model_name='session',
+            name='uptime',
+        ),
+        migrations.RenameField(
+            model_name='session',
+            old_name='download_bytes',
+            new_name='download',
+        ),
+        migrations.RenameField(
+            model_name='session',
+            old_name='upload_bytes',
+            new_name='upload',
+        ),
+        migrations.RenameField(
+            model_name='session',
+            old_name='uptime_seconds',
+            new_name='uptime',
+        ),
+        migrations.AlterField(
+            model_name='session',
+            name='download',
+            field=models.BigIntegerField(default=0, help_text='Bytes', verbose_name='Download'),
+        ),
+        migrations.AlterField(
+            model_name='session',
+            name='upload',
+            field=models.BigIntegerField(default=0, help_text='Bytes', verbose_name='Upload'),
+        ),
+        migrations.AlterField(
+            model_name='session',
+            name='uptime',
+            field=models.BigIntegerField(default=0, help_text='Seconds', verbose_name='Uptime'),
+        ),
+    ]
@@ -0,0 +1,112 @@
+# Generated by Django 5.1.4 on 2026-10-18 16:05
+
+from datetime import datetime
+
+from django.db import migrations, models
+from django.utils import timezone
+
+BATCH_SIZE = 2000
+
+# RouterOS v7 REST, RouterOS v6 ('jan/02/2024 10:00:00'); anything else is tried as ISO 8601
+ROUTER_DATETIME_FORMATS = ('%Y-%m-%d %H:%M:%S', '%b/%d/%Y %H:%M:%S')
+
+# model -> {old text field: new datetime field}
+COLUMNS = {
+    'Session': {'started': 'started_at', 'ended': 'ended_at', 'last_accounting_packet': 'last_accounting_packet_at'},
+    'UserProfile': {'end_time': 'end_time_at'},
+    'Payment': {'trans_start': 'trans_start_at', 'trans_end': 'trans_end_at'},
+}
+
+
+def to_datetime(value):
+    # kept local so later changes to the app code don't alter this migration
+    if not value:
+        return None
+    parsed = None
+    for fmt in ROUTER_DATETIME_FORMATS:
+        try:
+            parsed = datetime.strptime(value.strip().capitalize(), fmt)
+            break
+        except ValueError:
+            continue
+    if parsed is None:
+        try:
+            parsed = datetime.fromisoformat(value.strip())
+        except ValueError:
+            # e.g. 'unlimited'
+            return None
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+
+def to_text(value):
+    return timezone.localtime(value).strftime(ROUTER_DATETIME_FORMATS[0]) if value else None
+
+
+def convert(apps, schema_editor, forward):
+    for model_name, columns in COLUMNS.items():
+        model = apps.get_model('billings', model_name)
+        written = list(columns.values()) if forward else list(columns)
+        rows = model.objects.order_by().only('pk', *columns, *columns.values())
+        batch = []
+        # iterator() streams the table instead of loading it whole
+        for row in rows.iterator(chunk_size=BATCH_SIZE):
+            for old, new in columns.items():
+                if forward:
+                    setattr(row, new, to_datetime(getattr(row, old)))
+                else:
+                    setattr(row, old, to_text(getattr(row, new)))
+            batch.append(row)
+            if len(batch) == BATCH_SIZE:
+                model.objects.bulk_update(batch, written)
+                batch = []
+        if batch:
+            model.objects.bulk_update(batch, written)
+
+
+def forwards(apps, schema_editor):
+    convert(apps, schema_editor, forward=True)
+
+
+def backwards(apps, schema_editor):
+    convert(apps, schema_editor, forward=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billings', '0010_session_numeric_traffic_swap'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='session',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='ended_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='session',
+            name='last_accounting_packet_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='userprofile',
+            name='end_time_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='trans_start_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='trans_end_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,100 @@
+# Generated by Django 5.1.4 on 2026-10-18 16:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billings', '0011_datetime_columns'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='session',
+            name='started',
+        ),
+        migrations.RemoveField(
+            model_name='session',
+            name='ended',
+        ),
+        migrations.RemoveField(
+            model_name='session',
+            name='last_accounting_packet',
+        ),
+        migrations.RemoveField(
+            model_name='userprofile',
+            name='end_time',
+        ),
+        migrations.RemoveField(
+            model_name='payment',
+            name='trans_start',
+        ),
+        migrations.RemoveField(
+            model_name='payment',
+            name='trans_end',
+        ),
+        migrations.RenameField(
+            model_name='session',
+            old_name='started_at',
+            new_name='started',
+        ),
+        migrations.RenameField(
+            model_name='session',
+            old_name='ended_at',
+            new_name='ended',
+        ),
+        migrations.RenameField(
+            model_name='session',
+            old_name='last_accounting_packet_at',
+            new_name='last_accounting_packet',
+        ),
+        migrations.RenameField(
+            model_name='userprofile',
+            old_name='end_time_at',
+            new_name='end_time',
+        ),
+        migrations.RenameField(
+            model_name='payment',
+            old_name='trans_start_at',
+            new_name='trans_start',
+        ),
+        migrations.RenameField(
+            model_name='payment',
+            old_name='trans_end_at',
+            new_name='trans_end',
+        ),
+        migrations.AlterField(
+            model_name='session',
+            name='started',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Started'),
+        ),
+        migrations.AlterField(
+            model_name='session',
+            name='ended',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Ended'),
+        ),
+        migrations.AlterField(
+            model_name='session',
+            name='last_accounting_packet',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Last Accounting Packet'),
+        ),
+        migrations.AlterField(
+            model_name='userprofile',
+            name='end_time',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='end time'),
+        ),
+        migrations.AlterField(
+            model_name='payment',
+            name='trans_end',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Date'),
+        ),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(fields=['user', 'started'], name='session_user_started_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='session',
+            index=models.Index(fields=['organization', 'started'], name='session_org_started_idx'),
+        ),
+    ]
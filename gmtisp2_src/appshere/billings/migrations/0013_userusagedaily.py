@@ -0,0 +1,73 @@
+# Generated by Django 5.1.4 on 2026-10-18 17:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+
+BATCH_SIZE = 2000
+
+
+def backfill(apps, schema_editor):
+    Session = apps.get_model('billings', 'Session')
+    UserUsageDaily = apps.get_model('billings', 'UserUsageDaily')
+    totals = (
+        Session.objects
+        .filter(started__isnull=False)
+        .annotate(day=TruncDate('started'))
+        .order_by()
+        .values('user_id', 'user__organization_id', 'day')
+        .annotate(download=Sum('download'), upload=Sum('upload'), uptime_seconds=Sum('uptime'), session_count=Count('id'))
+    )
+    batch = []
+    for total in totals.iterator(chunk_size=BATCH_SIZE):
+        batch.append(UserUsageDaily(
+            user_id=total['user_id'],
+            organization_id=total['user__organization_id'],
+            day=total['day'],
+            download=total['download'] or 0,
+            upload=total['upload'] or 0,
+            uptime_seconds=total['uptime_seconds'] or 0,
+            session_count=total['session_count'],
+        ))
+        if len(batch) == BATCH_SIZE:
+            UserUsageDaily.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        UserUsageDaily.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('accounts', '0005_userusage_numeric_totals_swap'),
+        ('billings', '0012_datetime_columns_swap'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserUsageDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='created')),
+                ('modified', models.DateTimeField(auto_now=True, verbose_name='modified')),
+                ('day', models.DateField(verbose_name='day')),
+                ('download', models.BigIntegerField(default=0, help_text='Bytes', verbose_name='download')),
+                ('upload', models.BigIntegerField(default=0, help_text='Bytes', verbose_name='upload')),
+                ('uptime_seconds', models.BigIntegerField(default=0, help_text='Seconds', verbose_name='uptime')),
+                ('session_count', models.PositiveIntegerField(default=0, verbose_name='sessions')),
+                ('organization', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='userusagedaily_org', to='accounts.organization')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_usage', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'daily user usage',
+                'verbose_name_plural': 'daily user usage',
+                'ordering': ['-day'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'day'), name='userusagedaily_unique_user_day')],
+                'indexes': [models.Index(fields=['organization', 'day'], name='userusagedaily_org_day_idx')],
+            },
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
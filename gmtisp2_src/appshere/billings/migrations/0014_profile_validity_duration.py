@@ -0,0 +1,40 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:02
+
+import re
+from datetime import timedelta
+
+from django.db import migrations, models
+
+UNITS = {'d': 'days', 'h': 'hours', 'm': 'minutes', 's': 'seconds'}
+
+
+def to_duration(validity):
+    # same reading as billings.models.parse_validity at the time of this migration; '0' never expires
+    duration = timedelta()
+    for value, unit in re.findall(r'(\d+)([dhms])', validity or ''):
+        duration += timedelta(**{UNITS[unit]: int(value)})
+    return duration or None
+
+
+def backfill(apps, schema_editor):
+    Profile = apps.get_model('billings', 'Profile')
+    profiles = list(Profile.objects.only('pk', 'validity'))
+    for profile in profiles:
+        profile.validity_duration = to_duration(profile.validity)
+    Profile.objects.bulk_update(profiles, ['validity_duration'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billings', '0013_userusagedaily'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='validity_duration',
+            field=models.DurationField(blank=True, editable=False, help_text='Parsed validity, empty when the profile never expires', null=True, verbose_name='validity duration'),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
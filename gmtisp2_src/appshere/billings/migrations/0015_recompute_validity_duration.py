@@ -0,0 +1,50 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:20
+
+import re
+from datetime import timedelta
+
+from django.db import migrations
+
+UNIT_SECONDS = {'w': 604800, 'd': 86400, 'h': 3600, 'm': 60, 's': 1}
+DURATION_TOKEN = re.compile(r'(\d+)(ms|[wdhms])|(?:(\d+)\s+)?(\d+):(\d{1,2})(?::(\d{1,2}))?(?:\.\d+)?')
+PLAIN_SECONDS = re.compile(r'\d+')
+
+
+def to_duration(validity):
+    # same reading as utils.durations.parse_duration at the time of this migration: weeks,
+    # clock parts ('15d 00:45:00', 'hh:mm:ss') and bare seconds; '0' never expires
+    text = (validity or '').strip()
+    if PLAIN_SECONDS.fullmatch(text):
+        return timedelta(seconds=int(text)) or None
+    seconds = 0
+    for number, unit, days, hours, minutes, clock_seconds in DURATION_TOKEN.findall(text):
+        if unit == 'ms':
+            seconds += int(number) // 1000
+        elif unit:
+            seconds += int(number) * UNIT_SECONDS[unit]
+        else:
+            seconds += int(days or 0) * 86400 + int(hours) * 3600 + int(minutes) * 60 + int(clock_seconds or 0)
+    return timedelta(seconds=seconds) or None
+
+
+def recompute(apps, schema_editor):
+    Profile = apps.get_model('billings', 'Profile')
+    profiles = list(Profile.objects.only('pk', 'validity', 'validity_duration'))
+    changed = []
+    for profile in profiles:
+        duration = to_duration(profile.validity)
+        if duration != profile.validity_duration:
+            profile.validity_duration = duration
+            changed.append(profile)
+    Profile.objects.bulk_update(changed, ['validity_duration'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billings', '0014_profile_validity_duration'),
+    ]
+
+    operations = [
+        migrations.RunPython(recompute, migrations.RunPython.noop),
+    ]
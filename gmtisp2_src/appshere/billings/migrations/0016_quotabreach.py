@@ -0,0 +1,43 @@
+# Generated by Django 5.1.4 on 2026-10-18 18:40
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('accounts', '0005_userusage_numeric_totals_swap'),
+        ('billings', '0015_recompute_validity_duration'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuotaBreach',
+            fields=[
+                ('created', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='created')),
+                ('modified', models.DateTimeField(auto_now=True, verbose_name='modified')),
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('metric', models.CharField(choices=[('transfer', 'Transfer'), ('download', 'Download'), ('upload', 'Upload'), ('uptime', 'Uptime')], max_length=16, verbose_name='metric')),
+                ('usage', models.BigIntegerField(help_text='Bytes, or seconds for uptime', verbose_name='usage')),
+                ('limit', models.BigIntegerField(help_text='Bytes, or seconds for uptime', verbose_name='limit')),
+                ('period_start', models.DateTimeField(verbose_name='period start')),
+                ('period_end', models.DateTimeField(blank=True, null=True, verbose_name='period end')),
+                ('enforced', models.DateTimeField(blank=True, help_text='When the user was disabled on the router', null=True, verbose_name='enforced')),
+                ('lifted', models.DateTimeField(blank=True, help_text='When the user was enabled again', null=True, verbose_name='lifted')),
+                ('error', models.TextField(blank=True, default='', verbose_name='error')),
+                ('limitation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='billings.limitation')),
+                ('organization', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='quotabreach_org', to='accounts.organization')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='quota_breaches', to=settings.AUTH_USER_MODEL)),
+                ('user_profile', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='billings.userprofile')),
+            ],
+            options={
+                'ordering': ['-created'],
+                'constraints': [models.UniqueConstraint(fields=('user', 'limitation', 'period_start'), name='quotabreach_unique_user_period')],
+                'indexes': [models.Index(fields=['lifted', 'period_end'], name='quotabreach_lifted_end_idx')],
+            },
+        ),
+    ]
@@ -1,20 +1,22 @@
 # mpi_src/appshere/billings/models.py
 import uuid
-import re
 import logging
 from django.db import models
-from datetime import timedelta
+from datetime import datetime, time, timedelta
 from django.utils.translation import gettext_lazy as _
-from django.db.models import Sum
+from django.db.models import Case, Count, ExpressionWrapper, F, Q, Sum, When
+from django.db.models.functions import Coalesce, Least, Now, Trunc, TruncDate
 from django.core.exceptions import ObjectDoesNotExist
 from django.utils import timezone
 
 logger = logging.getLogger(__name__)
 
-from utils.metrics import format_traffic_size, parse_uptime
-from appshere.accounts.models import User, Organization, BaseMixin
+from utils.durations import parse_timedelta
+from utils.metrics import format_traffic_size, format_uptime
+from appshere.accounts.models import User, Organization, Nas, BaseMixin, mikrotik_id_constraints
 
 MAX_LEN = 67
+CLOSED_SESSION_STATUSES = {'stop', 'close-acked', 'expired'}
 
 class Profile(BaseMixin):
     WHEN_START_CHOICES = [
@@ -22,21 +24,29 @@ class Profile(BaseMixin):
         ('first-auth', 'First authentication'),
     ]
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    mikrotik_id = models.CharField(max_length=MAX_LEN, unique=True, blank=True, null=True)
+    mikrotik_id = models.CharField(max_length=MAX_LEN, blank=True, null=True)
+    sync_hash = models.CharField(_('sync hash'), max_length=40, blank=True, null=True, editable=False, help_text=_('Hash of the last payload synced from MikroTik'))
     organization = models.ForeignKey(Organization, on_delete=models.CASCADE, blank=True, null=True, related_name='profile_org')
+    nas = models.ForeignKey(Nas, on_delete=models.SET_NULL, blank=True, null=True, related_name='profile_nas')
     user = models.ForeignKey(User, on_delete=models.CASCADE, blank=True, null=True)
-    name = models.CharField(_('name'), max_length=MAX_LEN, unique=True)
+    name = models.CharField(_('name'), max_length=MAX_LEN, db_index=True)
     name_for_users = models.CharField(_('name for users'), max_length=MAX_LEN, blank=True, null=True, help_text='Friendly name for user, e.g., Plan-100MB')
     price = models.CharField(_('price'), max_length=10, default='0.00')
     validity = models.CharField(_('validity'), max_length=MAX_LEN, default='30d', help_text="30m (30 minutes), 45d (45 days), 15d 00:45:00 (15 days, 0 hours, 45 minutes, and 0 seconds, 0 (no expiration)")
+    validity_duration = models.DurationField(_('validity duration'), blank=True, null=True, editable=False, help_text=_('Parsed validity, empty when the profile never expires'))
     starts_when = models.CharField(_('starts when'), max_length=MAX_LEN, choices=WHEN_START_CHOICES, default='first-auth')
     override_shared_users = models.CharField(_('override shared users'), max_length=MAX_LEN, default='off')
     
     class Meta:
         ordering = ['-created']
+        constraints = mikrotik_id_constraints('profile') + mikrotik_id_constraints('profile', 'name')
 
     def __str__(self):
         return f"{self.name_for_users} - {self.price} - {self.validity}"
+
+    def save(self, *args, **kwargs):
+        self.validity_duration = profile_validity(self.validity)
+        super().save(*args, **kwargs)
     
     def is_bonus(self):
         # Profile is considered a bonus if either:
@@ -160,15 +170,18 @@ class Profile(BaseMixin):
 
 class UserProfile(BaseMixin):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    mikrotik_id = models.CharField(max_length=MAX_LEN, unique=True, blank=True, null=True)
+    mikrotik_id = models.CharField(max_length=MAX_LEN, blank=True, null=True)
+    sync_hash = models.CharField(_('sync hash'), max_length=40, blank=True, null=True, editable=False, help_text=_('Hash of the last payload synced from MikroTik'))
     organization = models.ForeignKey(Organization, on_delete=models.CASCADE, blank=True, null=True, related_name='userprofile_org')
+    nas = models.ForeignKey(Nas, on_delete=models.SET_NULL, blank=True, null=True, related_name='userprofile_nas')
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     profile = models.ForeignKey(Profile, on_delete=models.CASCADE)
     state = models.CharField(_('state'), max_length=MAX_LEN, blank=True, null=True)
-    end_time = models.CharField(_('end time'), max_length=MAX_LEN, null=True, blank=True)
+    end_time = models.DateTimeField(_('end time'), null=True, blank=True)
 
     class Meta:
         ordering = ['-created']
+        constraints = mikrotik_id_constraints('userprofile')
 
     def __str__(self):
         return f"{self.user.username} - {self.profile.name} - {self.state}"
@@ -192,9 +205,11 @@ class Limitation(BaseMixin):
         ('hourly', 'Hourly'),
     ]
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    mikrotik_id = models.CharField(max_length=MAX_LEN, unique=True, blank=True, null=True)
+    mikrotik_id = models.CharField(max_length=MAX_LEN, blank=True, null=True)
+    sync_hash = models.CharField(_('sync hash'), max_length=40, blank=True, null=True, editable=False, help_text=_('Hash of the last payload synced from MikroTik'))
     organization = models.ForeignKey(Organization, on_delete=models.CASCADE, blank=True, null=True, related_name='limit_org')
-    name = models.CharField(max_length=MAX_LEN, unique=True, blank=True, null=True, help_text="limit-1gb")
+    nas = models.ForeignKey(Nas, on_delete=models.SET_NULL, blank=True, null=True, related_name='limitation_nas')
+    name = models.CharField(max_length=MAX_LEN, blank=True, null=True, db_index=True, help_text="limit-1gb")
     download_limit = models.CharField(max_length=MAX_LEN, default='0', help_text="")
     upload_limit = models.CharField(max_length=MAX_LEN, default='0', help_text="")
     transfer_limit = models.CharField(max_length=MAX_LEN, default='0', help_text="100M (100 MB), 10G (10 GB)")
@@ -215,6 +230,7 @@ class Limitation(BaseMixin):
 
     class Meta:
         ordering = ['-created']
+        constraints = mikrotik_id_constraints('limitation') + mikrotik_id_constraints('limitation', 'name')
 
     def __str__(self):
         return self.name
@@ -262,8 +278,8 @@ class Payment(BaseMixin):
     profile = models.ForeignKey(Profile, on_delete=models.SET_NULL, null=True, blank=True)
     copy_from = models.CharField(max_length=MAX_LEN, choices=COPY_FROM_CHOICES, default='manual')
     method = models.CharField(max_length=MAX_LEN, choices=METHOD_CHOICES, default='OFFLINE')
-    trans_start = models.CharField(max_length=MAX_LEN, null=True, blank=True)
-    trans_end = models.CharField(_('Date'), max_length=MAX_LEN, null=True, blank=True)
+    trans_start = models.DateTimeField(null=True, blank=True)
+    trans_end = models.DateTimeField(_('Date'), null=True, blank=True)
     trans_status = models.CharField(max_length=MAX_LEN, choices=TRANS_STATUS_CHOICES)
     user_message = models.TextField(null=True, blank=True)
     currency = models.CharField(max_length=MAX_LEN, default="GHS")
@@ -281,34 +297,41 @@ class Payment(BaseMixin):
 
 
 class Session(models.Model):
-    mikrotik_id = models.CharField(max_length=MAX_LEN, unique=True, blank=True, null=True)
-    session_id = models.CharField(_('Session ID'), max_length=MAX_LEN, unique=True)
+    mikrotik_id = models.CharField(max_length=MAX_LEN, blank=True, null=True)
+    sync_hash = models.CharField(_('sync hash'), max_length=40, blank=True, null=True, editable=False, help_text=_('Hash of the last payload synced from MikroTik'))
+    session_id = models.CharField(_('Session ID'), max_length=MAX_LEN, db_index=True)
     organization = models.ForeignKey(Organization, on_delete=models.CASCADE, blank=True, null=True, related_name='session_org')
+    nas = models.ForeignKey(Nas, on_delete=models.SET_NULL, blank=True, null=True, related_name='session_nas')
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     nas_ip_address = models.CharField(_('NAS IP Address'), max_length=45, blank=True, null=True)
     nas_port_id = models.CharField(_('NAS Port ID'), max_length=MAX_LEN)
     nas_port_type = models.CharField(_('NAS Port Type'), max_length=MAX_LEN)
     calling_station_id = models.CharField(_('Calling Station ID'), max_length=MAX_LEN)
     user_address = models.CharField(_('User Address'), max_length=45)
-    download = models.CharField(_('Download'), max_length=MAX_LEN)
-    upload = models.CharField(_('Upload'), max_length=MAX_LEN)
-    uptime = models.CharField(_('Uptime'), max_length=MAX_LEN)
+    download = models.BigIntegerField(_('Download'), default=0, help_text=_('Bytes'))
+    upload = models.BigIntegerField(_('Upload'), default=0, help_text=_('Bytes'))
+    uptime = models.BigIntegerField(_('Uptime'), default=0, help_text=_('Seconds'))
     status = models.CharField(_('Status'), max_length=MAX_LEN)
-    started = models.CharField(_('Started'), max_length=MAX_LEN, null=True, blank=True)
-    ended = models.CharField(_('Ended'), max_length=MAX_LEN, null=True, blank=True)
-    last_accounting_packet = models.CharField(_('Last Accounting Packet'), max_length=MAX_LEN, null=True, blank=True)
+    started = models.DateTimeField(_('Started'), null=True, blank=True)
+    ended = models.DateTimeField(_('Ended'), null=True, blank=True)
+    last_accounting_packet = models.DateTimeField(_('Last Accounting Packet'), null=True, blank=True)
     terminate_cause = models.CharField(_('Terminate Cause'), max_length=MAX_LEN, blank=True, null=True)
 
     class Meta:
         ordering = ['-started']
+        constraints = mikrotik_id_constraints('session') + mikrotik_id_constraints('session', 'session_id')
+        indexes = [
+            # per-user period usage and per-organization time-ordered listings are range scans
+            models.Index(fields=['user', 'started'], name='session_user_started_idx'),
+            models.Index(fields=['organization', 'started'], name='session_org_started_idx'),
+        ]
 
     def __str__(self):
         return f"Session {self.session_id} for {self.user.username}"
 
     def get_session_status(self):
-        closed_statuses = {'stop', 'close-acked', 'expired'}
         statuses = set(self.status.split(','))
-        return 'Closed' if closed_statuses & statuses else 'Running'
+        return 'Closed' if CLOSED_SESSION_STATUSES & statuses else 'Running'
         
     def get_terminate_cause(self):
         if self.terminate_cause == 'admin-reset':
@@ -319,137 +342,332 @@ class Session(models.Model):
             return None
         
     def session_traffic(self):
-        try:
-            download_size = int(self.download)
-            upload_size = int(self.upload)
-            return download_size + upload_size
-        except (ValueError, TypeError):
-            return 0
+        return self.download + self.upload
 
     def formatted_download(self):
-        try:
-            bytes_size = int(self.download)
-            return format_traffic_size(bytes_size)
-        except (ValueError, TypeError):
-            return "Invalid download size"
+        return format_traffic_size(self.download)
 
     def formatted_upload(self):
-        try:
-            bytes_size = int(self.upload)
-            return format_traffic_size(bytes_size)
-        except (ValueError, TypeError):
-            return "Invalid upload size"
+        return format_traffic_size(self.upload)
 
     def formatted_total_traffic(self):
         return format_traffic_size(self.session_traffic())
 
+    def formatted_uptime(self):
+        return format_uptime(self.uptime)
+
+
+class UserUsageDaily(BaseMixin):
+    """Per-user usage rollup of the sessions started on one day, kept up to date by the session sync."""
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, blank=True, null=True, related_name='userusagedaily_org')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='daily_usage')
+    day = models.DateField(_('day'))
+    download = models.BigIntegerField(_('download'), default=0, help_text=_('Bytes'))
+    upload = models.BigIntegerField(_('upload'), default=0, help_text=_('Bytes'))
+    uptime_seconds = models.BigIntegerField(_('uptime'), default=0, help_text=_('Seconds'))
+    session_count = models.PositiveIntegerField(_('sessions'), default=0)
+
+    class Meta:
+        ordering = ['-day']
+        verbose_name = _('daily user usage')
+        verbose_name_plural = _('daily user usage')
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'day'], name='userusagedaily_unique_user_day'),
+        ]
+        indexes = [
+            models.Index(fields=['organization', 'day'], name='userusagedaily_org_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} @ {self.day}: {self.session_count} sessions"
+
+
+class QuotaBreach(BaseMixin):
+    """
+    A user who went over one of the limits of a limitation during a reset period. The user is
+    disabled and disconnected on the router until the period ends, or until the user profile
+    is replaced when the limitation's counters never reset.
+    """
+    METRIC_CHOICES = [
+        ('transfer', 'Transfer'),
+        ('download', 'Download'),
+        ('upload', 'Upload'),
+        ('uptime', 'Uptime'),
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    organization = models.ForeignKey(Organization, on_delete=models.CASCADE, blank=True, null=True, related_name='quotabreach_org')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='quota_breaches')
+    user_profile = models.ForeignKey(UserProfile, on_delete=models.SET_NULL, blank=True, null=True)
+    limitation = models.ForeignKey(Limitation, on_delete=models.CASCADE)
+    metric = models.CharField(_('metric'), max_length=16, choices=METRIC_CHOICES)
+    usage = models.BigIntegerField(_('usage'), help_text=_('Bytes, or seconds for uptime'))
+    limit = models.BigIntegerField(_('limit'), help_text=_('Bytes, or seconds for uptime'))
+    period_start = models.DateTimeField(_('period start'))
+    period_end = models.DateTimeField(_('period end'), null=True, blank=True)
+    enforced = models.DateTimeField(_('enforced'), null=True, blank=True, help_text=_('When the user was disabled on the router'))
+    lifted = models.DateTimeField(_('lifted'), null=True, blank=True, help_text=_('When the user was enabled again'))
+    error = models.TextField(_('error'), blank=True, default='')
+
+    class Meta:
+        ordering = ['-created']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'limitation', 'period_start'], name='quotabreach_unique_user_period'),
+        ]
+        indexes = [
+            models.Index(fields=['lifted', 'period_end'], name='quotabreach_lifted_end_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} over {self.metric} of {self.limitation_id} since {self.period_start}"
+
+
+class SyncWatermark(BaseMixin):
+    """Highest MikroTik record already ingested for a router, used by the incremental sync."""
+    router = models.CharField(_('router'), max_length=MAX_LEN)
+    resource = models.CharField(_('resource'), max_length=MAX_LEN)
+    last_accounting_packet = models.DateTimeField(_('last accounting packet'), null=True, blank=True)
+    last_mikrotik_id = models.CharField(_('last MikroTik ID'), max_length=MAX_LEN, null=True, blank=True)
+
+    class Meta:
+        unique_together = ('router', 'resource')
+
+    def __str__(self):
+        return f"{self.router} {self.resource} @ {self.last_accounting_packet or self.last_mikrotik_id}"
+
+
+class SyncRun(models.Model):
+    """One MikroTik -> Django sync pass for a router, with per-step timings in seconds."""
+    STATUS_CHOICES = [
+        ('success', 'Success'),
+        ('failed', 'Failed'),
+    ]
+    nas = models.ForeignKey(Nas, on_delete=models.CASCADE, blank=True, null=True, related_name='sync_runs')
+    router = models.CharField(_('router'), max_length=256)
+    started = models.DateTimeField(_('started'), db_index=True)
+    duration = models.FloatField(_('duration'), default=0)
+    status = models.CharField(_('status'), max_length=MAX_LEN, choices=STATUS_CHOICES, default='success')
+    timings = models.JSONField(_('timings'), default=dict, blank=True)
+    latency = models.JSONField(_('latency'), default=dict, blank=True, help_text='Per-endpoint router latency histograms')
+    error = models.TextField(_('error'), blank=True, null=True)
+
+    class Meta:
+        ordering = ['-started']
+
+    def __str__(self):
+        return f"{self.router} @ {self.started:%Y-%m-%d %H:%M:%S} ({self.duration:.2f}s, {self.status})"
+
+
+class OutboxEvent(BaseMixin):
+    """
+    Pending push of a Django object to MikroTik, written in the same transaction as the save
+    that caused it and drained by the `drain_outbox` task. At most one event per object is pending.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('failed', 'Failed'),
+    ]
+    model = models.CharField(_('model'), max_length=MAX_LEN, help_text='e.g. billings.profile')
+    object_id = models.CharField(_('object ID'), max_length=MAX_LEN)
+    status = models.CharField(_('status'), max_length=10, choices=STATUS_CHOICES, default='pending')
+    revision = models.PositiveIntegerField(_('revision'), default=0, help_text='Bumped by every save while the push is pending')
+    attempts = models.PositiveIntegerField(_('attempts'), default=0)
+    next_attempt = models.DateTimeField(_('next attempt'), default=timezone.now)
+    last_error = models.TextField(_('last error'), blank=True, null=True)
+
+    class Meta:
+        ordering = ['created']
+        indexes = [models.Index(fields=['status', 'next_attempt'], name='outbox_status_next_attempt')]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['model', 'object_id'],
+                condition=models.Q(status='pending'),
+                name='unique_pending_outbox_event',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.model} {self.object_id} ({self.status})"
+
+
+class PushJob(BaseMixin):
+    """Background push of many objects selected in the admin to MikroTik, with progress and per-object results."""
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    model = models.CharField(_('model'), max_length=MAX_LEN, help_text='e.g. billings.profile')
+    nas = models.ForeignKey(Nas, on_delete=models.CASCADE, blank=True, null=True, related_name='push_jobs', help_text=_('Router the objects are pushed to'))
+    object_ids = models.JSONField(_('object IDs'), default=list, blank=True)
+    requested_by = models.CharField(_('requested by'), max_length=MAX_LEN, blank=True)
+    status = models.CharField(_('status'), max_length=10, choices=STATUS_CHOICES, default='queued')
+    total = models.PositiveIntegerField(_('total'), default=0)
+    processed = models.PositiveIntegerField(_('processed'), default=0)
+    created_count = models.PositiveIntegerField(_('created'), default=0)
+    updated_count = models.PositiveIntegerField(_('updated'), default=0)
+    unchanged_count = models.PositiveIntegerField(_('unchanged'), default=0)
+    failed_count = models.PositiveIntegerField(_('failed'), default=0)
+    results = models.JSONField(_('results'), default=list, blank=True)
+    started = models.DateTimeField(_('started'), blank=True, null=True)
+    finished = models.DateTimeField(_('finished'), blank=True, null=True)
+    error = models.TextField(_('error'), blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created']
+
+    def __str__(self):
+        return f"Push of {self.total} {self.model} ({self.status})"
+
+    def record(self, obj, action, error=None):
+        """Count the outcome of one object and keep it in the per-object results."""
+        self.processed += 1
+        if error:
+            self.failed_count += 1
+        else:
+            counter = f'{action}_count'
+            setattr(self, counter, getattr(self, counter) + 1)
+        self.results.append({'id': str(obj.pk), 'object': str(obj), 'action': action, 'error': error})
+
+    def save_progress(self):
+        self.save(update_fields=[
+            'total', 'processed', 'created_count', 'updated_count', 'unchanged_count',
+            'failed_count', 'results', 'modified',
+        ])
+
+    def summary(self):
+        return (
+            f"{self.processed}/{self.total} processed: {self.created_count} created, "
+            f"{self.updated_count} updated, {self.unchanged_count} unchanged, {self.failed_count} failed"
+        )
+
 
 def get_user_all_time_uptime(user):
-    total_uptime_seconds = 0
-    
-    # Fetch all sessions for the user
-    sessions = Session.objects.filter(user=user)
-
-    for session in sessions:
-        if session.uptime:
-            match = re.match(r'(?:(\d+)h)?(?:(\d+)m)?(?:(\d+)s)?', session.uptime)
-            if match:
-                hours = int(match.group(1) or 0)
-                minutes = int(match.group(2) or 0)
-                seconds = int(match.group(3) or 0)
-                total_uptime_seconds += hours * 3600 + minutes * 60 + seconds
-
-    return timedelta(seconds=total_uptime_seconds)
-
-# def get_user_all_time_traffic(user):
-#     """Calculate total download and upload for a user."""
-#     total_traffic = Session.objects.filter(user=user).aggregate(
-#         total_download=Sum('download'),
-#         total_upload=Sum('upload')
-#     )
-#     return {
-#         'total_download': total_traffic['total_download'] or 0,
-#         'total_upload': total_traffic['total_upload'] or 0,
-#         'total_traffic': (total_traffic['total_download'] or 0) + (total_traffic['total_upload'] or 0),
-#     }
+    """Total time the user spent online, across all sessions."""
+    total = UserUsageDaily.objects.filter(user=user).aggregate(total_uptime=Sum('uptime_seconds'))
+    return timedelta(seconds=total['total_uptime'] or 0)
+
+
 def get_user_all_time_traffic(user):
     """Calculate total download and upload for a user."""
-    sessions = Session.objects.filter(user=user)
-    
-    total_download = 0
-    total_upload = 0
-    
-    for session in sessions:
-        try:
-            # Convert 'download' and 'upload' to integers (handle invalid data gracefully)
-            total_download += int(session.download or 0)
-            total_upload += int(session.upload or 0)
-        except ValueError:
-            # In case of conversion error (invalid data), skip that session or log it
-            pass
-
+    total_traffic = UserUsageDaily.objects.filter(user=user).aggregate(
+        total_download=Sum('download'),
+        total_upload=Sum('upload')
+    )
     return {
-        'total_download': total_download,
-        'total_upload': total_upload,
-        'total_traffic': total_download + total_upload,
+        'total_download': total_traffic['total_download'] or 0,
+        'total_upload': total_traffic['total_upload'] or 0,
+        'total_traffic': (total_traffic['total_download'] or 0) + (total_traffic['total_upload'] or 0),
     }
 
-def get_user_traffic_and_time_for_a_period(user_profile_id):
-    """Get user traffic and time within a specific validity period."""
-    try:
-        user_profile = UserProfile.objects.get(id=user_profile_id)
-        
-        profile = user_profile.profile
-        validity_duration = parse_validity(profile.validity)
-        start_time = user_profile.created
-        end_time = start_time + validity_duration
-
-        if user_profile.end_time:
-            end_time_from_string = timezone.datetime.fromisoformat(user_profile.end_time)
-            if end_time_from_string.tzinfo is None:
-                end_time_from_string = timezone.make_aware(end_time_from_string)
-            end_time = min(end_time, end_time_from_string)
-
-        sessions = Session.objects.filter(
-            user=user_profile.user,
-            started__gte=start_time,
-            started__lt=end_time
-        )
 
-        total_download = sum(int(session.download) for session in sessions if session.download.isdigit())
-        total_upload = sum(int(session.upload) for session in sessions if session.upload.isdigit())
-        total_traffic = total_download + total_upload
-        total_time = sum(parse_uptime(session.uptime) for session in sessions)
+def _day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
 
-        return {
-            'total_download': total_download,
-            'total_upload': total_upload,
-            'total_traffic': total_traffic,
-            'total_time': total_time,
-            'sessions_count': sessions.count()
-        }
+def get_usage_between(user_id, start, end):
+    """
+    Traffic, time and number of the sessions a user started in [start, end).
 
-    except ObjectDoesNotExist:
+    Whole days are read from the UserUsageDaily rollup; only the partial days at either end
+    of the range are summed from the sessions themselves.
+    """
+    usage = {'download': 0, 'upload': 0, 'uptime_seconds': 0, 'session_count': 0}
+    if start >= end:
+        return usage
+    first_day = timezone.localdate(start)
+    if start > _day_start(first_day):
+        first_day += timedelta(days=1)
+    last_day = timezone.localdate(end) - timedelta(days=1)
+
+    if first_day <= last_day:
+        partial_days = (
+            Q(started__gte=start, started__lt=_day_start(first_day))
+            | Q(started__gte=_day_start(last_day + timedelta(days=1)), started__lt=end)
+        )
+        rollup = UserUsageDaily.objects.filter(user_id=user_id, day__gte=first_day, day__lte=last_day).aggregate(
+            download=Sum('download'),
+            upload=Sum('upload'),
+            uptime_seconds=Sum('uptime_seconds'),
+            session_count=Sum('session_count'),
+        )
+    else:
+        partial_days = Q(started__gte=start, started__lt=end)
+        rollup = {}
+    sessions = Session.objects.filter(partial_days, user_id=user_id).aggregate(
+        download=Sum('download'),
+        upload=Sum('upload'),
+        uptime_seconds=Sum('uptime'),
+        session_count=Count('id'),
+    )
+    for totals in (rollup, sessions):
+        for key, value in totals.items():
+            usage[key] += value or 0
+    return usage
+
+
+def get_user_profiles_usage(user_profile_ids):
+    """
+    Download, upload, time and session count within the validity window of each user profile
+    in `user_profile_ids`, keyed by user profile id. Two queries, whatever the batch size.
+
+    A window opens when the user profile is created and closes when its profile's validity
+    runs out or at its end time, whichever comes first (now, for profiles that never expire).
+    The database computes the windows; whole days in them are summed from the UserUsageDaily
+    rollup and only the partial days at either end from the sessions.
+    """
+    validity_end = ExpressionWrapper(F('created') + F('profile__validity_duration'), output_field=models.DateTimeField())
+    day_start = Trunc('created', 'day', output_field=models.DateTimeField())
+    windows = UserProfile.objects.filter(id__in=user_profile_ids).order_by().annotate(
+        window_end=Coalesce(Least(validity_end, F('end_time')), validity_end, F('end_time'), Now()),
+    ).annotate(
+        # [full_from, full_until) covers the whole days of the window; empty when it spans no midnight
+        full_from=Case(
+            When(created=day_start, then=day_start),
+            default=ExpressionWrapper(day_start + timedelta(days=1), output_field=models.DateTimeField()),
+        ),
+        full_until=Trunc('window_end', 'day', output_field=models.DateTimeField()),
+    )
+    full_days = Q(user__daily_usage__day__gte=TruncDate('full_from'), user__daily_usage__day__lt=TruncDate('full_until'))
+    partial_days = Q(user__session__started__gte=F('created'), user__session__started__lt=F('window_end')) & (
+        Q(user__session__started__lt=F('full_from')) | Q(user__session__started__gte=F('full_until'))
+    )
+    rollup = windows.annotate(
+        download=Sum('user__daily_usage__download', filter=full_days),
+        upload=Sum('user__daily_usage__upload', filter=full_days),
+        uptime_seconds=Sum('user__daily_usage__uptime_seconds', filter=full_days),
+        session_count=Sum('user__daily_usage__session_count', filter=full_days),
+    ).values('id', 'download', 'upload', 'uptime_seconds', 'session_count')
+    sessions = windows.annotate(
+        download=Sum('user__session__download', filter=partial_days),
+        upload=Sum('user__session__upload', filter=partial_days),
+        uptime_seconds=Sum('user__session__uptime', filter=partial_days),
+        session_count=Count('user__session', filter=partial_days),
+    ).values('id', 'download', 'upload', 'uptime_seconds', 'session_count')
+
+    usage = {}
+    for totals in (*rollup, *sessions):
+        merged = usage.setdefault(totals.pop('id'), {'download': 0, 'upload': 0, 'uptime_seconds': 0, 'session_count': 0})
+        for key, value in totals.items():
+            merged[key] += value or 0
+    return usage
+
+
+def get_user_traffic_and_time_for_a_period(user_profile_id):
+    """Get user traffic and time within a specific validity period."""
+    usage = next(iter(get_user_profiles_usage([user_profile_id]).values()), None)
+    if usage is None:
         return {'error': 'UserProfile not found.'}
-    except ValueError:
-        return {'error': 'Invalid data encountered in session download/upload.'}
-
-
-def parse_validity(validity_str):
-    """Parse validity string (like '30d 00:00:00') into a timedelta object."""
-    days, hours, minutes, seconds = 0, 0, 0, 0
-    matches = re.findall(r'(\d+)([d|h|m|s])', validity_str)
-
-    for match in matches:
-        value, unit = match
-        value = int(value)
-        if unit == 'd':
-            days += value
-        elif unit == 'h':
-            hours += value
-        elif unit == 'm':
-            minutes += value
-        elif unit == 's':
-            seconds += value
-
-    return timedelta(days=days, hours=hours, minutes=minutes, seconds=seconds)
+    return {
+        'total_download': usage['download'],
+        'total_upload': usage['upload'],
+        'total_traffic': usage['download'] + usage['upload'],
+        'total_time': usage['uptime_seconds'],
+        'sessions_count': usage['session_count'],
+    }
+
+
+def profile_validity(validity_str):
+    """Profile validity as a timedelta, or None when it never expires ('0' or empty)."""
+    return parse_timedelta(validity_str) or None
@@ -0,0 +1,118 @@
+# mpi_src/appshere/billings/outbound.py
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import timedelta
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import settings as app_settings
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+DRAIN_QUEUED_KEY = 'mikrotik-outbox-drain-queued'
+
+
+# ------------------------------- sync origin
+@contextmanager
+def sync_origin():
+    """
+    Mark the saves made inside the block as coming from the router, so they are not
+    pushed back to it. Used by the inbound sync and when storing IDs the router assigned.
+    """
+    _local.sync_depth = getattr(_local, 'sync_depth', 0) + 1
+    try:
+        yield
+    finally:
+        _local.sync_depth -= 1
+
+
+def is_sync_origin():
+    return getattr(_local, 'sync_depth', 0) > 0
+
+
+# ------------------------------- outbox
+def enqueue_push(instance):
+    """
+    Queue a push of `instance` to MikroTik in the current transaction.
+
+    Saves of an object whose push is still pending only bump the event's revision, so a
+    burst of saves results in a single router call with the latest state.
+    """
+    label = instance._meta.label_lower
+    object_id = str(instance.pk)
+    if not _bump_pending(label, object_id):
+        try:
+            with transaction.atomic():
+                OutboxEvent.objects.create(model=label, object_id=object_id)
+        except IntegrityError:
+            # a concurrent save queued the event first: fold this one into it
+            _bump_pending(label, object_id)
+    schedule_drain()
+
+
+def _bump_pending(label, object_id):
+    return OutboxEvent.objects.filter(model=label, object_id=object_id, status='pending').update(
+        revision=F('revision') + 1, modified=timezone.now(),
+    )
+
+
+def _drain_soon():
+    # registered by every save of a burst: only the first callback in OUTBOX_DRAIN_DELAY
+    # queues the task, whose countdown covers the events committed in the meantime
+    if not cache.add(DRAIN_QUEUED_KEY, True, timeout=app_settings.OUTBOX_DRAIN_DELAY):
+        return
+    from .tasks import drain_outbox
+    drain_outbox.apply_async(countdown=app_settings.OUTBOX_DRAIN_DELAY)
+
+
+def schedule_drain():
+    """Start draining the outbox once the current transaction commits; a burst of commits queues one drain."""
+    transaction.on_commit(_drain_soon)
+
+
+def claim_events(batch_size=None):
+    """
+    Claim up to `batch_size` due events for this worker. Claimed events are leased by moving
+    their next attempt forward, so they are picked up again if the worker dies mid-batch.
+    """
+    batch_size = batch_size or app_settings.OUTBOX_BATCH_SIZE
+    now = timezone.now()
+    with transaction.atomic():
+        events = list(
+            OutboxEvent.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt__lte=now)
+            .order_by('next_attempt')[:batch_size]
+        )
+        OutboxEvent.objects.filter(pk__in=[event.pk for event in events]).update(
+            next_attempt=now + timedelta(seconds=app_settings.OUTBOX_LEASE)
+        )
+    return events
+
+
+def retry_delay(attempts):
+    """Exponential backoff, in seconds, before retrying an event that failed `attempts` times."""
+    return min(app_settings.OUTBOX_RETRY_BACKOFF * 2 ** (attempts - 1), app_settings.OUTBOX_RETRY_BACKOFF_MAX)
+
+
+def complete_event(event):
+    """Remove a pushed event, unless the object was saved again while it was being pushed."""
+    if not OutboxEvent.objects.filter(pk=event.pk, revision=event.revision).delete()[0]:
+        OutboxEvent.objects.filter(pk=event.pk).update(next_attempt=timezone.now())
+
+
+def fail_event(event, error):
+    """Schedule a retry with backoff, or give up after OUTBOX_MAX_ATTEMPTS."""
+    event.attempts += 1
+    event.last_error = str(error)
+    if event.attempts >= app_settings.OUTBOX_MAX_ATTEMPTS:
+        event.status = 'failed'
+        logger.error(f"Giving up pushing {event.model} {event.object_id} to MikroTik after {event.attempts} attempts: {error}")
+    else:
+        event.next_attempt = timezone.now() + timedelta(seconds=retry_delay(event.attempts))
+    event.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt', 'modified'])
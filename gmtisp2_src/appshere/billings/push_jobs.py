@@ -0,0 +1,174 @@
+# mpi_src/appshere/billings/push_jobs.py
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from django.apps import apps
+from django.db import transaction
+from django.urls import reverse
+from django.utils.html import format_html
+from django.utils import timezone
+
+from utils.data_preparation import prepare_user_data, prepare_profile_data, prepare_limitation_data
+from appshere.accounts.models import Nas
+from . import settings as app_settings
+from .models import PushJob
+from .snapshots import invalidate_snapshot
+
+logger = logging.getLogger(__name__)
+
+# model label -> how its objects are pushed: snapshot resource, router listing, name attribute,
+# payload builder and manager methods
+PUSH_JOB_TYPES = {
+    'accounts.user': {
+        'resource': 'user',
+        'list': 'get_users',
+        'name': 'username',
+        'prepare': prepare_user_data,
+        'create': 'create_user',
+        'update': 'update_user',
+    },
+    'billings.profile': {
+        'resource': 'profile',
+        'list': 'get_profiles',
+        'name': 'name',
+        'prepare': prepare_profile_data,
+        'create': 'create_profile',
+        'update': 'update_profile',
+    },
+    'billings.limitation': {
+        'resource': 'limitation',
+        'list': 'get_limitations',
+        'name': 'name',
+        'prepare': prepare_limitation_data,
+        'create': 'create_limitation',
+        'update': 'update_limitation',
+    },
+}
+
+
+def create_push_job(queryset, requested_by='', nas=None):
+    """Record a bulk push of the objects in `queryset` to `nas`; run it with the `run_push_job` task."""
+    object_ids = [str(pk) for pk in queryset.values_list('pk', flat=True)]
+    return PushJob.objects.create(
+        model=queryset.model._meta.label_lower,
+        nas=nas,
+        object_ids=object_ids,
+        total=len(object_ids),
+        requested_by=requested_by,
+    )
+
+
+def create_push_jobs(queryset, requested_by=''):
+    """Split the selection by router: one push job per NAS the selected objects belong to."""
+    nas_ids = set(queryset.order_by().values_list('nas', flat=True).distinct())
+    routers = Nas.objects.in_bulk([nas_id for nas_id in nas_ids if nas_id is not None])
+    jobs = []
+    for nas_id in sorted(nas_ids, key=lambda nas_id: (nas_id is not None, str(nas_id))):
+        objects = queryset.filter(nas=nas_id) if nas_id is not None else queryset.filter(nas__isnull=True)
+        jobs.append(create_push_job(objects, requested_by=requested_by, nas=routers.get(nas_id)))
+    return jobs
+
+
+def start_push_job(modeladmin, request, queryset):
+    """Admin action body: queue background push jobs for the selection and link to their progress."""
+    from .tasks import run_push_job_task
+
+    jobs = create_push_jobs(queryset, requested_by=request.user.get_username())
+    for job in jobs:
+        transaction.on_commit(lambda job_id=str(job.pk): run_push_job_task.delay(job_id))
+        url = reverse('admin:billings_pushjob_change', args=[job.pk])
+        modeladmin.message_user(
+            request,
+            format_html(
+                'Pushing {} object(s) to {} in the background: <a href="{}">follow progress</a>.',
+                job.total, job.nas or 'MikroTik', url,
+            ),
+        )
+    return jobs
+
+
+def plan_push(objects, router_rows, job_type):
+    """
+    Diff the selected objects against one listing of the router.
+
+    Returns (obj, action, mikrotik_id, data) tuples where action is 'create', 'update'
+    or 'unchanged'; unchanged objects already match the router and need no call.
+    """
+    existing = {}
+    for row in router_rows:
+        existing.setdefault(row.get('name'), row)
+    plan = []
+    for obj in objects:
+        data = job_type['prepare'](obj)
+        row = existing.get(getattr(obj, job_type['name']))
+        if row is None:
+            plan.append((obj, 'create', None, data))
+        elif all(str(row.get(key, '')) == str(value) for key, value in data.items()):
+            plan.append((obj, 'unchanged', row['.id'], data))
+        else:
+            plan.append((obj, 'update', row['.id'], data))
+    return plan
+
+
+def _push(mikrotik_manager, job_type, action, mikrotik_id, data):
+    if action == 'create':
+        response = getattr(mikrotik_manager, job_type['create'])(data)
+        mikrotik_id = (response or {}).get('.id')
+    else:
+        response = getattr(mikrotik_manager, job_type['update'])(mikrotik_id, data)
+    if response is None:
+        raise ValueError('No valid response received from MikroTik')
+    return mikrotik_id
+
+
+def run_push_job(job, mikrotik_manager, max_workers=None):
+    """Push the job's objects to the router with bounded concurrency, recording progress on the job."""
+    job_type = PUSH_JOB_TYPES[job.model]
+    model = apps.get_model(job.model)
+    max_workers = max_workers or app_settings.PUSH_JOB_WORKERS
+
+    job.status = 'running'
+    job.started = timezone.now()
+    job.save(update_fields=['status', 'started', 'modified'])
+    try:
+        objects = model.objects.filter(pk__in=job.object_ids)
+        plan = plan_push(objects, getattr(mikrotik_manager, job_type['list'])(), job_type)
+        job.total = len(plan)
+
+        to_push = []
+        for obj, action, mikrotik_id, data in plan:
+            if action == 'unchanged':
+                job.record(obj, action)
+            else:
+                to_push.append((obj, action, mikrotik_id, data))
+        job.save_progress()
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(_push, mikrotik_manager, job_type, action, mikrotik_id, data): (obj, action)
+                for obj, action, mikrotik_id, data in to_push
+            }
+            for index, future in enumerate(as_completed(futures), start=1):
+                obj, action = futures[future]
+                try:
+                    mikrotik_id = future.result()
+                except Exception as e:
+                    job.record(obj, action, error=str(e))
+                else:
+                    job.record(obj, action)
+                    if mikrotik_id and obj.mikrotik_id != mikrotik_id:
+                        # queryset update: no post_save, so nothing is queued back to the router
+                        model.objects.filter(pk=obj.pk).update(mikrotik_id=mikrotik_id)
+                if index % app_settings.PUSH_JOB_PROGRESS_EVERY == 0:
+                    job.save_progress()
+    except Exception as e:
+        job.status = 'failed'
+        job.error = str(e)
+        logger.error(f"Push job {job.pk} failed: {e}", exc_info=True)
+    else:
+        job.status = 'done'
+        logger.info(f"Push job {job.pk} finished: {job.summary()}")
+    finally:
+        invalidate_snapshot(mikrotik_manager, job_type['resource'])
+        job.finished = timezone.now()
+        job.save()
+    return job
@@ -0,0 +1,427 @@
+# mpi_src/appshere/billings/quotas.py
+"""
+Quota enforcement.
+
+Each chunk of sessions stored by the session sync is passed to `record_sessions`, which adds
+what the sessions grew by to per-user running counters kept in the Django cache (Redis in
+production), one counter per user and reset period of their limitations. The limits of the
+users in the chunk are then evaluated in one batch, and a QuotaBreach is recorded for each user
+who just went over one. `enforce_breaches` disables and disconnects those users on their router;
+`lift_breaches` enables them again once the period is over.
+"""
+import calendar
+import logging
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from utils.durations import parse_duration
+from utils.metrics import parse_router_datetime, parse_traffic_size
+from utils.mikrotik_userman import MikroTikError
+from appshere.accounts.models import User
+from . import settings as app_settings
+from .models import ProfileLimitation, QuotaBreach, Session, get_user_profiles_usage
+from .routers import get_router_manager
+from .snapshots import find_id
+
+logger = logging.getLogger(__name__)
+
+METRICS = ('download', 'upload', 'uptime')
+PERIOD_LENGTHS = {
+    'hourly': timedelta(hours=1),
+    'daily': timedelta(days=1),
+    'weekly': timedelta(weeks=1),
+}
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+ENFORCE_QUEUED_KEY = 'quota-enforce-queued'
+
+
+def _counter_key(user_id, period):
+    return f'quota-usage:{user_id}:{period}'
+
+
+def _session_key(session):
+    # acct-session-ids are only unique per router
+    return f'quota-session:{session.nas_id}:{session.session_id}'
+
+
+# ------------------------------- limitation rules
+def limitation_limits(limitation):
+    """Limits of `limitation`, in bytes and seconds, by metric; unlimited ('0') metrics are left out."""
+    limits = {
+        'transfer': parse_traffic_size(limitation.transfer_limit),
+        'download': parse_traffic_size(limitation.download_limit),
+        'upload': parse_traffic_size(limitation.upload_limit),
+        'uptime': parse_duration(limitation.uptime_limit),
+    }
+    return {metric: limit for metric, limit in limits.items() if limit}
+
+
+def _reset_anchor(limitation):
+    # by default counters reset on the hour, at midnight, on Mondays and on the 1st of the month
+    anchor = parse_router_datetime(limitation.reset_counters_start_time)
+    return timezone.localtime(anchor or timezone.make_aware(datetime(2000, 1, 3)))
+
+
+def _monthly_reset(anchor, year, month):
+    # the anchor's day of the month, or the last day of shorter months
+    return anchor.replace(year=year, month=month, day=min(anchor.day, calendar.monthrange(year, month)[1]))
+
+
+def counter_period(limitation, user_profile_created, now=None):
+    """
+    Start and end of the reset period of `limitation` that contains `now`. Counters that are
+    never reset run for the lifetime of the user profile: from its creation, with no end.
+    """
+    now = now or timezone.now()
+    interval = limitation.reset_counters_interval
+    if interval in PERIOD_LENGTHS:
+        # counted in local wall-clock time, so daily counters keep resetting at midnight across DST changes
+        anchor = timezone.make_naive(_reset_anchor(limitation))
+        length = PERIOD_LENGTHS[interval]
+        start = anchor + (timezone.make_naive(now) - anchor) // length * length
+        return timezone.make_aware(start), timezone.make_aware(start + length)
+    if interval == 'monthly':
+        anchor = _reset_anchor(limitation)
+        local = timezone.localtime(now)
+        year, month = local.year, local.month
+        start = _monthly_reset(anchor, year, month)
+        if start > now:
+            year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+            start = _monthly_reset(anchor, year, month)
+        year, month = (year, month + 1) if month < 12 else (year + 1, 1)
+        return start, _monthly_reset(anchor, year, month)
+    return user_profile_created, None
+
+
+def _clock(value, default):
+    if not value:
+        return default
+    seconds = parse_duration(value)
+    if seconds >= 86400:
+        return time.max
+    hours, remainder = divmod(seconds, 3600)
+    return time(hours, *divmod(remainder, 60))
+
+
+def in_time_window(profile_limitation, now=None):
+    """Whether the limitation of `profile_limitation` applies at `now`, given its weekdays and times of day."""
+    local = timezone.localtime(now or timezone.now())
+    weekdays = {day.strip().lower() for day in (profile_limitation.weekdays or '').split(',') if day.strip()}
+    if weekdays and WEEKDAYS[local.weekday()] not in weekdays:
+        return False
+    from_time = _clock(profile_limitation.from_time, time.min)
+    till_time = _clock(profile_limitation.till_time, time.max)
+    clock = local.time()
+    if from_time <= till_time:
+        return from_time <= clock <= till_time
+    # the window spans midnight
+    return clock >= from_time or clock <= till_time
+
+
+class QuotaRule:
+    """A limitation applying to a user through the profile of their running user profile."""
+
+    def __init__(self, profile_limitation, now):
+        self.user_id = profile_limitation.quota_user_id
+        self.user_profile_id = profile_limitation.quota_user_profile_id
+        self.organization_id = profile_limitation.quota_organization_id
+        self.limitation = profile_limitation.limitation
+        self.limits = limitation_limits(self.limitation)
+        self.period_start, self.period_end = counter_period(self.limitation, profile_limitation.quota_user_profile_created, now)
+        if self.period_end is None:
+            self.period = f'profile:{self.user_profile_id}'
+        else:
+            self.period = f'{self.limitation.reset_counters_interval}:{int(self.period_start.timestamp())}'
+        # usage is counted all the time, but only enforced within the limitation's time window
+        self.active = in_time_window(profile_limitation, now)
+
+    @property
+    def counter(self):
+        return self.user_id, self.period
+
+    def counter_ttl(self, now):
+        if self.period_end is None:
+            return app_settings.QUOTA_COUNTER_TTL
+        # kept a little past the end of the period, for sessions synced late
+        return max(int((self.period_end - now).total_seconds()) + 3600, 60)
+
+    def exceeded(self, usage):
+        """The first (metric, usage, limit) of the rule that `usage` reached, or None."""
+        values = dict(usage, transfer=usage['download'] + usage['upload'])
+        for metric, limit in self.limits.items():
+            if values[metric] >= limit:
+                return metric, values[metric], limit
+        return None
+
+
+def load_rules(user_ids, now=None):
+    """The QuotaRules of `user_ids` that set at least one limit, in a single query."""
+    now = now or timezone.now()
+    profile_limitations = (
+        ProfileLimitation.objects
+        .filter(
+            profile__userprofile__user_id__in=user_ids,
+            profile__userprofile__state='running-active',
+            limitation__isnull=False,
+        )
+        .select_related('limitation')
+        .annotate(
+            quota_user_id=F('profile__userprofile__user_id'),
+            quota_user_profile_id=F('profile__userprofile__id'),
+            quota_user_profile_created=F('profile__userprofile__created'),
+            quota_organization_id=F('profile__userprofile__organization_id'),
+        )
+        .order_by()
+    )
+    rules = (QuotaRule(profile_limitation, now) for profile_limitation in profile_limitations)
+    return [rule for rule in rules if rule.limits]
+
+
+# ------------------------------- running counters
+def _usage_deltas(sessions, created):
+    """
+    What each user's `sessions` added since their totals were last counted, by user id. A user
+    maps to None when the previous totals of one of their sessions are no longer known, in which
+    case their counters are seeded again from the database.
+    """
+    keyed = {_session_key(session): session for session in sessions}
+    seen = cache.get_many(list(keyed))
+    deltas = {}
+    for key, session in keyed.items():
+        previous = seen.get(key)
+        if previous is None and key not in created:
+            deltas[session.user_id] = None
+            continue
+        delta = deltas.setdefault(session.user_id, dict.fromkeys(METRICS, 0))
+        if delta is None:
+            continue
+        for metric, before, after in zip(METRICS, previous or (0, 0, 0), (session.download, session.upload, session.uptime)):
+            delta[metric] += max(after - before, 0)
+    cache.set_many(
+        {key: (session.download, session.upload, session.uptime) for key, session in keyed.items()},
+        app_settings.QUOTA_SESSION_TTL,
+    )
+    return deltas
+
+
+def _seed_counters(rules):
+    """
+    Counters of `rules` summed from the database: one grouped query per distinct period start,
+    and two for all the counters that run for a user profile's lifetime.
+    """
+    counters = {}
+    by_start = defaultdict(list)
+    lifetimes = []
+    for rule in rules:
+        (lifetimes if rule.period_end is None else by_start[rule.period_start]).append(rule)
+    for start, start_rules in by_start.items():
+        totals = {
+            total.pop('user_id'): total
+            for total in Session.objects
+            .filter(user_id__in={rule.user_id for rule in start_rules}, started__gte=start)
+            .order_by()
+            .values('user_id')
+            .annotate(download=Sum('download'), upload=Sum('upload'), uptime=Sum('uptime'))
+        }
+        for rule in start_rules:
+            total = totals.get(rule.user_id, {})
+            counters[rule.counter] = {metric: total.get(metric) or 0 for metric in METRICS}
+    if lifetimes:
+        usage = get_user_profiles_usage({rule.user_profile_id for rule in lifetimes})
+        for rule in lifetimes:
+            total = usage.get(rule.user_profile_id, {})
+            counters[rule.counter] = {
+                'download': total.get('download', 0),
+                'upload': total.get('upload', 0),
+                'uptime': total.get('uptime_seconds', 0),
+            }
+    return counters
+
+
+def update_counters(rules, deltas, now=None):
+    """
+    Add `deltas` to the cached counters of `rules` and return the counters by (user id, period).
+    Counters missing from the cache, or whose user has an unknown delta, are seeded from the
+    database, which already holds the synced sessions.
+    """
+    now = now or timezone.now()
+    rules_by_counter = {rule.counter: rule for rule in rules}
+    keys = {counter: _counter_key(*counter) for counter in rules_by_counter}
+    cached = cache.get_many(list(keys.values()))
+    counters = {}
+    cold = []
+    for counter, key in keys.items():
+        usage, delta = cached.get(key), deltas.get(counter[0])
+        if usage is None or delta is None:
+            cold.append(rules_by_counter[counter])
+        else:
+            counters[counter] = {metric: usage[metric] + delta[metric] for metric in METRICS}
+    if cold:
+        counters.update(_seed_counters(cold))
+
+    by_ttl = defaultdict(dict)
+    for counter, usage in counters.items():
+        by_ttl[rules_by_counter[counter].counter_ttl(now)][keys[counter]] = usage
+    for ttl, values in by_ttl.items():
+        cache.set_many(values, ttl)
+    return counters
+
+
+# ------------------------------- evaluation
+def record_breaches(rules, counters):
+    """
+    Record a QuotaBreach for every user who reached a limit of a rule in force, unless one is
+    already recorded for the same limitation and period. Returns the new breaches.
+    """
+    candidates = {}
+    for rule in rules:
+        usage = counters.get(rule.counter)
+        exceeded = rule.exceeded(usage) if rule.active and usage else None
+        if exceeded:
+            candidates.setdefault((rule.user_id, rule.limitation.pk, rule.period_start), (rule, *exceeded))
+    if not candidates:
+        return []
+    recorded = set(
+        QuotaBreach.objects.filter(
+            user_id__in={user_id for user_id, _, _ in candidates},
+            period_start__in={period_start for _, _, period_start in candidates},
+        ).values_list('user_id', 'limitation_id', 'period_start')
+    )
+    breaches = [
+        QuotaBreach(
+            organization_id=rule.organization_id,
+            user_id=rule.user_id,
+            user_profile_id=rule.user_profile_id,
+            limitation=rule.limitation,
+            metric=metric,
+            usage=usage,
+            limit=limit,
+            period_start=rule.period_start,
+            period_end=rule.period_end,
+        )
+        for key, (rule, metric, usage, limit) in candidates.items()
+        if key not in recorded
+    ]
+    # a concurrent sync of another router may have recorded the same breach meanwhile
+    QuotaBreach.objects.bulk_create(breaches, ignore_conflicts=True)
+    for breach in breaches:
+        logger.info(f"User {breach.user_id} reached the {breach.metric} limit of limitation {breach.limitation.name}")
+    return breaches
+
+
+def record_sessions(sessions, created=(), now=None):
+    """
+    Count what the synced `sessions` added against the quotas of their users and record the
+    users who went over a limit; enforcement on the router is scheduled for when the current
+    transaction commits. `created` are the sessions new to the database. Returns the new breaches.
+    """
+    if not app_settings.QUOTA_ENFORCEMENT or not sessions:
+        return []
+    now = now or timezone.now()
+    deltas = _usage_deltas(sessions, {_session_key(session) for session in created})
+    rules = load_rules(list(deltas), now)
+    if not rules:
+        return []
+    breaches = record_breaches(rules, update_counters(rules, deltas, now))
+    if breaches:
+        schedule_enforcement()
+    return breaches
+
+
+# ------------------------------- enforcement on the router
+def _enforce_soon():
+    # registered once per chunk with breaches: only the first callback in QUOTA_ENFORCE_DELAY
+    # queues the task, whose countdown covers the breaches committed in the meantime
+    if not cache.add(ENFORCE_QUEUED_KEY, True, timeout=app_settings.QUOTA_ENFORCE_DELAY):
+        return
+    from .tasks import enforce_quotas
+    enforce_quotas.apply_async(countdown=app_settings.QUOTA_ENFORCE_DELAY)
+
+
+def schedule_enforcement():
+    """Enforce the pending breaches once the current transaction commits; a burst of commits queues one run."""
+    transaction.on_commit(_enforce_soon)
+
+
+def _set_disabled(user, disabled):
+    mikrotik_manager = get_router_manager(user.nas)
+    mikrotik_id = user.mikrotik_id or find_id(mikrotik_manager, 'user', user.username)
+    if mikrotik_id is None:
+        raise MikroTikError(f"User {user.username} not found on {mikrotik_manager.router_ip}")
+    mikrotik_manager.update_user(mikrotik_id, {'disabled': str(disabled).lower()})
+    if disabled:
+        mikrotik_manager.disconnect_user(user.username)
+
+
+def _breaches_by_user(breaches):
+    by_user = defaultdict(list)
+    for breach in breaches:
+        by_user[breach.user_id].append(breach)
+    return by_user
+
+
+def enforce_breaches(now=None):
+    """
+    Disable and disconnect on their router the users of the breaches not enforced yet. Router
+    failures are kept on the breach and retried on the next run. Returns the number of users disabled.
+    """
+    now = now or timezone.now()
+    pending = QuotaBreach.objects.filter(enforced__isnull=True, lifted__isnull=True).select_related('user__nas')
+    enforced = []
+    for breaches in _breaches_by_user(pending).values():
+        user = breaches[0].user
+        try:
+            _set_disabled(user, True)
+        except MikroTikError as e:
+            logger.warning(f"Could not disable {user.username} on MikroTik: {e}")
+            QuotaBreach.objects.filter(pk__in=[breach.pk for breach in breaches]).update(error=str(e), modified=now)
+            continue
+        logger.info(f"Disabled {user.username} on MikroTik: over the {', '.join(breach.metric for breach in breaches)} limit")
+        enforced.extend(breaches)
+    if enforced:
+        User.objects.filter(pk__in={breach.user_id for breach in enforced}).update(disabled=True)
+        QuotaBreach.objects.filter(pk__in=[breach.pk for breach in enforced]).update(enforced=now, error='', modified=now)
+    return len({breach.user_id for breach in enforced})
+
+
+def lift_breaches(now=None):
+    """
+    Enable again the users whose breaches are over: their period ended, or their user profile,
+    which the counters of never-reset limitations are bound to, is no longer running.
+    Users still in another breach stay disabled. Returns the number of users enabled.
+    """
+    now = now or timezone.now()
+    open_breaches = QuotaBreach.objects.filter(lifted__isnull=True)
+    over = list(
+        open_breaches.filter(
+            Q(period_end__lte=now)
+            | (Q(period_end__isnull=True) & (Q(user_profile__isnull=True) | ~Q(user_profile__state='running-active')))
+        ).select_related('user__nas')
+    )
+    if not over:
+        return 0
+    still_breached = set(
+        open_breaches.exclude(pk__in=[breach.pk for breach in over])
+        .filter(user_id__in={breach.user_id for breach in over}, enforced__isnull=False)
+        .values_list('user_id', flat=True)
+    )
+    lifted, enabled = [], set()
+    for user_id, breaches in _breaches_by_user(over).items():
+        user = breaches[0].user
+        enforced = any(breach.enforced for breach in breaches)
+        if enforced and user_id not in still_breached:
+            try:
+                _set_disabled(user, False)
+            except MikroTikError as e:
+                logger.warning(f"Could not enable {user.username} on MikroTik: {e}")
+                continue
+            enabled.add(user_id)
+        lifted.extend(breaches)
+    if enabled:
+        User.objects.filter(pk__in=enabled).update(disabled=False)
+    QuotaBreach.objects.filter(pk__in=[breach.pk for breach in lifted]).update(lifted=now, modified=now)
+    return len(enabled)
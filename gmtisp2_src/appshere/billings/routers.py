@@ -0,0 +1,86 @@
+# mpi_src/appshere/billings/routers.py
+import logging
+import threading
+from django.conf import settings
+
+from utils.mikrotik_userman import MikroTikUserManager, transport_settings
+from appshere.accounts.models import Nas
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_ROUTER = 'default'
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def router_key(nas=None):
+    """Stable identifier of a router: the NAS primary key, or 'default' for the settings router."""
+    return str(nas.pk) if nas else DEFAULT_ROUTER
+
+
+def get_router_credentials(nas=None):
+    if nas is None:
+        return settings.ROUTER_IP, settings.ROUTER_USERNAME, settings.ROUTER_PASSWORD
+    return nas.api_url, nas.api_username, nas.api_password
+
+
+def get_router_manager(nas=None):
+    """
+    Return the MikroTikUserManager for `nas` (the router from settings when None).
+
+    One manager, and therefore one pooled HTTP session, is kept per router and process;
+    it is rebuilt when the NAS credentials change.
+    """
+    key = router_key(nas)
+    credentials = get_router_credentials(nas)
+    with _managers_lock:
+        cached = _managers.get(key)
+        if cached is None or cached[0] != credentials:
+            cached = (credentials, MikroTikUserManager(*credentials, **transport_settings()))
+            _managers[key] = cached
+    return cached[1]
+
+
+def clear_router_managers():
+    """Drop the cached managers, e.g. after the transport settings changed."""
+    with _managers_lock:
+        _managers.clear()
+
+
+def get_sync_routers():
+    """
+    NAS rows to pull data from. When no NAS has API access configured, the single
+    router from settings is synced instead (represented by None).
+    """
+    routers = list(Nas.objects.filter(sync_enabled=True).exclude(api_url=''))
+    return routers or [None]
+
+
+def adopts_untagged_rows(nas):
+    """
+    Whether the sync of `nas` takes over the rows stored before routers were tagged (nas NULL).
+    Those rows were synced from the router in settings, so they belong to the NAS of that
+    router, or to the only NAS synced when there is a single one.
+    """
+    if nas is None:
+        return False
+    if nas.api_url.rstrip('/') == settings.ROUTER_IP.rstrip('/'):
+        return True
+    return Nas.objects.filter(sync_enabled=True).exclude(api_url='').count() == 1
+
+
+def object_router(instance):
+    """
+    NAS whose router holds the MikroTik copy of `instance` (None for the router in settings).
+    Profile limitations live on the router of their profile, user profiles fall back to
+    the router of their user.
+    """
+    nas = getattr(instance, 'nas', None)
+    if nas is not None:
+        return nas
+    for parent in ('profile', 'user'):
+        related = getattr(instance, f'{parent}_id', None) and getattr(instance, parent)
+        if related is not None and getattr(related, 'nas', None) is not None:
+            return related.nas
+    return None
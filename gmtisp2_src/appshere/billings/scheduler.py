@@ -0,0 +1,113 @@
+# mpi_src/appshere/billings/scheduler.py
+import logging
+import time
+import uuid
+from contextlib import contextmanager
+from django.core.cache import cache
+
+from . import settings as app_settings
+from .models import SyncRun
+
+logger = logging.getLogger(__name__)
+
+# Sub-syncs of a router sync as a dependency graph: the steps of a stage run in parallel, and
+# a stage starts once every step of the previous one has finished. User usage is refreshed
+# with the sessions, from the same session listing.
+SYNC_STAGES = [
+    ['users', 'profiles', 'limitations'],
+    ['user_profiles', 'sessions'],
+]
+SYNC_STEPS = [step for stage in SYNC_STAGES for step in stage]
+
+
+def _lock_key(router):
+    return f'mikrotik-sync-lock:{router}'
+
+
+def _next_run_key(router):
+    return f'mikrotik-sync-next:{router}'
+
+
+def _step_key(router, step):
+    return f'mikrotik-sync-step:{router}:{step}'
+
+
+# ------------------------------- per-router lock
+def acquire_lock(router, timeout=None):
+    """
+    Take the sync lock of `router` without waiting. Returns the token to release it with,
+    or None when another worker holds it.
+
+    The lock lives in the Django cache (Redis in production), so it is shared by every
+    worker; it expires after `timeout` seconds in case its holder dies without releasing it.
+    """
+    token = uuid.uuid4().hex
+    if cache.add(_lock_key(router), token, timeout=timeout or app_settings.SYNC_LOCK_TIMEOUT):
+        return token
+    return None
+
+
+def release_lock(router, token):
+    """Release the lock taken with `token`; a lock taken over after ours expired is left alone."""
+    key = _lock_key(router)
+    if token and cache.get(key) == token:
+        cache.delete(key)
+
+
+@contextmanager
+def router_lock(router, timeout=None):
+    """Hold the sync lock of `router` for the duration of the block; yields False if it is taken."""
+    token = acquire_lock(router, timeout)
+    try:
+        yield token is not None
+    finally:
+        release_lock(router, token)
+
+
+def is_locked(router):
+    return cache.get(_lock_key(router)) is not None
+
+
+# ------------------------------- interval and cadences
+def next_interval(nas=None, router=None):
+    """
+    Seconds to wait between two syncs of a router: MIKROTIK_SYNC_INTERVAL, stretched to
+    MIKROTIK_SYNC_INTERVAL_FACTOR times the router's recent average run duration when runs
+    get slow, and capped at MIKROTIK_SYNC_INTERVAL_MAX.
+    """
+    runs = SyncRun.objects.filter(nas=nas)
+    if router:
+        runs = runs.filter(router=router)
+    durations = list(runs.order_by('-started').values_list('duration', flat=True)[:app_settings.SYNC_INTERVAL_WINDOW])
+    if not durations:
+        return app_settings.SYNC_INTERVAL
+    average = sum(durations) / len(durations)
+    interval = max(app_settings.SYNC_INTERVAL, average * app_settings.SYNC_INTERVAL_FACTOR)
+    return min(interval, app_settings.SYNC_INTERVAL_MAX)
+
+
+def is_due(router, now=None):
+    """Whether the router's next sync is due; routers never synced are due immediately."""
+    next_run = cache.get(_next_run_key(router))
+    return next_run is None or (now or time.time()) >= next_run
+
+
+def schedule_next(router, interval, now=None):
+    cache.set(_next_run_key(router), (now or time.time()) + interval, timeout=None)
+
+
+def due_steps(router, full=False, now=None):
+    """Sub-syncs whose MIKROTIK_SYNC_CADENCES period has elapsed for `router` (all of them when `full`)."""
+    if full:
+        return list(SYNC_STEPS)
+    now = now or time.time()
+    last_runs = cache.get_many([_step_key(router, step) for step in SYNC_STEPS])
+    return [
+        step for step in SYNC_STEPS
+        if now - last_runs.get(_step_key(router, step), 0) >= app_settings.SYNC_CADENCES.get(step, 0)
+    ]
+
+
+def mark_steps_done(router, steps, now=None):
+    now = now or time.time()
+    cache.set_many({_step_key(router, step): now for step in steps}, timeout=None)
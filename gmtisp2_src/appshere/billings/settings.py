@@ -0,0 +1,60 @@
+from django.conf import settings
+
+# Number of rows written per bulk_create / bulk_update statement during the MikroTik sync
+SYNC_BATCH_SIZE = getattr(settings, 'MIKROTIK_SYNC_BATCH_SIZE', 500)
+
+# Router sessions are streamed and written this many at a time, so a sync's memory use does not
+# grow with the length of the router's session history
+SESSION_CHUNK_SIZE = getattr(settings, 'MIKROTIK_SESSION_CHUNK_SIZE', 1000)
+
+# Upper bound on concurrent `monitor_user_usage` calls made while syncing user usage
+USAGE_MONITOR_WORKERS = getattr(settings, 'MIKROTIK_USAGE_MONITOR_WORKERS', 8)
+
+# Outbound pushes to MikroTik are queued in the outbox and drained by a Celery worker
+OUTBOX_BATCH_SIZE = getattr(settings, 'MIKROTIK_OUTBOX_BATCH_SIZE', 100)
+# Seconds to wait before draining, so a burst of saves results in a single push per object
+OUTBOX_DRAIN_DELAY = getattr(settings, 'MIKROTIK_OUTBOX_DRAIN_DELAY', 2)
+# Seconds a worker holds the events it claimed; unfinished events are retried afterwards
+OUTBOX_LEASE = getattr(settings, 'MIKROTIK_OUTBOX_LEASE', 300)
+OUTBOX_MAX_ATTEMPTS = getattr(settings, 'MIKROTIK_OUTBOX_MAX_ATTEMPTS', 8)
+# Exponential retry backoff, in seconds: base delay and upper bound
+OUTBOX_RETRY_BACKOFF = getattr(settings, 'MIKROTIK_OUTBOX_RETRY_BACKOFF', 30)
+OUTBOX_RETRY_BACKOFF_MAX = getattr(settings, 'MIKROTIK_OUTBOX_RETRY_BACKOFF_MAX', 3600)
+
+# Seconds a router's indexed listing (name -> .id) is reused by admin actions and delete signals
+SNAPSHOT_TTL = getattr(settings, 'MIKROTIK_SNAPSHOT_TTL', 30)
+
+# Concurrent router calls made by a bulk push job started from the admin
+PUSH_JOB_WORKERS = getattr(settings, 'MIKROTIK_PUSH_JOB_WORKERS', 4)
+# Save a running push job's progress every this many objects
+PUSH_JOB_PROGRESS_EVERY = getattr(settings, 'MIKROTIK_PUSH_JOB_PROGRESS_EVERY', 25)
+
+# Seconds between two syncs of a router while its runs are fast. The beat heartbeat dispatches
+# a sync to each router that is due and not already syncing (see billings.scheduler)
+SYNC_INTERVAL = getattr(settings, 'MIKROTIK_SYNC_INTERVAL', 30)
+# A router's interval is stretched to this many times its average run duration over the last
+# SYNC_INTERVAL_WINDOW runs, and never beyond SYNC_INTERVAL_MAX seconds
+SYNC_INTERVAL_FACTOR = getattr(settings, 'MIKROTIK_SYNC_INTERVAL_FACTOR', 2)
+SYNC_INTERVAL_WINDOW = getattr(settings, 'MIKROTIK_SYNC_INTERVAL_WINDOW', 5)
+SYNC_INTERVAL_MAX = getattr(settings, 'MIKROTIK_SYNC_INTERVAL_MAX', 600)
+# Minimum seconds between two runs of each sub-sync; steps not due are skipped by a router sync
+SYNC_CADENCES = getattr(settings, 'MIKROTIK_SYNC_CADENCES', {
+    'sessions': 0,
+    'users': 120,
+    'user_profiles': 120,
+    'profiles': 900,
+    'limitations': 900,
+})
+# Seconds after which a router's sync lock expires if its worker died holding it
+SYNC_LOCK_TIMEOUT = getattr(settings, 'MIKROTIK_SYNC_LOCK_TIMEOUT', 30 * 60)
+
+# Opt-in: disable and disconnect subscribers on the router as soon as the session sync sees
+# them go over a limit of their profile's limitations (see billings.quotas)
+QUOTA_ENFORCEMENT = getattr(settings, 'MIKROTIK_QUOTA_ENFORCEMENT', False)
+# Seconds the per-user quota counters are kept in the cache when their period never ends;
+# counters that expire are re-seeded from the database
+QUOTA_COUNTER_TTL = getattr(settings, 'MIKROTIK_QUOTA_COUNTER_TTL', 24 * 3600)
+# Seconds the last synced totals of a session are remembered, to count only what it added since
+QUOTA_SESSION_TTL = getattr(settings, 'MIKROTIK_QUOTA_SESSION_TTL', 2 * 24 * 3600)
+# Seconds to wait after a sync chunk recorded breaches before disabling the users on the router
+QUOTA_ENFORCE_DELAY = getattr(settings, 'MIKROTIK_QUOTA_ENFORCE_DELAY', 2)
@@ -4,11 +4,14 @@ from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.utils.timezone import now
 
+from utils.mikrotik_userman import MikroTikNotFound
+
 from .tasks import trigger_mikrotik_tasks
+from .outbound import is_sync_origin
+from .snapshots import find_id, forget
+from .routers import get_router_manager, object_router
 from .models import User, Profile, UserProfile, Limitation, ProfileLimitation, Payment, Session
-from utils.mikrotik_userman import init_mikrotik_manager
 
-mikrotik_manager = init_mikrotik_manager()
 logger = logging.getLogger(__name__)
 
 
@@ -18,7 +21,10 @@ logger = logging.getLogger(__name__)
 @receiver(post_save, sender=UserProfile)
 @receiver(post_save, sender=Limitation)
 @receiver(post_save, sender=ProfileLimitation)
-def trigger_mikrotik_task_on_save(sender, instance, created, **kwargs):
+def trigger_mikrotik_task_on_save(sender, instance, created, raw=False, **kwargs):
+    # Rows saved by the inbound sync (or loaded from fixtures) already match the router
+    if raw or is_sync_origin():
+        return
     trigger_mikrotik_tasks(instance, created, **kwargs)
 
 
@@ -36,13 +42,15 @@ def trigger_mikrotik_task_on_save(sender, instance, created, **kwargs):
 @receiver(post_delete, sender=User)
 def delete_user_signal(sender, instance, **kwargs):
     """Delete user from MikroTik when the user is deleted in Django."""
+    if is_sync_origin():
+        return
     if instance.mikrotik_id:
         try:
-            existing_user = next(
-                (u for u in mikrotik_manager.get_users() if u['name'] == instance.username), None
-            )
-            if existing_user:
-                mikrotik_manager.delete_user(user_id=existing_user['.id'])
+            mikrotik_manager = get_router_manager(object_router(instance))
+            existing_user_id = find_id(mikrotik_manager, 'user', instance.username)
+            if existing_user_id:
+                mikrotik_manager.delete_user(user_id=existing_user_id)
+                forget(mikrotik_manager, 'user', instance.username)
                 logger.info(f'Deleted user {instance.username} from MikroTik.')
             else:
                 logger.warning(f'User {instance.username} does not exist in MikroTik.')
@@ -52,13 +60,15 @@ def delete_user_signal(sender, instance, **kwargs):
 @receiver(post_delete, sender=Profile)
 def delete_profile_signal(sender, instance, **kwargs):
     """Delete profile from MikroTik when the profile is deleted in Django."""
+    if is_sync_origin():
+        return
     if instance.mikrotik_id:
         try:
-            existing_profile = next(
-                (p for p in mikrotik_manager.get_profiles() if p['name'] == instance.name), None
-            )
-            if existing_profile:
-                mikrotik_manager.delete_profile(profile_id=existing_profile['.id'])
+            mikrotik_manager = get_router_manager(object_router(instance))
+            existing_profile_id = find_id(mikrotik_manager, 'profile', instance.name)
+            if existing_profile_id:
+                mikrotik_manager.delete_profile(profile_id=existing_profile_id)
+                forget(mikrotik_manager, 'profile', instance.name)
                 logger.info(f'Deleted profile {instance.name} from MikroTik.')
             else:
                 logger.warning(f'Profile {instance.name} does not exist in MikroTik.')
@@ -68,29 +78,31 @@ def delete_profile_signal(sender, instance, **kwargs):
 @receiver(post_delete, sender=UserProfile)
 def delete_user_profile_signal(sender, instance, **kwargs):
     """Delete user profile from MikroTik when the user profile is deleted in Django."""
+    if is_sync_origin():
+        return
     if instance.mikrotik_id:
         try:
-            existing_user_profile = next(
-                (up for up in mikrotik_manager.get_user_profiles() if up['user'] == instance.user.username), None
-            )
-            if existing_user_profile:
-                mikrotik_manager.delete_user_profile(user_profile_id=existing_user_profile['.id'])
-                logger.info(f'Deleted user profile for {instance.user.username} from MikroTik.')
-            else:
-                logger.warning(f'User profile for {instance.user.username} does not exist in MikroTik.')
+            mikrotik_manager = get_router_manager(object_router(instance))
+            # a user can hold several profiles, so the row is addressed by its own `.id`
+            mikrotik_manager.delete_user_profile(user_profile_id=instance.mikrotik_id)
+            logger.info(f'Deleted user profile for {instance.user.username} from MikroTik.')
+        except MikroTikNotFound:
+            logger.warning(f'User profile for {instance.user.username} does not exist in MikroTik.')
         except Exception as e:
             logger.error(f'Error deleting user profile for {instance.user.username} from MikroTik: {e}', exc_info=True)
 
 @receiver(post_delete, sender=Limitation)
 def delete_limitation_signal(sender, instance, **kwargs):
     """Delete limitation from MikroTik when the limitation is deleted in Django."""
+    if is_sync_origin():
+        return
     if instance.mikrotik_id:
         try:
-            existing_limitation = next(
-                (l for l in mikrotik_manager.get_limitations() if l['name'] == instance.name), None
-            )
-            if existing_limitation:
-                mikrotik_manager.delete_limitation(limitation_id=existing_limitation['.id'])
+            mikrotik_manager = get_router_manager(object_router(instance))
+            existing_limitation_id = find_id(mikrotik_manager, 'limitation', instance.name)
+            if existing_limitation_id:
+                mikrotik_manager.delete_limitation(limitation_id=existing_limitation_id)
+                forget(mikrotik_manager, 'limitation', instance.name)
                 logger.info(f'Deleted limitation {instance.name} from MikroTik.')
             else:
                 logger.warning(f'Limitation {instance.name} does not exist in MikroTik.')
@@ -100,31 +112,33 @@ def delete_limitation_signal(sender, instance, **kwargs):
 @receiver(post_delete, sender=ProfileLimitation)
 def delete_profile_limitation_signal(sender, instance, **kwargs):
     """Delete profile limitation from MikroTik when the profile limitation is deleted in Django."""
+    if is_sync_origin():
+        return
     if instance.mikrotik_id:
         try:
-            existing_profile_limitation = next(
-                (pl for pl in mikrotik_manager.get_profile_limitations() if pl['profile'] == instance.profile.name), None
-            )
-            if existing_profile_limitation:
-                mikrotik_manager.delete_profile_limitation(limitation_id=existing_profile_limitation['.id'])
-                logger.info(f'Deleted profile limitation for {instance.profile.name} from MikroTik.')
-            else:
-                logger.warning(f'Profile limitation for {instance.profile.name} does not exist in MikroTik.')
+            mikrotik_manager = get_router_manager(object_router(instance))
+            # a profile can hold several limitations, so the row is addressed by its own `.id`
+            mikrotik_manager.delete_profile_limitation(profile_limitation_id=instance.mikrotik_id)
+            logger.info(f'Deleted profile limitation for {instance.profile.name} from MikroTik.')
+        except MikroTikNotFound:
+            logger.warning(f'Profile limitation for {instance.profile.name} does not exist in MikroTik.')
         except Exception as e:
             logger.error(f'Error deleting profile limitation for {instance.profile.name} from MikroTik: {e}', exc_info=True)
 
 @receiver(post_delete, sender=Session)
 def delete_session_signal(sender, instance, **kwargs):
     """Delete session from MikroTik when a Session is deleted in Django."""
+    if is_sync_origin():
+        return
     if instance.mikrotik_id:
         try:
-            existing_session = next(
-                (session for session in mikrotik_manager.get_sessions() if session['acct-session-id'] == instance.session_id), None
-            )
+            mikrotik_manager = get_router_manager(object_router(instance))
+            existing_session_id = find_id(mikrotik_manager, 'session', instance.session_id)
 
-            if existing_session:
+            if existing_session_id:
                 # Delete the session from MikroTik
-                mikrotik_manager.delete_session(session_id=existing_session['.id'])
+                mikrotik_manager.delete_session(session_id=existing_session_id)
+                forget(mikrotik_manager, 'session', instance.session_id)
                 logger.info(f'Deleted session {instance.session_id} from MikroTik.')
             else:
                 logger.warning(f'Session {instance.session_id} does not exist in MikroTik.')
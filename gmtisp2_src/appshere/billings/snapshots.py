@@ -0,0 +1,74 @@
+# mpi_src/appshere/billings/snapshots.py
+import logging
+from django.core.cache import cache
+
+from . import settings as app_settings
+
+logger = logging.getLogger(__name__)
+
+# resource -> (manager method listing the rows, field the rows are looked up by); user profiles
+# and profile limitations are not unique per user or profile, so they are only addressed by `.id`
+SNAPSHOT_RESOURCES = {
+    'user': ('get_users', 'name'),
+    'profile': ('get_profiles', 'name'),
+    'limitation': ('get_limitations', 'name'),
+    'session': ('get_sessions', 'acct-session-id'),
+}
+
+
+def _cache_key(mikrotik_manager, resource):
+    return f'mikrotik-snapshot:{mikrotik_manager.router_ip}:{resource}'
+
+
+def get_snapshot(mikrotik_manager, resource):
+    """
+    Return an index of a router's `resource` rows (lookup field -> `.id`), e.g. user name -> `.id`.
+
+    The index is built from a single listing of the resource and cached per router for
+    MIKROTIK_SNAPSHOT_TTL seconds, so loops over many objects do not download the list per object.
+    When several rows share a lookup value, the first one listed by the router wins.
+    """
+    key = _cache_key(mikrotik_manager, resource)
+    index = cache.get(key)
+    if index is None:
+        fetch, field = SNAPSHOT_RESOURCES[resource]
+        index = {}
+        # only the two columns of the index are downloaded
+        for row in getattr(mikrotik_manager, fetch)(proplist=['.id', field]):
+            index.setdefault(row.get(field), row.get('.id'))
+        # an empty listing is usually a failed request, so it is not cached
+        if index:
+            cache.set(key, index, app_settings.SNAPSHOT_TTL)
+    return index
+
+
+def lookup_id(mikrotik_manager, resource, value):
+    """Return the router `.id` of the `resource` row whose lookup field equals `value`, or None."""
+    return get_snapshot(mikrotik_manager, resource).get(value)
+
+
+def find_id(mikrotik_manager, resource, value):
+    """
+    Like `lookup_id`, for one-off lookups: when the snapshot is not cached, the router is
+    asked for the `.id` of the matching row only, instead of listing the whole resource.
+    """
+    index = cache.get(_cache_key(mikrotik_manager, resource))
+    if index is not None:
+        return index.get(value)
+    fetch, field = SNAPSHOT_RESOURCES[resource]
+    rows = getattr(mikrotik_manager, fetch)(proplist=['.id'], filters={field: value})
+    return rows[0].get('.id') if rows else None
+
+
+def forget(mikrotik_manager, resource, value):
+    """Drop a row deleted from the router from its cached snapshot, if one is cached."""
+    key = _cache_key(mikrotik_manager, resource)
+    index = cache.get(key)
+    if index is not None and index.pop(value, None) is not None:
+        cache.set(key, index, app_settings.SNAPSHOT_TTL)
+
+
+def invalidate_snapshot(mikrotik_manager, resource=None):
+    """Discard the cached snapshot of `resource`, or of every resource when None."""
+    resources = [resource] if resource else list(SNAPSHOT_RESOURCES)
+    cache.delete_many([_cache_key(mikrotik_manager, name) for name in resources])
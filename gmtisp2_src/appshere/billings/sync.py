@@ -0,0 +1,420 @@
+# mpi_src/appshere/billings/sync.py
+import hashlib
+import json
+import logging
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+from datetime import timedelta
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from utils.durations import parse_duration
+from utils.metrics import parse_router_datetime
+from . import settings as app_settings
+from .models import CLOSED_SESSION_STATUSES, Session, SyncWatermark, UserUsageDaily
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def timed(timings, name):
+    """Record the wall time of the block, in seconds, as `timings[name]`."""
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        timings[name] = round(time.monotonic() - start, 3)
+
+
+class SyncResult:
+    """Outcome of a bulk reconciliation pass: created/updated instances and the unchanged count."""
+
+    def __init__(self):
+        self.created = []
+        self.updated = []
+        self.unchanged = 0
+
+    @property
+    def changed(self):
+        return self.created + self.updated
+
+    def as_dict(self):
+        return {
+            'created': len(self.created),
+            'updated': len(self.updated),
+            'unchanged': self.unchanged,
+        }
+
+    def __str__(self):
+        return f"created={len(self.created)} updated={len(self.updated)} unchanged={self.unchanged}"
+
+
+def payload_hash(values):
+    """Stable content hash of a synced row; related objects are hashed by primary key."""
+    payload = {name: getattr(value, 'pk', value) for name, value in values.items()}
+    return hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _normalize(field, value):
+    """Convert a router value to what the model field holds, so comparisons are type-stable."""
+    if value is None:
+        return None
+    if field.is_relation:
+        return getattr(value, 'pk', value)
+    return field.to_python(value)
+
+
+def _apply_changes(obj, values, update_fields=None):
+    """Set the values that differ from `obj` and return the names of the fields that changed."""
+    changed = []
+    for name, value in values.items():
+        if update_fields is not None and name not in update_fields:
+            continue
+        field = obj._meta.get_field(name)
+        new_value = _normalize(field, value)
+        if getattr(obj, field.attname) != new_value:
+            setattr(obj, field.attname, new_value)
+            changed.append(name)
+    return changed
+
+
+def _load_existing(model, key_field, keys, scope, batch_size):
+    """Load the rows of `model` matching `keys` within `scope`, keyed by `key_field`."""
+    existing = {}
+    for start in range(0, len(keys), batch_size):
+        lookup = {**scope, f'{key_field}__in': keys[start:start + batch_size]}
+        for obj in model.objects.filter(**lookup):
+            existing[getattr(obj, key_field)] = obj
+    return existing
+
+
+def lookup_map(model, key_field, keys, batch_size=None, scope=None):
+    """
+    Map each of `keys` that exists in the database to its `model` row, so sync steps can
+    resolve references from the router payload without one query per row. `scope` (e.g.
+    ``{'nas': nas}``) restricts the lookup to one router's rows.
+    """
+    keys = sorted({key for key in keys if key})
+    return _load_existing(model, key_field, keys, scope or {}, batch_size or app_settings.SYNC_BATCH_SIZE)
+
+
+class MissingReferences:
+    """Collects router rows skipped because they reference unknown objects, reported as one warning."""
+
+    sample_size = 5
+
+    def __init__(self, resource):
+        self.resource = resource
+        self.skipped = 0
+        self.missing = defaultdict(set)
+
+    def __bool__(self):
+        return bool(self.skipped)
+
+    def skip(self, **references):
+        """Record a skipped row; `references` maps a kind (e.g. ``user``) to the unknown value."""
+        self.skipped += 1
+        for kind, value in references.items():
+            self.missing[kind].add(value)
+
+    def report(self):
+        if not self.skipped:
+            return
+        details = []
+        for kind, values in sorted(self.missing.items()):
+            sample = ', '.join(sorted(map(str, values))[:self.sample_size])
+            more = f" (+{len(values) - self.sample_size} more)" if len(values) > self.sample_size else ''
+            details.append(f"{len(values)} unknown {kind}(s): {sample}{more}")
+        logger.warning(f"Skipped {self.skipped} {self.resource} row(s) from MikroTik; {'; '.join(details)}")
+
+
+def bulk_reconcile(model, key_field, rows, update_fields=None, scope=None, batch_size=None, adopt=False):
+    """
+    Reconcile `rows` (a mapping of key -> field values) against the rows of `model`.
+
+    Existing rows are loaded keyed by `key_field` (one query per `batch_size` keys), diffed in
+    memory, and only new or changed rows are written with bulk_create / bulk_update in chunks.
+    `update_fields` restricts which fields may be changed on rows that already exist, and
+    `scope` (e.g. ``{'nas': nas}``) narrows the lookup and is set on the rows created.
+    With `adopt`, keys missing from the scope are also looked up among the rows stored before
+    the scope existed (scope fields NULL), and those rows are moved into the scope instead of
+    being created again.
+    Models with a `sync_hash` field store the hash of the row they were last synced from;
+    rows whose hash is unchanged are skipped without comparing their fields.
+    Bulk writes do not send post_save signals, so nothing is pushed back to the router.
+    """
+    batch_size = batch_size or app_settings.SYNC_BATCH_SIZE
+    scope = scope or {}
+    result = SyncResult()
+    if not rows:
+        return result
+
+    hashed = any(f.name == 'sync_hash' for f in model._meta.concrete_fields)
+    existing = _load_existing(model, key_field, list(rows), scope, batch_size)
+    adopted = {}
+    if adopt and scope:
+        untagged = [key for key in rows if key not in existing]
+        adopted = _load_existing(model, key_field, untagged, {name: None for name in scope}, batch_size)
+    to_create = []
+    to_update = []
+    changed_fields = set()
+
+    for key, values in rows.items():
+        digest = payload_hash(values) if hashed else None
+        obj = existing.get(key)
+        adopting = obj is None and key in adopted
+        if adopting:
+            obj = adopted[key]
+            values = {**values, **scope}
+        if obj is None:
+            extra = {'sync_hash': digest} if hashed else {}
+            to_create.append(model(**{**values, **scope, **extra, key_field: key}))
+            continue
+        if hashed and obj.sync_hash == digest and not adopting:
+            result.unchanged += 1
+            continue
+        fields = update_fields
+        if adopting and update_fields is not None:
+            fields = (*update_fields, *scope)
+        changed = _apply_changes(obj, values, fields)
+        if changed:
+            changed_fields.update(changed)
+            result.updated.append(obj)
+        else:
+            result.unchanged += 1
+        if hashed:
+            # rows synced before hashing existed (or with only ignored fields changed) just get the hash
+            obj.sync_hash = digest
+            changed_fields.add('sync_hash')
+            to_update.append(obj)
+        elif changed:
+            to_update.append(obj)
+
+    if to_create:
+        model.objects.bulk_create(to_create, batch_size=batch_size)
+        result.created = to_create
+
+    if to_update:
+        # bulk_update bypasses auto_now, so bump `modified` explicitly on the rows whose data changed
+        if result.updated and any(f.name == 'modified' for f in model._meta.concrete_fields):
+            now = timezone.now()
+            for obj in result.updated:
+                obj.modified = now
+            changed_fields.add('modified')
+        model.objects.bulk_update(to_update, sorted(changed_fields), batch_size=batch_size)
+
+    return result
+
+
+# ------------------------------- incremental sync watermarks
+def mikrotik_id_value(mikrotik_id):
+    """MikroTik `.id` values are hex counters prefixed with '*' (e.g. '*1A'); return them as integers."""
+    try:
+        return int(str(mikrotik_id).lstrip('*'), 16)
+    except (TypeError, ValueError):
+        return -1
+
+
+def is_closed_session(mt_session):
+    statuses = set((mt_session.get('status') or '').split(','))
+    return bool(CLOSED_SESSION_STATUSES & statuses)
+
+
+def get_watermark(router, resource):
+    return SyncWatermark.objects.filter(router=router, resource=resource).first()
+
+
+def needs_sync(mt_session, watermark):
+    """
+    Active sessions are always synced. A closed session at or below the watermark was
+    already stored in its final state by an earlier run, so it can be skipped.
+    """
+    if watermark is None or not is_closed_session(mt_session):
+        return True
+    last_packet = parse_router_datetime(mt_session.get('last-accounting-packet'))
+    if last_packet and watermark.last_accounting_packet:
+        return last_packet > watermark.last_accounting_packet
+    return mikrotik_id_value(mt_session.get('.id')) > mikrotik_id_value(watermark.last_mikrotik_id)
+
+
+def highest_marks(mt_rows, marks=(None, None)):
+    """Fold `mt_rows` into `marks`, the highest (accounting packet, `.id`) seen so far."""
+    last_packet, last_id = marks
+    for mt_row in mt_rows:
+        packet = parse_router_datetime(mt_row.get('last-accounting-packet'))
+        if packet and (last_packet is None or packet > last_packet):
+            last_packet = packet
+        if mikrotik_id_value(mt_row.get('.id')) > mikrotik_id_value(last_id):
+            last_id = mt_row.get('.id')
+    return last_packet, last_id
+
+
+def lowest_marks(mt_rows, marks=(None, None)):
+    """Fold `mt_rows` into `marks`, the lowest (accounting packet, `.id`) seen so far."""
+    first_packet, first_id = marks
+    for mt_row in mt_rows:
+        packet = parse_router_datetime(mt_row.get('last-accounting-packet'))
+        if packet and (first_packet is None or packet < first_packet):
+            first_packet = packet
+        value = mikrotik_id_value(mt_row.get('.id'))
+        if value >= 0 and (first_id is None or value < mikrotik_id_value(first_id)):
+            first_id = mt_row.get('.id')
+    return first_packet, first_id
+
+
+def marks_below(marks, floor):
+    """
+    Cap `marks` just below `floor`, the lowest marks of closed rows that were not stored
+    (e.g. sessions of users not synced yet), so the next incremental run still reads them.
+    """
+    last_packet, last_id = marks
+    floor_packet, floor_id = floor
+    if floor_packet and last_packet and last_packet >= floor_packet:
+        last_packet = floor_packet - timedelta(microseconds=1)
+    if floor_id is not None and mikrotik_id_value(last_id) >= mikrotik_id_value(floor_id):
+        previous = mikrotik_id_value(floor_id) - 1
+        last_id = f'*{previous:X}' if previous >= 0 else None
+    return last_packet, last_id
+
+
+def watermark_marks(watermark):
+    return (watermark.last_accounting_packet, watermark.last_mikrotik_id) if watermark else (None, None)
+
+
+def store_watermark(router, resource, marks, watermark=None):
+    """Save `marks` as the watermark of `resource`, unless they are what `watermark` already holds."""
+    if watermark and marks == watermark_marks(watermark):
+        return watermark
+    last_packet, last_id = marks
+    watermark, _ = SyncWatermark.objects.update_or_create(
+        router=router,
+        resource=resource,
+        defaults={'last_accounting_packet': last_packet, 'last_mikrotik_id': last_id},
+    )
+    return watermark
+
+
+def advance_watermark(router, resource, mt_rows, watermark=None):
+    """Move the watermark forward to the highest accounting packet / `.id` among `mt_rows`."""
+    return store_watermark(router, resource, highest_marks(mt_rows, watermark_marks(watermark)), watermark)
+
+
+# ------------------------------- user usage collection
+def add_session_usage(usage, mt_session):
+    """Add one router session to per-user usage totals keyed by username."""
+    totals = usage.setdefault(mt_session.get('user'), {
+        'active-sessions': 0,
+        'total-download': 0,
+        'total-upload': 0,
+        'total-uptime': 0,
+    })
+    totals['total-download'] += int(mt_session.get('download') or 0)
+    totals['total-upload'] += int(mt_session.get('upload') or 0)
+    totals['total-uptime'] += parse_duration(mt_session.get('uptime'))
+    if not is_closed_session(mt_session):
+        totals['active-sessions'] += 1
+
+
+def usage_from_sessions(mikrotik_sessions):
+    """
+    Derive per-user usage totals from an already-fetched session list, keyed by username.
+    The values use the same keys as the router's `user/monitor` reply.
+    """
+    usage = {}
+    for mt_session in mikrotik_sessions:
+        add_session_usage(usage, mt_session)
+    return usage
+
+
+def refresh_daily_usage(sessions, batch_size=None):
+    """
+    Recompute the UserUsageDaily rows of the (user, day) buckets the given sessions started in.
+
+    The buckets are re-summed from the stored sessions with one grouped query and written
+    with one upsert, so re-syncing a session that grew never double counts it. Returns the
+    number of buckets written.
+    """
+    buckets = {(session.user_id, timezone.localdate(session.started)) for session in sessions if session.started}
+    if not buckets:
+        return 0
+    totals = (
+        Session.objects
+        .filter(user_id__in={user_id for user_id, _ in buckets}, started__date__in={day for _, day in buckets})
+        .annotate(day=TruncDate('started'))
+        .order_by()
+        .values('user_id', 'user__organization_id', 'day')
+        .annotate(download=Sum('download'), upload=Sum('upload'), uptime_seconds=Sum('uptime'), session_count=Count('id'))
+    )
+    rows = [
+        UserUsageDaily(
+            user_id=total['user_id'],
+            organization_id=total['user__organization_id'],
+            day=total['day'],
+            download=total['download'] or 0,
+            upload=total['upload'] or 0,
+            uptime_seconds=total['uptime_seconds'] or 0,
+            session_count=total['session_count'],
+        )
+        for total in totals
+        if (total['user_id'], total['day']) in buckets
+    ]
+    UserUsageDaily.objects.bulk_create(
+        rows,
+        batch_size=batch_size or app_settings.SYNC_BATCH_SIZE,
+        update_conflicts=True,
+        unique_fields=['user', 'day'],
+        update_fields=['organization', 'download', 'upload', 'uptime_seconds', 'session_count', 'modified'],
+    )
+    return len(rows)
+
+
+def tap_usage(mikrotik_sessions, usage):
+    """Pass `mikrotik_sessions` through, adding each to `usage`, so a streamed listing is read only once."""
+    for mt_session in mikrotik_sessions:
+        add_session_usage(usage, mt_session)
+        yield mt_session
+
+
+def chunked(iterable, size):
+    """Yield lists of up to `size` items from `iterable`, consuming it lazily."""
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def monitor_users_usage(mikrotik_manager, mikrotik_ids, max_workers=None):
+    """Run `monitor_user_usage` for many users concurrently with a bounded worker pool."""
+    usage = {}
+    failed = []
+    if not mikrotik_ids:
+        return usage
+    max_workers = max_workers or app_settings.USAGE_MONITOR_WORKERS
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(mikrotik_manager.monitor_user_usage, mikrotik_id): mikrotik_id
+            for mikrotik_id in mikrotik_ids
+        }
+        for future in as_completed(futures):
+            mikrotik_id = futures[future]
+            try:
+                usage_data = future.result()
+            except Exception as e:
+                logger.debug(f"Error monitoring usage for user ID {mikrotik_id}: {e}")
+                failed.append(mikrotik_id)
+                continue
+            if usage_data:
+                # The monitor reply is a list with a single item
+                usage[mikrotik_id] = usage_data[0]
+            else:
+                failed.append(mikrotik_id)
+    if failed:
+        logger.warning(f"No usage data returned for {len(failed)} user(s), e.g. {', '.join(sorted(failed)[:5])}")
+    return usage
@@ -1,254 +1,508 @@
 # mpi_src/appshere/billings/tasks.py
 import logging
+import time
 from django.db import transaction, IntegrityError
-from celery import shared_task
+from django.utils import timezone
+from celery import chord, group, shared_task
 from datetime import datetime
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 from datetime import timedelta
 
-from utils.mikrotik_userman import init_mikrotik_manager
-from appshere.accounts.models import User, UserUsage
-from .models import Profile, UserProfile, Session, Limitation, ProfileLimitation
+from utils.mikrotik_userman import LatencyHistogram
+from utils.durations import parse_duration, parse_durations
+from utils.metrics import format_uptime, parse_router_datetime
+from appshere.accounts.models import User, UserUsage, Nas
+from .models import Profile, UserProfile, Session, Limitation, ProfileLimitation, SyncRun, PushJob, profile_validity
+from .routers import adopts_untagged_rows, get_router_manager, get_sync_routers, object_router, router_key
+from .scheduler import (
+    SYNC_STAGES,
+    acquire_lock,
+    release_lock,
+    is_locked,
+    is_due,
+    schedule_next,
+    next_interval,
+    due_steps,
+    mark_steps_done,
+)
+from . import settings as app_settings
+from .snapshots import invalidate_snapshot
+from .push_jobs import run_push_job
+from .quotas import record_sessions, enforce_breaches, lift_breaches
+from .outbound import sync_origin, enqueue_push, claim_events, complete_event, fail_event
+from .sync import (
+    timed,
+    lookup_map,
+    MissingReferences,
+    bulk_reconcile,
+    get_watermark,
+    needs_sync,
+    watermark_marks,
+    highest_marks,
+    lowest_marks,
+    marks_below,
+    is_closed_session,
+    store_watermark,
+    chunked,
+    tap_usage,
+    usage_from_sessions,
+    monitor_users_usage,
+    refresh_daily_usage,
+)
 
 logger = logging.getLogger(__name__)
 
-# Initialize the MikroTik manager
-mikrotik_manager = init_mikrotik_manager()
-
 
 # ------------------------------- from MikroTik to Django
 @shared_task
-def sync_data_from_mikrotik():
-    """Synchronizes MikroTik data (users, profiles, user profiles, and sessions) with Django."""
-    logger.debug("Starting sync_mikrotik_data task")
+def sync_data_from_mikrotik(full=False):
+    """
+    Beat heartbeat: dispatches one `sync_router_data` task per router that is due, so that
+    routers are synced in parallel but never twice at the same time. Routers that are still
+    syncing, or whose circuit breaker is open, are skipped. `full` syncs every router now,
+    with all sub-syncs and the full session history.
+    """
+    routers = []
+    now = time.time()
+    for nas in get_sync_routers():
+        key = router_key(nas)
+        breaker = get_router_manager(nas).breaker
+        if breaker is not None and breaker.is_open():
+            logger.warning(f"Skipping MikroTik sync for {breaker.name}: circuit breaker is open")
+        elif is_locked(key):
+            logger.debug(f"Skipping MikroTik sync for router {key}: previous sync still running")
+        elif full or is_due(key, now):
+            # hold off the next heartbeats until this run reschedules the router when it ends
+            schedule_next(key, app_settings.SYNC_LOCK_TIMEOUT, now)
+            routers.append(nas)
+    if not routers:
+        return
+    logger.debug(f"Scheduling MikroTik sync for {len(routers)} router(s)")
+    try:
+        group(
+            sync_router_data.s(str(nas.pk) if nas else None, full=full) for nas in routers
+        ).apply_async()
+    except Exception:
+        # nothing was dispatched: let the next heartbeat try again
+        for nas in routers:
+            schedule_next(router_key(nas), 0)
+        raise
+
+
+@shared_task
+def sync_router_data(nas_id=None, full=False):
+    """
+    Synchronizes one router's data (users, profiles, limitations, user profiles, and sessions) with Django.
+
+    The sub-syncs due according to MIKROTIK_SYNC_CADENCES (all of them when `full`) run as
+    the SYNC_STAGES dependency graph: a chord per stage, each step in its own task, ending
+    with `finish_router_sync`. The router's sync lock is held until then.
+    """
+    nas = Nas.objects.filter(pk=nas_id).first() if nas_id else None
+    if nas_id and nas is None:
+        logger.warning(f"NAS {nas_id} no longer exists, skipping sync")
+        return
+    key = router_key(nas)
+    token = acquire_lock(key)
+    if token is None:
+        # the heartbeat held the router off for this run; the lock holder may not reschedule it
+        logger.info(f"MikroTik sync of router {key} is already running, skipping")
+        schedule_next(key, next_interval(nas))
+        return
+    steps = due_steps(key, full)
+    logger.debug(f"Starting MikroTik sync for router {key}: {', '.join(steps)}")
+    try:
+        run_sync_stage([], nas_id, full, steps, token, timezone.now().isoformat(), 0, [])
+    except Exception:
+        release_lock(key, token)
+        schedule_next(key, next_interval(nas))
+        raise
+
+
+def run_sync_stage(results, nas_id, full, steps, token, started, stage, collected):
+    """Start stage `stage` of a router sync; `results` are the outcomes of the previous stage."""
+    collected = collected + results
+    if stage == len(SYNC_STAGES):
+        finish_router_sync.delay(collected, nas_id, token, started)
+        return
+    stage_steps = [step for step in SYNC_STAGES[stage] if step in steps]
+    callback = sync_router_stage.s(nas_id, full, steps, token, started, stage + 1, collected)
+    if not stage_steps:
+        callback.delay([])
+        return
+    chord(sync_router_step.s(nas_id, step, full) for step in stage_steps)(callback)
+
+
+@shared_task
+def sync_router_stage(results, nas_id, full, steps, token, started, stage, collected):
+    run_sync_stage(results, nas_id, full, steps, token, started, stage, collected)
+
 
+def _run_isolated(outcome, name, func, *args, **kwargs):
+    """Run one part of a step and return its result, recording its timing, or its error instead of raising it."""
     try:
-        sync_users(mikrotik_manager)
-        sync_monitor_user_usage(mikrotik_manager)
-        sync_profiles(mikrotik_manager)
-        sync_user_profiles(mikrotik_manager)
-        sync_sessions(mikrotik_manager)
+        with timed(outcome['timings'], name):
+            return func(*args, **kwargs)
     except Exception as e:
-        logger.error(f"Error syncing data: {e}", exc_info=True)
-    else:
-        logger.info("MikroTik sync completed successfully")
+        outcome['errors'][name] = str(e)
+        logger.warning(f"MikroTik sync step {name} failed: {e}")
+        return None
+
+
+@shared_task
+def sync_router_step(nas_id, step, full=False):
+    """
+    Run one sub-sync of a router. Errors are recorded in the returned outcome rather than
+    raised, so a failing step neither aborts the chord nor the steps that run after it.
+    """
+    nas = Nas.objects.filter(pk=nas_id).first() if nas_id else None
+    mikrotik_manager = get_router_manager(nas)
+    outcome = {'step': step, 'timings': {}, 'errors': {}, 'latency': {}}
+    # Rows pulled from the router must not be pushed back to it
+    with sync_origin():
+        if step == 'users':
+            _run_isolated(outcome, 'users', sync_users, mikrotik_manager, nas)
+        elif step == 'profiles':
+            _run_isolated(outcome, 'profiles', sync_profiles, mikrotik_manager, nas)
+        elif step == 'limitations':
+            _run_isolated(outcome, 'limitations', sync_limitations, mikrotik_manager, nas)
+        elif step == 'user_profiles':
+            _run_isolated(outcome, 'user_profiles', sync_user_profiles, mikrotik_manager, nas)
+        elif step == 'sessions':
+            # Sessions are streamed once: usage totals are collected while they are ingested
+            derived_usage = {}
+            mikrotik_sessions = tap_usage(mikrotik_manager.iter_sessions(), derived_usage)
+            if _run_isolated(
+                outcome, 'sessions', sync_sessions,
+                mikrotik_manager, nas, incremental=not full, mikrotik_sessions=mikrotik_sessions,
+            ) is not None:
+                # totals of a partially read listing would be wrong, so usage waits for a complete one
+                _run_isolated(outcome, 'usage', sync_monitor_user_usage, mikrotik_manager, nas=nas, derived_usage=derived_usage)
+    outcome['latency'] = mikrotik_manager.latency.snapshot(reset=True)
+    return outcome
 
 
-def sync_users(mikrotik_manager):
+@shared_task
+def finish_router_sync(outcomes, nas_id, token, started):
+    """Record the router sync as a SyncRun, release its lock and schedule its next run."""
+    nas = Nas.objects.filter(pk=nas_id).first() if nas_id else None
+    key = str(nas_id) if nas_id else router_key()
+    try:
+        if nas_id and nas is None:
+            logger.warning(f"NAS {nas_id} was deleted while it was syncing")
+            return
+        mikrotik_manager = get_router_manager(nas)
+        started = datetime.fromisoformat(started)
+        run = SyncRun(nas=nas, router=mikrotik_manager.router_ip, started=started)
+        errors = {}
+        for outcome in outcomes:
+            run.timings.update(outcome['timings'])
+            errors.update(outcome['errors'])
+        run.latency = LatencyHistogram.merge(*(outcome['latency'] for outcome in outcomes))
+        run.duration = round((timezone.now() - started).total_seconds(), 3)
+        if errors:
+            run.status = 'failed'
+            run.error = '\n'.join(f"{name}: {error}" for name, error in errors.items())
+            logger.error(f"MikroTik sync of {run.router} finished with errors in: {', '.join(errors)}")
+        else:
+            logger.info(f"MikroTik sync of {run.router} completed successfully")
+        # The router's rows may have changed since the cached name -> .id lookups were built
+        invalidate_snapshot(mikrotik_manager)
+        run.save()
+        # a failed step is retried on the next run instead of waiting for its cadence
+        mark_steps_done(key, [outcome['step'] for outcome in outcomes if not outcome['errors']])
+        schedule_next(key, next_interval(nas, run.router))
+    finally:
+        release_lock(key, token)
+
+
+def sync_users(mikrotik_manager, nas=None):
     """Synchronizes users from MikroTik to the Django database."""
     try:
         with transaction.atomic():
             mikrotik_users = mikrotik_manager.get_users()
-            for mt_user in mikrotik_users:
+            rows = {
                 # Use `mikrotik_id` as the lookup field to avoid duplicate entries
-                user, created = User.objects.update_or_create(
-                    mikrotik_id=mt_user['.id'],  # Lookup by mikrotik_id
-                    defaults={
-                        'name': mt_user['name'],  # Use 'name' here instead of 'username'
-                        'group': mt_user.get('group', ''),
-                        'disabled': mt_user.get('disabled') == 'true',
-                        'otp_secret': mt_user.get('otp-secret', ''),
-                        'shared_users': int(mt_user.get('shared-users', 1)),
-                        'plain_password': mt_user.get('password', ''),
-                    }
-                )
-                if created:
-                    logger.info(f'Created new user with MikroTik ID: {user.mikrotik_id}')
-                else:
-                    logger.info(f'Updated user with MikroTik ID: {user.mikrotik_id}')
+                mt_user['.id']: {
+                    # sessions and user profiles reference the user by its router name
+                    'username': mt_user['name'],
+                    'name': mt_user['name'],
+                    'group': mt_user.get('group', ''),
+                    'disabled': mt_user.get('disabled') == 'true',
+                    'otp_secret': mt_user.get('otp-secret', ''),
+                    'shared_users': int(mt_user.get('shared-users', 1)),
+                    'plain_password': mt_user.get('password', ''),
+                }
+                for mt_user in mikrotik_users
+            }
+            result = bulk_reconcile(User, 'mikrotik_id', rows, scope={'nas': nas}, adopt=adopts_untagged_rows(nas))
+            logger.info(f"Synced users from MikroTik: {result}")
+            return result
     except Exception as e:
         logger.error(f"Error syncing users: {e}", exc_info=True)
         raise
 
 
-def parse_uptime(uptime_str: str) -> int:
-    """
-    Parse uptime string (format: '3h50m45s') and return total seconds.
-    If the format is not as expected, handle it gracefully.
+def sync_monitor_user_usage(mikrotik_manager, mikrotik_sessions=None, nas=None, derived_usage=None):
     """
-    total_seconds = 0
-    import re
-    match = re.match(r'(?:(\d+)h)?(?:(\d+)m)?(?:(\d+)s)?', uptime_str)
-
-    if match:
-        hours, minutes, seconds = match.groups(default='0')
-        total_seconds += int(hours) * 3600
-        total_seconds += int(minutes) * 60
-        total_seconds += int(seconds)
+    Synchronizes user usage from MikroTik to the Django database.
 
-    return total_seconds
-
-def sync_monitor_user_usage(mikrotik_manager):
-    """Synchronizes user usage from MikroTik to the Django database."""
+    Totals for users present in `mikrotik_sessions` (or in `derived_usage`, totals already
+    collected from them) are derived from that list; only the remaining users are queried
+    with `monitor_user_usage`, concurrently.
+    """
     logger.debug("Starting sync_monitor_user_usage task")
 
     try:
-        # Retrieve all users from Django to map MikroTik IDs to User objects
-        django_users = {user.mikrotik_id: user for user in User.objects.all()}
-
-        for mikrotik_id, user in django_users.items():
-            # Fetch the user usage from MikroTik
-            usage_data = mikrotik_manager.monitor_user_usage(mikrotik_id)
-
-            if usage_data:
-                # Since usage_data is a list, we take the first (and only) item
-                usage_info = usage_data[0]
-
-                # Create or update the UserUsage instance
-                UserUsage.objects.update_or_create(
-                    mikrotik_id=mikrotik_id,
-                    defaults={
-                        'user': user,
-                        'active_sessions': int(usage_info.get('active-sessions', 0)),
-                        'active_sub_sessions': int(usage_info.get('active-sub-sessions', 0)),
-                        'total_download': int(usage_info.get('total-download', 0)),
-                        'total_upload': int(usage_info.get('total-upload', 0)),
-                        'total_uptime': usage_info.get('total-uptime', '0s'),  # default to '0s' if not provided
-                        'attributes_details': usage_info.get('attributes-details', '')
-                    }
-                )
-                logger.info(f"Updated usage for user: {user.username}")
+        users = User.objects.filter(nas=nas, mikrotik_id__isnull=False).only('id', 'mikrotik_id', 'username')
+        if derived_usage is None:
+            derived_usage = usage_from_sessions(mikrotik_sessions or [])
+
+        usage = {}
+        remaining = {}
+        for user in users:
+            if user.username in derived_usage:
+                usage[user.mikrotik_id] = (user, derived_usage[user.username])
             else:
-                logger.warning(f"No usage data returned for user ID: {mikrotik_id}")
+                remaining[user.mikrotik_id] = user
+
+        monitored_usage = monitor_users_usage(mikrotik_manager, list(remaining))
+        for mikrotik_id, usage_info in monitored_usage.items():
+            usage[mikrotik_id] = (remaining[mikrotik_id], usage_info)
+
+        rows = {}
+        for mikrotik_id, (user, usage_info) in usage.items():
+            rows[mikrotik_id] = {
+                'user': user,
+                'active_sessions': int(usage_info.get('active-sessions', 0)),
+                'active_sub_sessions': int(usage_info.get('active-sub-sessions', 0)),
+                'total_download': int(usage_info.get('total-download', 0)),
+                'total_upload': int(usage_info.get('total-upload', 0)),
+                # seconds when derived from sessions, a RouterOS duration such as '1d2h3m' when monitored
+                'total_uptime': parse_duration(usage_info.get('total-uptime', 0)),
+            }
+            # Only the router's monitor reply carries attribute details
+            if 'attributes-details' in usage_info:
+                rows[mikrotik_id]['attributes_details'] = usage_info['attributes-details']
+
+        with transaction.atomic():
+            result = bulk_reconcile(UserUsage, 'mikrotik_id', rows, scope={'nas': nas}, adopt=adopts_untagged_rows(nas))
+        logger.info(
+            f"Synced user usage: {result} "
+            f"({len(usage) - len(monitored_usage)} derived from sessions, {len(monitored_usage)} monitored)"
+        )
+        return result
 
     except Exception as e:
         logger.error(f"Error syncing user usage: {e}", exc_info=True)
         raise
 
 
-def sync_profiles(mikrotik_manager):
+def sync_profiles(mikrotik_manager, nas=None):
     """Synchronizes profiles from MikroTik to the Django database."""
     try:
         with transaction.atomic():
             mikrotik_profiles = mikrotik_manager.get_profiles()
-            for mt_profile in mikrotik_profiles:
-                profile, created = Profile.objects.update_or_create(
-                    name=mt_profile['name'],
-                    defaults={
-                        'name_for_users': mt_profile.get('name-for-users', ''),
-                        'price': mt_profile.get('price', '0.00'),
-                        'starts_when': mt_profile.get('starts-when', 'assigned'),
-                        'validity': mt_profile.get('validity', '30d 00:00:00'),
-                        'override_shared_users': mt_profile.get('override-shared-users', 'off'),
-                        'mikrotik_id': mt_profile['.id'],  # Store MikroTik ID
-                    }
-                )
-                if created:
-                    logger.info(f'Created new profile: {profile.name}')
-                else:
-                    logger.info(f'Updated profile: {profile.name}')
+            rows = {
+                mt_profile['name']: {
+                    'name_for_users': mt_profile.get('name-for-users', ''),
+                    'price': mt_profile.get('price', '0.00'),
+                    'starts_when': mt_profile.get('starts-when', 'assigned'),
+                    'validity': mt_profile.get('validity', '30d 00:00:00'),
+                    'validity_duration': profile_validity(mt_profile.get('validity', '30d 00:00:00')),
+                    'override_shared_users': mt_profile.get('override-shared-users', 'off'),
+                    'mikrotik_id': mt_profile['.id'],  # Store MikroTik ID
+                }
+                for mt_profile in mikrotik_profiles
+            }
+            result = bulk_reconcile(Profile, 'name', rows, scope={'nas': nas}, adopt=adopts_untagged_rows(nas))
+            logger.info(f"Synced profiles from MikroTik: {result}")
+            return result
     except Exception as e:
         logger.error(f"Error syncing profiles: {e}", exc_info=True)
         raise
 
 
-def sync_user_profiles(mikrotik_manager):
+def sync_limitations(mikrotik_manager, nas=None):
+    """Synchronizes limitations from MikroTik to the Django database."""
+    try:
+        with transaction.atomic():
+            mikrotik_limitations = mikrotik_manager.get_limitations()
+            rows = {
+                mt_limitation['name']: {
+                    'download_limit': mt_limitation.get('download-limit', '0'),
+                    'upload_limit': mt_limitation.get('upload-limit', '0'),
+                    'transfer_limit': mt_limitation.get('transfer-limit', '0'),
+                    'uptime_limit': mt_limitation.get('uptime-limit', '0'),
+                    'rate_limit_rx': mt_limitation.get('rate-limit-rx', '0'),
+                    'rate_limit_tx': mt_limitation.get('rate-limit-tx', '0'),
+                    'rate_limit_min_rx': mt_limitation.get('rate-limit-min-rx', '0'),
+                    'rate_limit_min_tx': mt_limitation.get('rate-limit-min-tx', '0'),
+                    'rate_limit_priority': mt_limitation.get('rate-limit-priority', '0'),
+                    'rate_limit_burst_rx': mt_limitation.get('rate-limit-burst-rx', '0'),
+                    'rate_limit_burst_tx': mt_limitation.get('rate-limit-burst-tx', '0'),
+                    'rate_limit_burst_threshold_rx': mt_limitation.get('rate-limit-burst-threshold-rx', '0'),
+                    'rate_limit_burst_threshold_tx': mt_limitation.get('rate-limit-burst-threshold-tx', '0'),
+                    'rate_limit_burst_time_rx': mt_limitation.get('rate-limit-burst-time-rx', '00:00:00'),
+                    'rate_limit_burst_time_tx': mt_limitation.get('rate-limit-burst-time-tx', '00:00:00'),
+                    'reset_counters_start_time': mt_limitation.get('reset-counters-start-time'),
+                    'reset_counters_interval': mt_limitation.get('reset-counters-interval', 'disabled'),
+                    'mikrotik_id': mt_limitation['.id'],  # Store MikroTik ID
+                }
+                for mt_limitation in mikrotik_limitations
+            }
+            result = bulk_reconcile(Limitation, 'name', rows, scope={'nas': nas}, adopt=adopts_untagged_rows(nas))
+            logger.info(f"Synced limitations from MikroTik: {result}")
+            return result
+    except Exception as e:
+        logger.error(f"Error syncing limitations: {e}", exc_info=True)
+        raise
+
+
+def sync_user_profiles(mikrotik_manager, nas=None):
     """Synchronizes user profiles from MikroTik to the Django database."""
     try:
         with transaction.atomic():
             mikrotik_user_profiles = mikrotik_manager.get_user_profiles()
+            # Resolve every referenced user and profile up front instead of per row
+            users = lookup_map(
+                User, 'username', (mt_up.get('user') for mt_up in mikrotik_user_profiles), scope={'nas': nas},
+            )
+            profiles = lookup_map(
+                Profile, 'name', (mt_up.get('profile') for mt_up in mikrotik_user_profiles), scope={'nas': nas},
+            )
+            missing = MissingReferences('user profile')
+
+            rows = {}
             for mt_user_profile in mikrotik_user_profiles:
-                user = User.objects.filter(username=mt_user_profile['user']).first()
-                profile = Profile.objects.filter(name=mt_user_profile['profile']).first()
+                user = users.get(mt_user_profile.get('user'))
+                profile = profiles.get(mt_user_profile.get('profile'))
 
                 if not user or not profile:
-                    logger.warning(f"User '{mt_user_profile['user']}' or Profile '{mt_user_profile['profile']}' not found.")
+                    references = {}
+                    if not user:
+                        references['user'] = mt_user_profile.get('user')
+                    if not profile:
+                        references['profile'] = mt_user_profile.get('profile')
+                    missing.skip(**references)
                     continue
 
-                end_time = mt_user_profile.get('end-time', None)
-                state = mt_user_profile.get('state')
-                mikrotik_id = mt_user_profile['.id']
-
-                # Attempt to get the existing UserProfile by MikroTik ID
-                user_profile, created = UserProfile.objects.get_or_create(
-                    mikrotik_id=mikrotik_id,
-                    defaults={
-                        'user': user,
-                        'profile': profile,
-                        'state': state,
-                        'end_time': end_time
-                    }
-                )
-
-                # If the record already exists, check if we need to update it
-                if not created:
-                    # Only update state and end_time if they have changed
-                    update_needed = False
-                    if user_profile.state != state:
-                        user_profile.state = state
-                        update_needed = True
-                    if user_profile.end_time != end_time:
-                        user_profile.end_time = end_time
-                        update_needed = True
-
-                    if update_needed:
-                        user_profile.save()
+                rows[mt_user_profile['.id']] = {
+                    'user': user,
+                    'profile': profile,
+                    'state': mt_user_profile.get('state'),
+                    'end_time': parse_router_datetime(mt_user_profile.get('end-time')),
+                }
+
+            # Existing user profiles only follow the router's state and end_time
+            result = bulk_reconcile(
+                UserProfile, 'mikrotik_id', rows, update_fields=('state', 'end_time'), scope={'nas': nas},
+                adopt=adopts_untagged_rows(nas),
+            )
+            missing.report()
+            logger.info(f"Synced user profiles from MikroTik: {result}")
+            return result
 
     except Exception as e:
         logger.error(f"Error syncing user profiles: {e}", exc_info=True)
         raise
 
 
-def sync_sessions(mikrotik_manager):
-    """Synchronizes sessions from MikroTik to the Django database."""
+def sync_sessions(mikrotik_manager, nas=None, incremental=True, mikrotik_sessions=None):
+    """
+    Synchronizes sessions from MikroTik to the Django database.
+
+    In incremental mode, closed sessions already ingested (at or below the router's
+    watermark) are skipped, so a run only touches active and new sessions.
+    Pass `incremental=False` to re-check the full session history, and `mikrotik_sessions`
+    (a list, or an iterator such as `iter_sessions()`) to reuse sessions already fetched.
+    Sessions are written MIKROTIK_SESSION_CHUNK_SIZE at a time, each chunk in its own
+    transaction; the watermark only moves once every chunk is stored, and stops before any
+    closed session skipped for an unknown user so that a later run stores it once the user
+    is synced. Returns the counts of created, updated and unchanged sessions.
+    """
     try:
-        with transaction.atomic():
-            mikrotik_sessions = mikrotik_manager.get_sessions()
-            for mt_session in mikrotik_sessions:
-                user = User.objects.filter(username=mt_session.get('user')).first()
-                if not user:
-                    logger.warning(f"User '{mt_session.get('user')}' not found. '{mt_session.get('acct-session-id')}'")
-                    continue
-
-                # Convert naive datetime to aware datetime if time zone support is active
-                from django.utils import timezone
-                ended_str = mt_session.get('ended')
-                ended = None
-                if ended_str:
-                    ended = datetime.strptime(ended_str, '%Y-%m-%d %H:%M:%S')
-                    if timezone.is_naive(ended):
-                        ended = timezone.make_aware(ended)
-
-                session_defaults = {
-                    'user': user,  # Ensure user is assigned here
-                    'nas_ip_address': mt_session.get('nas-ip-address'),
-                    'nas_port_id': mt_session.get('nas-port-id'),
-                    'nas_port_type': mt_session.get('nas-port-type'),
-                    'calling_station_id': mt_session.get('calling-station-id'),
-                    'download': int(mt_session.get('download', 0)),
-                    'upload': int(mt_session.get('upload', 0)),
-                    'uptime': mt_session.get('uptime'),
-                    'status': mt_session.get('status'),
-                    'started': mt_session.get('started'),
-                    'ended': mt_session.get('ended', None),
-                    'terminate_cause': mt_session.get('terminate-cause', None),
-                    'user_address': mt_session.get('user-address'),
-                    'last_accounting_packet': mt_session.get('last-accounting-packet'),
-                    'mikrotik_id': mt_session.get('.id')  # Store MikroTik ID here
-                }
-
-                session, created = Session.objects.update_or_create(
-                    session_id=mt_session.get('acct-session-id'),
-                    defaults=session_defaults
-                )
-
-                if created:
-                    logger.info(f'Created new session: {session.session_id}')
-                else:
-                    logger.info(f'Updated session: {session.session_id}')
-
-                # Notify WebSocket clients of new session data
+        router = mikrotik_manager.router_ip
+        watermark = get_watermark(router, 'session')
+        if mikrotik_sessions is None:
+            mikrotik_sessions = mikrotik_manager.iter_sessions()
+        marks = watermark_marks(watermark)
+        floor = (None, None)
+        adopt = adopts_untagged_rows(nas)
+        missing = MissingReferences('session')
+        totals = {'created': 0, 'updated': 0, 'unchanged': 0}
+
+        for chunk in chunked(mikrotik_sessions, app_settings.SESSION_CHUNK_SIZE):
+            if incremental:
+                chunk = [mt_session for mt_session in chunk if needs_sync(mt_session, watermark)]
+            result, ingested, skipped = _sync_session_chunk(chunk, nas, missing, adopt)
+            marks = highest_marks(ingested, marks)
+            floor = lowest_marks((mt_session for mt_session in skipped if is_closed_session(mt_session)), floor)
+            for key, count in result.as_dict().items():
+                totals[key] += count
+            # Notify WebSocket clients only about sessions whose data actually changed
+            for session in result.changed:
                 send_traffic_update_to_group(session.session_id, {
                     "download": session.download,
                     "upload": session.upload,
-                    "uptime": session.uptime,
+                    "uptime": format_uptime(session.uptime),
                 })
+
+        store_watermark(router, 'session', marks_below(marks, floor), watermark)
+        missing.report()
+        logger.info(
+            f"Synced sessions from MikroTik ({'incremental' if incremental else 'full'}): "
+            f"created={totals['created']} updated={totals['updated']} unchanged={totals['unchanged']}"
+        )
+        return totals
     except Exception as e:
         logger.error(f"Error syncing sessions: {e}", exc_info=True)
         raise
 
 
+def _sync_session_chunk(mikrotik_sessions, nas, missing, adopt=False):
+    """Store one chunk of router sessions; returns the SyncResult, the sessions ingested and those skipped."""
+    with transaction.atomic():
+        users = lookup_map(
+            User, 'username', (mt_session.get('user') for mt_session in mikrotik_sessions), scope={'nas': nas},
+        )
+        rows = {}
+        ingested = []
+        skipped = []
+        uptimes = parse_durations(mt_session.get('uptime') for mt_session in mikrotik_sessions)
+        for mt_session, uptime in zip(mikrotik_sessions, uptimes):
+            user = users.get(mt_session.get('user'))
+            if not user:
+                missing.skip(user=mt_session.get('user'))
+                skipped.append(mt_session)
+                continue
+            ingested.append(mt_session)
+
+            rows[mt_session.get('acct-session-id')] = {
+                'user': user,  # Ensure user is assigned here
+                'nas_ip_address': mt_session.get('nas-ip-address'),
+                'nas_port_id': mt_session.get('nas-port-id'),
+                'nas_port_type': mt_session.get('nas-port-type'),
+                'calling_station_id': mt_session.get('calling-station-id'),
+                'download': int(mt_session.get('download', 0)),
+                'upload': int(mt_session.get('upload', 0)),
+                'uptime': uptime,
+                'status': mt_session.get('status'),
+                'started': parse_router_datetime(mt_session.get('started')),
+                'ended': parse_router_datetime(mt_session.get('ended')),
+                'terminate_cause': mt_session.get('terminate-cause', None),
+                'user_address': mt_session.get('user-address'),
+                'last_accounting_packet': parse_router_datetime(mt_session.get('last-accounting-packet')),
+                'mikrotik_id': mt_session.get('.id'),  # Store MikroTik ID here
+                'nas': nas,
+            }
+        result = bulk_reconcile(Session, 'session_id', rows, scope={'nas': nas}, adopt=adopt)
+        refresh_daily_usage(result.changed)
+        record_sessions(result.changed, result.created)
+        return result, ingested, skipped
+
+
 # WebSocket notification
 def send_traffic_update_to_group(session_id, traffic_data):
     """Sends session traffic updates to WebSocket clients."""
@@ -291,6 +545,7 @@ from utils.data_preparation import (
 def create_or_update_user_event(user_id):
     try:
         user = User.objects.get(id=user_id)
+        mikrotik_manager = get_router_manager(object_router(user))
         if user.mikrotik_id:
             # Update existing user in MikroTik
             user_data = prepare_user_data(user, is_update=True)
@@ -303,7 +558,8 @@ def create_or_update_user_event(user_id):
             # Save the generated MikroTik ID to the user in Django
             if response and '.id' in response:
                 user.mikrotik_id = response['.id']
-                user.save()
+                with sync_origin():
+                    user.save(update_fields=['mikrotik_id'])
                 logger.info(f"User created in MikroTik with ID {user.mikrotik_id}")
     except User.DoesNotExist:
         logger.error(f"User with ID {user_id} not found")
@@ -313,12 +569,14 @@ def create_or_update_profile_event(profile_id):
     try:
         profile = Profile.objects.get(id=profile_id)
         profile_data = prepare_profile_data(profile)
+        mikrotik_manager = get_router_manager(object_router(profile))
         if profile.mikrotik_id:
             mikrotik_manager.update_profile(profile_id=profile.mikrotik_id, profile_data=profile_data)
         else:
             response = mikrotik_manager.create_profile(profile_data)
             profile.mikrotik_id = response.get('.id')
-            profile.save()
+            with sync_origin():
+                profile.save(update_fields=['mikrotik_id'])
     except Profile.DoesNotExist:
         logger.error(f'Profile with ID {profile_id} not found')
 
@@ -338,12 +596,13 @@ def create_or_update_user_profile_event(user_profile_id):
         else:
             # Create new user profile in MikroTik
             user_profile_data = prepare_user_profile_data(user_profile)
-            response = mikrotik_manager.create_user_profile(user_profile_data)
+            response = get_router_manager(object_router(user_profile)).create_user_profile(user_profile_data)
 
             # Save the generated MikroTik ID to the user profile in Django
             if response and '.id' in response:
                 user_profile.mikrotik_id = response['.id']
-                user_profile.save()
+                with sync_origin():
+                    user_profile.save(update_fields=['mikrotik_id'])
                 logger.info(f"Created user profile for user {user_profile.user.username} in MikroTik with ID {user_profile.mikrotik_id}")
             else:
                 logger.error(f"User profile creation failed for {user_profile.user.username}. No valid response received from MikroTik.")
@@ -360,12 +619,14 @@ def create_or_update_limitation_event(limitation_id):
     try:
         limitation = Limitation.objects.get(id=limitation_id)
         limitation_data = prepare_limitation_data(limitation)
+        mikrotik_manager = get_router_manager(object_router(limitation))
         if limitation.mikrotik_id:
             mikrotik_manager.update_limitation(limitation_id=limitation.mikrotik_id, limitation_data=limitation_data)
         else:
             response = mikrotik_manager.create_limitation(limitation_data)
             limitation.mikrotik_id = response.get('.id')
-            limitation.save()
+            with sync_origin():
+                limitation.save(update_fields=['mikrotik_id'])
     except Limitation.DoesNotExist:
         logger.error(f'Limitation with ID {limitation_id} not found')
 
@@ -387,12 +648,13 @@ def create_or_update_profile_limitation_event(profile_limitation_id):
         else:
             # Create new profile limitation in MikroTik
             profile_limitation_data = prepare_profile_limitation_data(profile_limitation)
-            response = mikrotik_manager.create_profile_limitation(profile_limitation_data)
+            response = get_router_manager(object_router(profile_limitation)).create_profile_limitation(profile_limitation_data)
 
             # Save the generated MikroTik ID to the profile limitation in Django
             if response and '.id' in response:
                 profile_limitation.mikrotik_id = response['.id']
-                profile_limitation.save()
+                with sync_origin():
+                    profile_limitation.save(update_fields=['mikrotik_id'])
                 logger.info(f"Created profile limitation for profile {profile_limitation.profile} in MikroTik with ID {profile_limitation.mikrotik_id}")
             else:
                 logger.error(f"Profile limitation creation failed for profile {profile_limitation.profile}. No valid response received from MikroTik.")
@@ -403,30 +665,75 @@ def create_or_update_profile_limitation_event(profile_limitation_id):
         logger.error(f"Error processing ProfileLimitation {profile_limitation_id} in MikroTik: {e}", exc_info=True)
         raise
 
-def trigger_mikrotik_tasks(instance, created, **kwargs):
-    """Trigger MikroTik tasks based on model instance changes."""
-    from .tasks import (
-        create_or_update_user_event,
-        create_or_update_profile_event,
-        create_or_update_user_profile_event,
-        create_or_update_limitation_event,
-        create_or_update_profile_limitation_event
-    )
+def trigger_mikrotik_tasks(instance, created=False, **kwargs):
+    """Queue a push of the changed model instance to MikroTik through the outbox."""
+    if type(instance) not in (User, Profile, UserProfile, Limitation, ProfileLimitation):
+        logger.error(f"No task mapped for model {type(instance)}")
+        return
+    enqueue_push(instance)
 
+
+def get_push_task(model_label):
+    """Return the event task that pushes objects of `model_label` (e.g. 'billings.profile')."""
     task_map = {
-        User: create_or_update_user_event,
-        Profile: create_or_update_profile_event,
-        UserProfile: create_or_update_user_profile_event,
-        Limitation: create_or_update_limitation_event,
-        ProfileLimitation: create_or_update_profile_limitation_event,
+        User._meta.label_lower: create_or_update_user_event,
+        Profile._meta.label_lower: create_or_update_profile_event,
+        UserProfile._meta.label_lower: create_or_update_user_profile_event,
+        Limitation._meta.label_lower: create_or_update_limitation_event,
+        ProfileLimitation._meta.label_lower: create_or_update_profile_limitation_event,
     }
+    return task_map.get(model_label)
 
-    task = task_map.get(type(instance))  # Get the task for the instance's type
-    if task:
-        # task.delay(instance.id)  # Trigger the task asynchronously
-        task(instance.id) # without using asynchronous tasks like Celery
-    else:
-        logger.error(f"No task mapped for model {type(instance)}")
+
+@shared_task
+def drain_outbox(batch_size=None):
+    """
+    Push the due outbox events to MikroTik. Failed pushes are retried with exponential
+    backoff; the periodic run also picks up retries and events left by a dead worker.
+    """
+    events = claim_events(batch_size)
+    pushed = 0
+    for event in events:
+        task = get_push_task(event.model)
+        try:
+            if task is None:
+                raise LookupError(f"No task mapped for model {event.model}")
+            task(event.object_id)  # runs inline in this worker
+        except Exception as e:
+            logger.warning(f"Push of {event.model} {event.object_id} to MikroTik failed: {e}")
+            fail_event(event, e)
+        else:
+            complete_event(event)
+            pushed += 1
+    if events:
+        logger.info(f"Drained MikroTik outbox: {pushed} pushed, {len(events) - pushed} failed")
+    if len(events) == (batch_size or app_settings.OUTBOX_BATCH_SIZE):
+        drain_outbox.delay(batch_size)
+    return pushed
+
+
+@shared_task
+def enforce_quotas():
+    """
+    Disable and disconnect on MikroTik the users who went over a limit, and enable again those
+    whose reset period is over. Queued by the session sync when it records a breach; the
+    periodic run retries failed router calls and lifts the expired breaches.
+    """
+    disabled = enforce_breaches()
+    enabled = lift_breaches()
+    if disabled or enabled:
+        logger.info(f"Enforced quotas on MikroTik: {disabled} users disabled, {enabled} enabled")
+    return {'disabled': disabled, 'enabled': enabled}
+
+
+@shared_task
+def run_push_job_task(job_id):
+    """Run a bulk push job queued from the admin."""
+    job = PushJob.objects.filter(pk=job_id, status='queued').first()
+    if job is None:
+        logger.warning(f"Push job {job_id} not found or already started")
+        return
+    run_push_job(job, get_router_manager(job.nas))
 
 
 # # Deletion tasks
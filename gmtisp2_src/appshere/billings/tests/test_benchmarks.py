@@ -0,0 +1,94 @@
+from datetime import timedelta
+from unittest import mock
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from utils.mikrotik_fake import FakeRouter, FakeRouterAdapter
+from ..models import Session, UserProfile, get_user_all_time_traffic, get_user_all_time_uptime, get_user_profiles_usage, get_user_traffic_and_time_for_a_period
+from ..routers import clear_router_managers
+from ..scheduler import SYNC_STEPS
+from ..tasks import sync_router_step
+from ..views import PaymentListView, SessionListView, UserProfileListView
+from .utils import BenchmarkMixin, SubscriberDataMixin, scaled, walk
+
+
+class TestBillingBenchmarks(SubscriberDataMixin, BenchmarkMixin, TestCase):
+    def test_all_time_traffic(self):
+        traffic = self.benchmark(get_user_all_time_traffic, self.heavy_user, max_queries=1)
+        sessions = Session.objects.filter(user=self.heavy_user)
+        self.assertEqual(traffic['total_traffic'], sum(s.download + s.upload for s in sessions))
+
+    def test_all_time_uptime(self):
+        uptime = self.benchmark(get_user_all_time_uptime, self.heavy_user, max_queries=1)
+        sessions = Session.objects.filter(user=self.heavy_user)
+        self.assertEqual(uptime.total_seconds(), sum(s.uptime for s in sessions))
+
+    def test_usage_for_a_period(self):
+        user_profile = next(up for up in self.user_profiles if up.user_id == self.heavy_user.pk)
+        start = timezone.now() - timedelta(days=45)
+        UserProfile.objects.filter(pk=user_profile.pk).update(created=start, end_time=start + timedelta(days=20))
+        usage = self.benchmark(get_user_traffic_and_time_for_a_period, user_profile.pk, max_queries=2)
+        in_period = [
+            session for session in Session.objects.filter(user=self.heavy_user)
+            if start <= session.started < start + timedelta(days=20)
+        ]
+        self.assertEqual(usage['sessions_count'], len(in_period))
+        self.assertEqual(usage['total_time'], sum(session.uptime for session in in_period))
+
+    def test_usage_for_every_user_profile(self):
+        ids = [user_profile.pk for user_profile in self.user_profiles]
+        usage = self.benchmark(get_user_profiles_usage, ids, max_queries=2)
+        self.assertEqual(set(usage), set(ids))
+
+    def test_session_list(self):
+        view = self._view(SessionListView)
+        rows = self.benchmark(
+            lambda: walk(view.get_queryset(), 'user.username', 'organization.slug', 'formatted_total_traffic', 'get_session_status'),
+            max_queries=1,
+        )
+        self.assertEqual(len(rows), scaled(200) * scaled(10) + scaled(2000))
+
+    def test_payment_list(self):
+        view = self._view(PaymentListView)
+        self.benchmark(
+            lambda: walk(view.get_queryset(), 'user.username', 'organization.slug', 'profile.name_for_users', 'get_reference'),
+            max_queries=1,
+        )
+
+    def test_user_profile_list(self):
+        view = self._view(UserProfileListView)
+        self.benchmark(
+            lambda: walk(view.get_queryset(), 'user.username', 'organization.slug', 'profile.name_for_users', 'get_state'),
+            max_queries=1,
+        )
+
+
+class TestSyncBenchmarks(BenchmarkMixin, TestCase):
+    """The sync steps must run a constant number of queries, whatever the number of subscribers."""
+
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch('appshere.billings.tasks.send_traffic_update_to_group')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(clear_router_managers)
+
+    def _sync(self, subscribers):
+        adapter = FakeRouterAdapter(FakeRouter().synthesize(users=subscribers, sessions_per_user=3))
+        queries = {}
+        with override_settings(ROUTER_IP='http://fake-router.invalid', MIKROTIK_TRANSPORT_ADAPTER=lambda: adapter):
+            clear_router_managers()
+            with transaction.atomic():
+                for step in SYNC_STEPS:
+                    with CaptureQueriesContext(connection) as captured:
+                        outcome = self.benchmark(sync_router_step, None, step, True, max_queries=30, repeat=1)
+                    self.assertEqual(outcome['errors'], {})
+                    queries[step] = len(captured)
+                transaction.set_rollback(True)
+        return queries
+
+    def test_query_count_does_not_grow_with_subscribers(self):
+        self.assertEqual(self._sync(scaled(20)), self._sync(scaled(80)))
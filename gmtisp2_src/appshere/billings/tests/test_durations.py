@@ -0,0 +1,28 @@
+from django.test import SimpleTestCase
+
+from utils.durations import format_duration, parse_duration, parse_durations
+
+
+class TestDurations(SimpleTestCase):
+    def test_routeros_formats(self):
+        cases = {
+            '3h50m45s': 3 * 3600 + 50 * 60 + 45,
+            '1w2d03:04:05': 9 * 86400 + 3 * 3600 + 4 * 60 + 5,
+            '15d 00:45:00': 15 * 86400 + 45 * 60,
+            '15 00:45:00': 15 * 86400 + 45 * 60,
+            '30d': 30 * 86400,
+            '1m500ms': 60,
+            '3600': 3600,
+            '0': 0,
+            '': 0,
+            None: 0,
+            'unlimited': 0,
+        }
+        for value, seconds in cases.items():
+            with self.subTest(value=value):
+                self.assertEqual(parse_duration(value), seconds)
+
+    def test_bulk_and_format(self):
+        self.assertEqual(parse_durations(['1h', '1h', '2m']), [3600, 3600, 120])
+        self.assertEqual(format_duration(parse_duration('1w2d03:04:05')), '1w2d3h4m5s')
+        self.assertEqual(format_duration(0), '0s')
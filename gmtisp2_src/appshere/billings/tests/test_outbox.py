@@ -0,0 +1,90 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase
+from django.utils import timezone
+
+from ..models import OutboxEvent, Profile
+from .. import outbound
+from ..outbound import enqueue_push, retry_delay, sync_origin
+from ..tasks import drain_outbox
+
+
+class TestOutbox(TestCase):
+    def setUp(self):
+        cache.clear()
+        patcher = mock.patch('appshere.billings.tasks.drain_outbox')
+        self.drain = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_sync_origin_suppresses_push(self):
+        with sync_origin():
+            Profile.objects.create(name='plan-1gb', price='10.00')
+        self.assertFalse(OutboxEvent.objects.exists())
+        Profile.objects.create(name='plan-5gb', price='40.00')
+        self.assertEqual(OutboxEvent.objects.get().model, 'billings.profile')
+
+    def test_burst_of_saves_queues_one_event(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            profile = Profile.objects.create(name='plan-1gb', price='10.00')
+            for price in ('12.00', '15.00'):
+                profile.price = price
+                profile.save()
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.revision, 2)
+        self.drain.apply_async.assert_called_once()
+
+    def test_drain_is_queued_again_after_a_rolled_back_transaction(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    Profile.objects.create(name='plan-1gb', price='10.00')
+                    raise RuntimeError('rolled back')
+            except RuntimeError:
+                pass
+            Profile.objects.create(name='plan-5gb', price='40.00')
+        self.drain.apply_async.assert_called_once()
+
+    def test_concurrent_enqueue_bumps_the_winning_event(self):
+        with sync_origin():
+            profile = Profile.objects.create(name='plan-1gb', price='10.00')
+        OutboxEvent.objects.create(model='billings.profile', object_id=str(profile.pk))
+        bump = outbound._bump_pending
+        calls = []
+
+        def racing_bump(label, object_id):
+            # the other transaction's event is not visible yet on the first attempt
+            calls.append(object_id)
+            return 0 if len(calls) == 1 else bump(label, object_id)
+
+        with mock.patch.object(outbound, '_bump_pending', side_effect=racing_bump):
+            enqueue_push(profile)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(OutboxEvent.objects.get().revision, 1)
+
+    def test_failed_push_is_retried_with_backoff(self):
+        profile = Profile.objects.create(name='plan-1gb', price='10.00')
+        with mock.patch('appshere.billings.tasks.create_or_update_profile_event', side_effect=ConnectionError('down')):
+            self.assertEqual(drain_outbox(), 0)
+        event = OutboxEvent.objects.get()
+        self.assertEqual((event.attempts, event.status), (1, 'pending'))
+        self.assertGreater(event.next_attempt, timezone.now())
+        self.assertEqual(retry_delay(3), 4 * retry_delay(1))
+
+        OutboxEvent.objects.update(next_attempt=timezone.now())
+        with mock.patch('appshere.billings.tasks.create_or_update_profile_event') as push:
+            self.assertEqual(drain_outbox(), 1)
+        push.assert_called_once_with(str(profile.pk))
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_save_during_push_keeps_event(self):
+        profile = Profile.objects.create(name='plan-1gb', price='10.00')
+
+        def push(object_id):
+            profile.price = '12.00'
+            profile.save()
+
+        with mock.patch('appshere.billings.tasks.create_or_update_profile_event', side_effect=push):
+            drain_outbox()
+        self.assertEqual(OutboxEvent.objects.get().revision, 1)
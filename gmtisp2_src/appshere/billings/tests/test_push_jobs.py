@@ -0,0 +1,58 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from appshere.accounts.models import Nas
+from ..models import OutboxEvent, Profile, PushJob
+from ..outbound import sync_origin
+from ..push_jobs import create_push_job, create_push_jobs, run_push_job
+from ..sync import bulk_reconcile
+
+
+class TestPushJob(TestCase):
+    def setUp(self):
+        with sync_origin():
+            bulk_reconcile(Profile, 'name', {
+                'plan-1gb': {'name_for_users': 'Plan 1GB', 'price': '10.00', 'validity': '30d',
+                             'starts_when': 'assigned', 'override_shared_users': 'off'},
+                'plan-5gb': {'name_for_users': 'Plan 5GB', 'price': '40.00', 'validity': '30d',
+                             'starts_when': 'assigned', 'override_shared_users': 'off'},
+                'plan-new': {'price': '5.00'},
+            })
+        self.manager = mock.Mock(router_ip='http://10.0.0.1')
+        self.manager.get_profiles.return_value = [
+            {'.id': '*1', 'name': 'plan-1gb', 'name-for-users': 'Plan 1GB', 'price': '10.00', 'validity': '30d',
+             'starts-when': 'assigned', 'override-shared-users': 'off'},
+            {'.id': '*2', 'name': 'plan-5gb', 'name-for-users': 'Plan 5GB', 'price': '35.00', 'validity': '30d',
+             'starts-when': 'assigned', 'override-shared-users': 'off'},
+        ]
+        self.manager.create_profile.return_value = {'.id': '*3'}
+
+    def test_only_needed_calls_are_made(self):
+        job = create_push_job(Profile.objects.all())
+        run_push_job(job, self.manager, max_workers=2)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(job.summary(), '3/3 processed: 1 created, 1 updated, 1 unchanged, 0 failed')
+        self.manager.get_profiles.assert_called_once()
+        self.manager.update_profile.assert_called_once()
+        self.assertEqual(self.manager.update_profile.call_args.args[0], '*2')
+        self.assertEqual(Profile.objects.get(name='plan-new').mikrotik_id, '*3')
+
+    def test_failures_are_recorded_per_object(self):
+        self.manager.create_profile.return_value = None
+        job = run_push_job(create_push_job(Profile.objects.filter(name='plan-new')), self.manager)
+        # a failed object does not fail the job; the outcome is stored on the job row
+        job = PushJob.objects.get(pk=job.pk)
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(job.failed_count, 1)
+        self.assertEqual(job.results[0]['action'], 'create')
+        self.assertTrue(job.results[0]['error'])
+        self.assertFalse(OutboxEvent.objects.exists())
+
+    def test_selection_is_split_per_router(self):
+        nas = Nas.objects.create(name='10.0.0.2', short_name='b', type='mikrotik', secret='s')
+        Profile.objects.filter(name='plan-new').update(nas=nas)
+        jobs = create_push_jobs(Profile.objects.all())
+        self.assertEqual([(job.nas, job.total) for job in jobs], [(None, 2), (nas, 1)])
+        self.assertEqual(PushJob.objects.filter(status='queued').count(), 2)
@@ -0,0 +1,140 @@
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+
+from utils.metrics import format_router_datetime, parse_router_datetime, parse_traffic_size
+from utils.mikrotik_userman import MikroTikTimeout
+from appshere.accounts.models import User
+from ..models import (
+    Limitation,
+    Profile,
+    ProfileLimitation,
+    QuotaBreach,
+    UserProfile,
+)
+from ..quotas import counter_period, enforce_breaches, in_time_window, lift_breaches
+from ..tasks import sync_sessions
+
+
+@mock.patch('appshere.billings.settings.QUOTA_ENFORCEMENT', True)
+@mock.patch('appshere.billings.tasks.send_traffic_update_to_group')
+class TestQuotaEnforcement(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='alice', mikrotik_id='*1')
+        profile = Profile.objects.create(name='daily-1k', validity='30d')
+        self.limitation = Limitation.objects.create(
+            name='1k-a-day', transfer_limit='1k', uptime_limit='0', reset_counters_interval='daily',
+        )
+        ProfileLimitation.objects.create(profile=profile, limitation=self.limitation)
+        UserProfile.objects.create(user=self.user, profile=profile, state='running-active')
+        self.manager = mock.Mock(router_ip='10.0.0.1')
+        self.started = format_router_datetime(timezone.now())
+
+    def _sync(self, *sessions):
+        sync_sessions(self.manager, incremental=False, mikrotik_sessions=[
+            {
+                '.id': f'*{session_id}', 'acct-session-id': session_id, 'user': 'alice', 'status': 'start,interim',
+                'started': self.started, 'download': str(download), 'upload': '0', 'uptime': '1m',
+            }
+            for session_id, download in sessions
+        ])
+
+    def test_breach_is_recorded_once_when_the_limit_is_crossed(self, send_update):
+        self._sync(('a', 600))
+        self.assertFalse(QuotaBreach.objects.exists())
+        # only what the session grew by is added to the counter
+        self._sync(('a', 1100))
+        self._sync(('a', 1200))
+        breach = QuotaBreach.objects.get()
+        self.assertEqual((breach.metric, breach.usage, breach.limit), ('transfer', 1100, 1024))
+        self.assertEqual(breach.period_end - breach.period_start, timedelta(days=1))
+
+    def test_enforcement_is_queued_once_for_a_burst_of_breaches(self, send_update):
+        other = User.objects.create(username='bob', mikrotik_id='*2')
+        UserProfile.objects.create(user=other, profile=Profile.objects.get(), state='running-active')
+        with mock.patch('appshere.billings.tasks.enforce_quotas') as enforce_quotas:
+            with self.captureOnCommitCallbacks(execute=True):
+                self._sync(('a', 2000))
+            with self.captureOnCommitCallbacks(execute=True):
+                sync_sessions(self.manager, incremental=False, mikrotik_sessions=[{
+                    '.id': '*b', 'acct-session-id': 'b', 'user': 'bob', 'status': 'start,interim',
+                    'started': self.started, 'download': '2000', 'upload': '0', 'uptime': '1m',
+                }])
+        self.assertEqual(QuotaBreach.objects.count(), 2)
+        enforce_quotas.apply_async.assert_called_once()
+
+    def test_cold_counters_are_seeded_from_the_database(self, send_update):
+        self._sync(('a', 600))
+        cache.clear()
+        self._sync(('b', 500))
+        self.assertEqual(QuotaBreach.objects.get().usage, 1100)
+
+    def test_limits_outside_the_time_window_are_not_enforced(self, send_update):
+        now = timezone.localtime()
+        ProfileLimitation.objects.update(weekdays=['monday', 'tuesday'][now.weekday() == 0])
+        self._sync(('a', 2000))
+        self.assertFalse(QuotaBreach.objects.exists())
+
+    def test_enforce_and_lift(self, send_update):
+        self._sync(('a', 2000))
+        with mock.patch('appshere.billings.quotas.get_router_manager', return_value=self.manager):
+            self.assertEqual(enforce_breaches(), 1)
+            self.manager.update_user.assert_called_once_with('*1', {'disabled': 'true'})
+            self.manager.disconnect_user.assert_called_once_with('alice')
+            self.user.refresh_from_db()
+            self.assertTrue(self.user.disabled)
+            # nothing to lift before the end of the day
+            self.assertEqual(lift_breaches(), 0)
+            self.assertEqual(lift_breaches(now=timezone.now() + timedelta(days=1)), 1)
+            self.manager.update_user.assert_called_with('*1', {'disabled': 'false'})
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.disabled)
+        self.assertIsNotNone(QuotaBreach.objects.get().lifted)
+
+    def test_router_failures_are_retried(self, send_update):
+        self._sync(('a', 2000))
+        self.manager.update_user.side_effect = MikroTikTimeout('slow router')
+        with mock.patch('appshere.billings.quotas.get_router_manager', return_value=self.manager):
+            self.assertEqual(enforce_breaches(), 0)
+            breach = QuotaBreach.objects.get()
+            self.assertIsNone(breach.enforced)
+            self.assertIn('slow router', breach.error)
+            self.manager.update_user.side_effect = None
+            self.assertEqual(enforce_breaches(), 1)
+
+
+class TestQuotaRules(SimpleTestCase):
+    def test_reset_periods(self):
+        now = parse_router_datetime('2024-03-15 10:30:00')
+        daily = SimpleNamespace(reset_counters_interval='daily', reset_counters_start_time=None)
+        self.assertEqual(counter_period(daily, None, now), (
+            parse_router_datetime('2024-03-15 00:00:00'), parse_router_datetime('2024-03-16 00:00:00'),
+        ))
+        # counters reset on the 31st are reset on the last day of shorter months
+        monthly = SimpleNamespace(reset_counters_interval='monthly', reset_counters_start_time='2024-01-31 06:00:00')
+        self.assertEqual(counter_period(monthly, None, now), (
+            parse_router_datetime('2024-02-29 06:00:00'), parse_router_datetime('2024-03-31 06:00:00'),
+        ))
+        never = SimpleNamespace(reset_counters_interval='disabled', reset_counters_start_time=None)
+        self.assertEqual(counter_period(never, now, now), (now, None))
+
+    def test_time_windows(self):
+        night = SimpleNamespace(from_time='22:00:00', till_time='06:00:00', weekdays='')
+        self.assertTrue(in_time_window(night, parse_router_datetime('2024-03-15 23:30:00')))
+        self.assertTrue(in_time_window(night, parse_router_datetime('2024-03-15 05:00:00')))
+        self.assertFalse(in_time_window(night, parse_router_datetime('2024-03-15 12:00:00')))
+        # 2024-03-15 is a Friday
+        weekend = SimpleNamespace(from_time='0s', till_time='23h59m59s', weekdays='saturday,sunday')
+        self.assertFalse(in_time_window(weekend, parse_router_datetime('2024-03-15 12:00:00')))
+
+    def test_traffic_sizes(self):
+        self.assertEqual(parse_traffic_size('100M'), 100 * 1024 ** 2)
+        self.assertEqual(parse_traffic_size('10G'), 10 * 1024 ** 3)
+        self.assertEqual(parse_traffic_size('1048576'), 1048576)
+        self.assertEqual(parse_traffic_size('0'), 0)
+        self.assertEqual(parse_traffic_size('unlimited'), 0)
@@ -0,0 +1,102 @@
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+
+from utils.mikrotik_userman import MikroTikTimeout
+from ..models import SyncRun
+from ..scheduler import (
+    SYNC_STEPS,
+    acquire_lock,
+    due_steps,
+    is_due,
+    is_locked,
+    mark_steps_done,
+    next_interval,
+    router_lock,
+    schedule_next,
+)
+from ..tasks import finish_router_sync, sync_router_data, sync_router_step
+
+
+class TestSyncScheduler(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_router_lock_is_exclusive(self):
+        with router_lock('default') as acquired:
+            self.assertTrue(acquired)
+            self.assertTrue(is_locked('default'))
+            with router_lock('default') as again:
+                self.assertFalse(again)
+            # a refused attempt does not release the holder's lock
+            self.assertTrue(is_locked('default'))
+        self.assertFalse(is_locked('default'))
+
+    def test_steps_run_at_their_cadence(self):
+        self.assertEqual(due_steps('default', now=1000), SYNC_STEPS)
+        mark_steps_done('default', SYNC_STEPS, now=1000)
+        self.assertEqual(due_steps('default', now=1010), ['sessions'])
+        self.assertEqual(due_steps('default', now=1200), ['users', 'user_profiles', 'sessions'])
+        self.assertEqual(due_steps('default', full=True, now=1010), SYNC_STEPS)
+
+    def test_interval_adapts_to_run_duration(self):
+        self.assertEqual(next_interval(), 30)
+        SyncRun.objects.create(router='10.0.0.1', started=timezone.now(), duration=5)
+        self.assertEqual(next_interval(), 30)
+        SyncRun.objects.create(router='10.0.0.1', started=timezone.now(), duration=45)
+        # average of 25s, doubled
+        self.assertEqual(next_interval(), 50)
+        SyncRun.objects.create(router='10.0.0.1', started=timezone.now(), duration=2000)
+        self.assertEqual(next_interval(), 600)
+
+    def test_router_is_due_after_its_interval(self):
+        self.assertTrue(is_due('default', now=1000))
+        schedule_next('default', 30, now=1000)
+        self.assertFalse(is_due('default', now=1020))
+        self.assertTrue(is_due('default', now=1030))
+
+    def test_run_that_loses_the_lock_race_reschedules_the_router(self):
+        schedule_next('default', 3600)
+        with router_lock('default'):
+            sync_router_data()
+        self.assertFalse(is_due('default'))
+        self.assertTrue(is_due('default', now=time.time() + next_interval()))
+
+
+class TestSyncSteps(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.manager = mock.Mock(router_ip='10.0.0.1')
+        self.manager.latency.snapshot.return_value = {}
+        patcher = mock.patch('appshere.billings.tasks.get_router_manager', return_value=self.manager)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_failing_step_is_isolated(self):
+        def sessions():
+            yield {'user': 'alice', 'acct-session-id': '1'}
+            raise MikroTikTimeout('slow router')
+
+        self.manager.iter_sessions.return_value = sessions()
+        outcome = sync_router_step(None, 'sessions')
+        self.assertEqual(list(outcome['errors']), ['sessions'])
+        # usage is not derived from a partially read listing
+        self.assertNotIn('usage', outcome['timings'])
+
+    def test_finish_records_run_and_releases_lock(self):
+        token = acquire_lock('default')
+        outcomes = [
+            {'step': 'users', 'timings': {'users': 0.5}, 'errors': {}, 'latency': {}},
+            {'step': 'profiles', 'timings': {'profiles': 0.1}, 'errors': {'profiles': 'boom'}, 'latency': {}},
+        ]
+        finish_router_sync(outcomes, None, token, timezone.now().isoformat())
+        run = SyncRun.objects.get()
+        self.assertEqual(run.status, 'failed')
+        self.assertEqual(run.timings, {'users': 0.5, 'profiles': 0.1})
+        self.assertEqual(run.error, 'profiles: boom')
+        self.assertFalse(is_locked('default'))
+        # the failed step stays due, the successful one waits for its cadence
+        self.assertEqual(due_steps('default'), ['profiles', 'limitations', 'user_profiles', 'sessions'])
@@ -0,0 +1,61 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from appshere.accounts.models import User
+from ..models import Profile, UserProfile
+from ..outbound import sync_origin
+from ..snapshots import find_id, forget, get_snapshot, invalidate_snapshot, lookup_id
+
+
+class TestRouterSnapshot(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.manager = mock.Mock(router_ip='http://10.0.0.1')
+        self.manager.get_users.return_value = [
+            {'.id': '*1', 'name': 'alice'},
+            {'.id': '*2', 'name': 'bob'},
+        ]
+
+    def test_listing_is_fetched_once(self):
+        self.assertEqual(lookup_id(self.manager, 'user', 'alice'), '*1')
+        self.assertEqual(lookup_id(self.manager, 'user', 'bob'), '*2')
+        self.assertIsNone(lookup_id(self.manager, 'user', 'carol'))
+        self.manager.get_users.assert_called_once()
+
+    def test_forget_and_invalidate(self):
+        lookup_id(self.manager, 'user', 'alice')
+        forget(self.manager, 'user', 'alice')
+        self.assertIsNone(lookup_id(self.manager, 'user', 'alice'))
+        invalidate_snapshot(self.manager)
+        self.assertEqual(lookup_id(self.manager, 'user', 'alice'), '*1')
+        self.assertEqual(self.manager.get_users.call_count, 2)
+
+    def test_find_id_fetches_one_row(self):
+        self.manager.get_users.return_value = [{'.id': '*2'}]
+        self.assertEqual(find_id(self.manager, 'user', 'bob'), '*2')
+        self.manager.get_users.assert_called_once_with(proplist=['.id'], filters={'name': 'bob'})
+        # a cached snapshot is used when there is one
+        self.manager.get_users.return_value = [{'.id': '*1', 'name': 'alice'}]
+        get_snapshot(self.manager, 'user')
+        self.assertIsNone(find_id(self.manager, 'user', 'bob'))
+        self.assertEqual(self.manager.get_users.call_count, 2)
+
+    def test_empty_listing_is_not_cached(self):
+        self.manager.get_users.return_value = []
+        lookup_id(self.manager, 'user', 'alice')
+        lookup_id(self.manager, 'user', 'alice')
+        self.assertEqual(self.manager.get_users.call_count, 2)
+
+    def test_user_profile_is_deleted_by_its_own_id(self):
+        with sync_origin():
+            user = User.objects.create(username='alice', mikrotik_id='*1')
+            profile = Profile.objects.create(name='plan-1gb', price='10.00', mikrotik_id='*9')
+            UserProfile.objects.create(user=user, profile=profile, mikrotik_id='*A1')
+            user_profile = UserProfile.objects.create(user=user, profile=profile, mikrotik_id='*A2')
+        with mock.patch('appshere.billings.signals.get_router_manager', return_value=self.manager):
+            user_profile.delete()
+        # the user's other profile row is left alone, and nothing is listed
+        self.manager.delete_user_profile.assert_called_once_with(user_profile_id='*A2')
+        self.manager.get_user_profiles.assert_not_called()
@@ -0,0 +1,270 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+
+from utils.metrics import parse_router_datetime
+from appshere.accounts.models import Nas, User, UserUsage
+from ..models import (
+    Profile,
+    UserProfile,
+    UserUsageDaily,
+    get_usage_between,
+    get_user_profiles_usage,
+)
+from ..tasks import sync_sessions
+from ..sync import (
+    MissingReferences,
+    advance_watermark,
+    bulk_reconcile,
+    highest_marks,
+    lookup_map,
+    lowest_marks,
+    marks_below,
+    needs_sync,
+    store_watermark,
+    usage_from_sessions,
+)
+
+
+class TestBulkReconcile(TestCase):
+    def _profile_rows(self, **overrides):
+        rows = {
+            'plan-1gb': {'name_for_users': 'Plan 1GB', 'price': '10.00', 'validity': '30d', 'mikrotik_id': '*1'},
+            'plan-5gb': {'name_for_users': 'Plan 5GB', 'price': '40.00', 'validity': '30d', 'mikrotik_id': '*2'},
+        }
+        for name, values in overrides.items():
+            rows[name].update(values)
+        return rows
+
+    def test_creates_missing_rows(self):
+        with self.assertNumQueries(2):
+            result = bulk_reconcile(Profile, 'name', self._profile_rows())
+        self.assertEqual(result.as_dict(), {'created': 2, 'updated': 0, 'unchanged': 0})
+        self.assertEqual(Profile.objects.count(), 2)
+
+    def test_unchanged_rows_are_not_written(self):
+        bulk_reconcile(Profile, 'name', self._profile_rows())
+        modified = Profile.objects.get(name='plan-1gb').modified
+        with self.assertNumQueries(1):
+            result = bulk_reconcile(Profile, 'name', self._profile_rows())
+        self.assertEqual(result.as_dict(), {'created': 0, 'updated': 0, 'unchanged': 2})
+        self.assertEqual(Profile.objects.get(name='plan-1gb').modified, modified)
+
+    def test_only_changed_rows_are_updated(self):
+        bulk_reconcile(Profile, 'name', self._profile_rows())
+        rows = self._profile_rows(**{'plan-5gb': {'price': '35.00'}})
+        with self.assertNumQueries(2):
+            result = bulk_reconcile(Profile, 'name', rows)
+        self.assertEqual(result.as_dict(), {'created': 0, 'updated': 1, 'unchanged': 1})
+        self.assertEqual(Profile.objects.get(name='plan-5gb').price, '35.00')
+
+    def test_update_fields_restricts_existing_rows(self):
+        bulk_reconcile(Profile, 'name', self._profile_rows())
+        rows = self._profile_rows(**{'plan-1gb': {'price': '99.00', 'validity': '7d'}})
+        result = bulk_reconcile(Profile, 'name', rows, update_fields=('validity',))
+        self.assertEqual(len(result.updated), 1)
+        profile = Profile.objects.get(name='plan-1gb')
+        self.assertEqual(profile.validity, '7d')
+        self.assertEqual(profile.price, '10.00')
+
+    def test_matching_hash_skips_row(self):
+        bulk_reconcile(Profile, 'name', self._profile_rows())
+        # a local edit is not compared field by field while the router payload is unchanged
+        Profile.objects.filter(name='plan-1gb').update(price='12.00')
+        with self.assertNumQueries(1):
+            result = bulk_reconcile(Profile, 'name', self._profile_rows())
+        self.assertEqual(result.unchanged, 2)
+        self.assertEqual(Profile.objects.get(name='plan-1gb').price, '12.00')
+
+    def test_missing_hash_is_backfilled_without_reporting_changes(self):
+        bulk_reconcile(Profile, 'name', self._profile_rows())
+        Profile.objects.update(sync_hash=None)
+        result = bulk_reconcile(Profile, 'name', self._profile_rows())
+        self.assertEqual(result.as_dict(), {'created': 0, 'updated': 0, 'unchanged': 2})
+        self.assertFalse(Profile.objects.filter(sync_hash__isnull=True).exists())
+
+    def test_scope_keeps_routers_apart(self):
+        nas_a = Nas.objects.create(name='10.0.0.1', short_name='a', type='mikrotik', secret='s')
+        nas_b = Nas.objects.create(name='10.0.0.2', short_name='b', type='mikrotik', secret='s')
+        rows = {'*1': {'total_download': 100}}
+        bulk_reconcile(UserUsage, 'mikrotik_id', rows, scope={'nas': nas_a})
+        result = bulk_reconcile(UserUsage, 'mikrotik_id', rows, scope={'nas': nas_b})
+        self.assertEqual(len(result.created), 1)
+        self.assertEqual(UserUsage.objects.filter(mikrotik_id='*1').count(), 2)
+        self.assertEqual(UserUsage.objects.get(nas=nas_b).total_download, 100)
+
+    def test_routers_may_share_profile_names(self):
+        nas_a = Nas.objects.create(name='10.0.0.1', short_name='a', type='mikrotik', secret='s')
+        nas_b = Nas.objects.create(name='10.0.0.2', short_name='b', type='mikrotik', secret='s')
+        bulk_reconcile(Profile, 'name', self._profile_rows(), scope={'nas': nas_a})
+        rows = self._profile_rows(**{'plan-1gb': {'price': '12.00', 'mikrotik_id': '*7'}})
+        result = bulk_reconcile(Profile, 'name', rows, scope={'nas': nas_b})
+        self.assertEqual(len(result.created), 2)
+        self.assertEqual(Profile.objects.get(name='plan-1gb', nas=nas_a).mikrotik_id, '*1')
+        self.assertEqual(Profile.objects.get(name='plan-1gb', nas=nas_b).price, '12.00')
+
+    def test_routers_may_share_user_names(self):
+        nas_a = Nas.objects.create(name='10.0.0.1', short_name='a', type='mikrotik', secret='s')
+        nas_b = Nas.objects.create(name='10.0.0.2', short_name='b', type='mikrotik', secret='s')
+        rows = {'*1': {'username': 'alice', 'name': 'alice'}}
+        bulk_reconcile(User, 'mikrotik_id', rows, scope={'nas': nas_a})
+        bulk_reconcile(User, 'mikrotik_id', rows, scope={'nas': nas_b})
+        self.assertEqual(User.objects.filter(username='alice').count(), 2)
+        # sessions and user profiles resolve the user of their own router
+        users = lookup_map(User, 'username', ['alice'], scope={'nas': nas_b})
+        self.assertEqual(users['alice'].nas, nas_b)
+
+    def test_untagged_rows_are_adopted(self):
+        nas = Nas.objects.create(name='10.0.0.1', short_name='a', type='mikrotik', secret='s')
+        User.objects.create(username='alice', name='alice', mikrotik_id='*1')
+        rows = {'*1': {'name': 'alice', 'group': 'default'}}
+        with self.assertNumQueries(3):
+            result = bulk_reconcile(User, 'mikrotik_id', rows, scope={'nas': nas}, adopt=True)
+        self.assertEqual(result.as_dict(), {'created': 0, 'updated': 1, 'unchanged': 0})
+        self.assertEqual(User.objects.get().nas, nas)
+        # without adoption the router's listing would be inserted again
+        result = bulk_reconcile(User, 'mikrotik_id', rows, scope={'nas': nas}, adopt=True)
+        self.assertEqual(result.unchanged, 1)
+
+
+class TestLookupMap(TestCase):
+    def test_single_query_for_referenced_keys(self):
+        bulk_reconcile(Profile, 'name', {
+            'plan-1gb': {'price': '10.00', 'mikrotik_id': '*1'},
+            'plan-5gb': {'price': '40.00', 'mikrotik_id': '*2'},
+        })
+        with self.assertNumQueries(1):
+            profiles = lookup_map(Profile, 'name', ['plan-1gb', 'plan-1gb', 'unknown', None])
+        self.assertEqual(list(profiles), ['plan-1gb'])
+
+    def test_missing_references_are_summarized(self):
+        missing = MissingReferences('user profile')
+        for index in range(7):
+            missing.skip(user=f'user-{index}', profile='plan-x')
+        with self.assertLogs('appshere.billings.sync', level='WARNING') as logs:
+            missing.report()
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('Skipped 7 user profile row(s)', logs.output[0])
+        self.assertIn('7 unknown user(s)', logs.output[0])
+        self.assertIn('(+2 more)', logs.output[0])
+        self.assertIn('1 unknown profile(s): plan-x', logs.output[0])
+
+
+class TestSessionWatermark(TestCase):
+    def _session(self, mikrotik_id, status, last_packet):
+        return {'.id': mikrotik_id, 'status': status, 'last-accounting-packet': last_packet}
+
+    def test_advance_and_skip_closed_sessions(self):
+        sessions = [
+            self._session('*1', 'stop', '2024-01-01 10:00:00'),
+            self._session('*2', 'start,interim', '2024-01-01 12:00:00'),
+        ]
+        watermark = advance_watermark('router', 'session', sessions)
+        self.assertEqual(watermark.last_mikrotik_id, '*2')
+        # already ingested closed session is skipped, active ones are always synced
+        self.assertFalse(needs_sync(sessions[0], watermark))
+        self.assertTrue(needs_sync(sessions[1], watermark))
+        # a session closed after the last run carries a newer accounting packet
+        self.assertTrue(needs_sync(self._session('*2', 'stop', '2024-01-01 12:30:00'), watermark))
+
+    def test_falls_back_to_mikrotik_id(self):
+        watermark = advance_watermark('router', 'session', [self._session('*A', 'stop', None)])
+        self.assertFalse(needs_sync(self._session('*9', 'stop', None), watermark))
+        self.assertTrue(needs_sync(self._session('*B', 'stop', None), watermark))
+
+    def test_unchanged_watermark_is_not_rewritten(self):
+        sessions = [self._session('*1', 'stop', '2024-01-01 10:00:00')]
+        watermark = advance_watermark('router', 'session', sessions)
+        with self.assertNumQueries(0):
+            advance_watermark('router', 'session', sessions, watermark)
+
+    def test_watermark_stops_before_skipped_sessions(self):
+        stored = [self._session('*1', 'stop', '2024-01-01 10:00:00'), self._session('*3', 'stop', '2024-01-01 12:00:00')]
+        # closed session of a user that was not synced yet
+        skipped = [self._session('*2', 'stop', '2024-01-01 11:00:00')]
+        watermark = store_watermark('router', 'session', marks_below(highest_marks(stored), lowest_marks(skipped)))
+        self.assertEqual(watermark.last_mikrotik_id, '*1')
+        self.assertFalse(needs_sync(stored[0], watermark))
+        self.assertTrue(needs_sync(skipped[0], watermark))
+
+
+class TestUsageFromSessions(TestCase):
+    def test_totals_are_derived_per_user(self):
+        sessions = [
+            {'user': 'alice', 'download': '100', 'upload': '10', 'uptime': '1h0m0s', 'status': 'stop'},
+            {'user': 'alice', 'download': '50', 'upload': '5', 'uptime': '30m', 'status': 'start,interim'},
+            {'user': 'bob', 'download': '7', 'upload': '3', 'uptime': '45s', 'status': 'stop'},
+        ]
+        usage = usage_from_sessions(sessions)
+        self.assertEqual(usage['alice'], {
+            'active-sessions': 1,
+            'total-download': 150,
+            'total-upload': 15,
+            'total-uptime': 5400,
+        })
+        self.assertEqual(usage['bob']['active-sessions'], 0)
+        self.assertEqual(usage['bob']['total-uptime'], 45)
+
+    def test_long_uptimes_count_days_and_weeks(self):
+        usage = usage_from_sessions([{'user': 'alice', 'uptime': '1w2d3h4m5s', 'status': 'stop'}])
+        self.assertEqual(usage['alice']['total-uptime'], 9 * 86400 + 3 * 3600 + 4 * 60 + 5)
+
+
+@mock.patch('appshere.billings.tasks.send_traffic_update_to_group')
+class TestDailyUsage(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='alice')
+        self.manager = mock.Mock(router_ip='10.0.0.1')
+
+    def _session(self, session_id, started, download, uptime='1h', status='stop'):
+        return {
+            '.id': f'*{session_id}', 'acct-session-id': session_id, 'user': 'alice', 'status': status,
+            'started': started, 'download': str(download), 'upload': '0', 'uptime': uptime,
+        }
+
+    def test_rollup_follows_synced_sessions(self, send_update):
+        sync_sessions(self.manager, incremental=False, mikrotik_sessions=[
+            self._session('a', '2024-01-01 10:00:00', 100, status='start,interim'),
+            self._session('b', '2024-01-01 18:00:00', 50),
+            self._session('c', '2024-01-02 09:00:00', 7),
+        ])
+        # the active session grew since the last run: its day is re-summed, not added to again
+        sync_sessions(self.manager, incremental=False, mikrotik_sessions=[
+            self._session('a', '2024-01-01 10:00:00', 300, uptime='2h'),
+        ])
+        first, second = UserUsageDaily.objects.order_by('day')
+        self.assertEqual((first.download, first.uptime_seconds, first.session_count), (350, 3 * 3600, 2))
+        self.assertEqual((second.download, second.session_count), (7, 1))
+
+    def test_usage_between_mixes_rollup_and_partial_days(self, send_update):
+        sync_sessions(self.manager, incremental=False, mikrotik_sessions=[
+            self._session('a', '2024-01-01 10:00:00', 1),
+            self._session('b', '2024-01-02 10:00:00', 10),
+            self._session('c', '2024-01-03 10:00:00', 100),
+            self._session('d', '2024-01-03 20:00:00', 1000),
+        ])
+        start = parse_router_datetime('2024-01-01 12:00:00')
+        end = parse_router_datetime('2024-01-03 12:00:00')
+        with self.assertNumQueries(2):
+            usage = get_usage_between(self.user.pk, start, end)
+        self.assertEqual((usage['download'], usage['session_count']), (110, 2))
+
+    def test_user_profiles_usage_is_batched(self, send_update):
+        sync_sessions(self.manager, incremental=False, mikrotik_sessions=[
+            self._session('a', '2024-01-01 10:00:00', 1),
+            self._session('b', '2024-01-02 10:00:00', 10),
+            self._session('c', '2024-01-03 10:00:00', 100),
+            self._session('d', '2024-01-05 10:00:00', 1000),
+        ])
+        profile = Profile.objects.create(name='two-days', validity='2d')
+        by_validity = UserProfile.objects.create(user=self.user, profile=profile)
+        by_end_time = UserProfile.objects.create(
+            user=self.user, profile=profile, end_time=parse_router_datetime('2024-01-02 12:00:00'),
+        )
+        UserProfile.objects.update(created=parse_router_datetime('2024-01-01 12:00:00'))
+        with self.assertNumQueries(2):
+            usage = get_user_profiles_usage([by_validity.pk, by_end_time.pk])
+        self.assertEqual((usage[by_validity.pk]['download'], usage[by_validity.pk]['session_count']), (110, 2))
+        self.assertEqual((usage[by_end_time.pk]['download'], usage[by_end_time.pk]['session_count']), (10, 1))
@@ -0,0 +1,256 @@
+import json
+import time
+from unittest import mock
+
+from django.core.cache import cache
+import httpx
+import requests
+from django.test import SimpleTestCase
+
+from utils.mikrotik_fake import FakeRouter, FakeRouterAdapter
+from utils.mikrotik_userman import (
+    MikroTikCircuitOpen,
+    MikroTikConnectionError,
+    MikroTikHTTPError,
+    MikroTikNotFound,
+    MikroTikResponseError,
+    MikroTikTimeout,
+    MikroTikUserManager,
+)
+from utils.mikrotik_userman_async import AsyncMikroTikUserManager
+
+
+class TestMikroTikTransport(SimpleTestCase):
+    def setUp(self):
+        self.manager = MikroTikUserManager(
+            'http://10.0.0.1', 'admin', 'secret', max_retries=2, retry_backoff=0.001, retry_backoff_max=0.001
+        )
+        patcher = mock.patch.object(self.manager.session, 'request')
+        self.request = patcher.start()
+        self.addCleanup(patcher.stop)
+        cache.clear()
+
+    def test_idempotent_requests_are_retried(self):
+        self.request.side_effect = requests.exceptions.ReadTimeout('slow router')
+        with self.assertRaises(MikroTikTimeout):
+            self.manager.get_users()
+        self.assertEqual(self.request.call_count, 3)
+
+    def test_creates_are_not_retried(self):
+        self.request.side_effect = requests.exceptions.ReadTimeout('slow router')
+        with self.assertRaises(MikroTikTimeout):
+            self.manager.create_user({'name': 'alice'})
+        self.assertEqual(self.request.call_count, 1)
+
+    def test_listings_are_projected_and_filtered(self):
+        self.request.return_value = mock.Mock(ok=True, status_code=200, content=b'[]')
+        self.request.return_value.json.return_value = []
+        self.manager.get_user_sessions('alice', proplist=['.id', 'download'])
+        self.assertEqual(
+            self.request.call_args.kwargs['url'],
+            'http://10.0.0.1/rest/user-manager/session?user=alice&.proplist=.id,download',
+        )
+        self.manager.query('rest/user-manager/session', proplist=['.id'], query=['download>1000'])
+        self.assertEqual(self.request.call_args.kwargs['method'], 'POST')
+        self.assertEqual(self.request.call_args.kwargs['url'], 'http://10.0.0.1/rest/user-manager/session/print')
+        self.assertEqual(self.request.call_args.kwargs['json'], {'.proplist': ['.id'], '.query': ['download>1000']})
+        # filters do not split the latency histogram
+        self.assertEqual(self.manager.latency.snapshot()['GET rest/user-manager/session']['count'], 1)
+
+    def test_sessions_are_streamed(self):
+        body = json.dumps([{'.id': f'*{i}', 'user': 'alice'} for i in range(3)]).encode()
+        response = mock.Mock(ok=True, status_code=200, url='http://10.0.0.1/rest/user-manager/session', encoding=None)
+        response.iter_content.return_value = [body[i:i + 7] for i in range(0, len(body), 7)]
+        self.request.return_value = response
+        sessions = self.manager.iter_sessions()
+        self.assertEqual(next(sessions), {'.id': '*0', 'user': 'alice'})
+        self.assertEqual([session['.id'] for session in sessions], ['*1', '*2'])
+        self.assertTrue(self.request.call_args.kwargs['stream'])
+        response.close.assert_called_once()
+
+    def test_truncated_stream_raises(self):
+        response = mock.Mock(ok=True, status_code=200, url='http://10.0.0.1/rest/user-manager/session', encoding=None)
+        response.iter_content.return_value = [b'[{"user": "alice"}, {"user": "b']
+        self.request.return_value = response
+        with self.assertRaises(MikroTikResponseError):
+            list(self.manager.iter_sessions())
+
+    def test_disconnect_skips_services_not_running(self):
+        listing = mock.Mock(ok=True, status_code=200, content=b'[{".id": "*5"}]')
+        listing.json.return_value = [{'.id': '*5'}]
+        removed = mock.Mock(ok=True, status_code=204, content=b'')
+        no_hotspot = mock.Mock(ok=False, status_code=400, text='no such command')
+        self.request.side_effect = [listing, removed, no_hotspot]
+        self.assertEqual(self.manager.disconnect_user('alice'), 1)
+        self.assertEqual(
+            [(call.kwargs['method'], call.kwargs['url']) for call in self.request.call_args_list],
+            [
+                ('GET', 'http://10.0.0.1/rest/ppp/active?name=alice&.proplist=.id'),
+                ('DELETE', 'http://10.0.0.1/rest/ppp/active/*5'),
+                ('GET', 'http://10.0.0.1/rest/ip/hotspot/active?user=alice&.proplist=.id'),
+            ],
+        )
+
+    def test_errors_are_typed_and_latency_is_recorded(self):
+        self.request.return_value = mock.Mock(ok=False, status_code=404, text='no such item')
+        with self.assertRaises(MikroTikNotFound) as context:
+            self.manager.get_user('*1A')
+        self.assertEqual(context.exception.status_code, 404)
+        # 404 is not transient, so it is not retried
+        self.assertEqual(self.request.call_count, 1)
+        latency = self.manager.latency.snapshot()
+        self.assertEqual(latency['GET rest/user-manager/user/{id}']['count'], 1)
+        self.assertEqual(latency['GET rest/user-manager/user/{id}']['buckets']['+Inf'], 1)
+
+
+class TestCircuitBreaker(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.manager = MikroTikUserManager(
+            'http://10.0.0.2', 'admin', 'secret', max_retries=0, breaker_failures=2, breaker_reset_timeout=60
+        )
+        patcher = mock.patch.object(self.manager.session, 'request')
+        self.request = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.request.side_effect = requests.exceptions.ConnectionError('unreachable')
+
+    def test_opens_after_consecutive_failures_and_fails_fast(self):
+        for _ in range(2):
+            with self.assertRaises(MikroTikConnectionError):
+                self.manager.get_users()
+        self.assertTrue(self.manager.breaker.is_open())
+        with self.assertRaises(MikroTikCircuitOpen):
+            self.manager.get_users()
+        self.assertEqual(self.request.call_count, 2)
+
+    def test_non_transient_errors_do_not_open(self):
+        self.request.side_effect = None
+        self.request.return_value = mock.Mock(ok=False, status_code=404, text='no such item')
+        for _ in range(3):
+            with self.assertRaises(MikroTikNotFound):
+                self.manager.get_user('*1')
+        self.assertFalse(self.manager.breaker.is_open())
+
+    def test_failed_probe_opens_again(self):
+        for _ in range(2):
+            with self.assertRaises(MikroTikConnectionError):
+                self.manager.get_users()
+        with mock.patch('utils.circuit_breaker.time.time', return_value=time.time() + 61):
+            with self.assertRaises(MikroTikConnectionError):
+                self.manager.get_users()
+            self.assertTrue(self.manager.breaker.is_open())
+            with self.assertRaises(MikroTikCircuitOpen):
+                self.manager.get_users()
+        self.assertEqual(self.request.call_count, 3)
+
+    def test_failures_are_counted_across_clients(self):
+        other = MikroTikUserManager('http://10.0.0.2', 'admin', 'secret', max_retries=0, breaker_failures=2)
+        other.breaker.record_failure()
+        self.assertFalse(self.manager.breaker.is_open())
+        self.manager.breaker.record_failure()
+        self.assertTrue(other.breaker.is_open())
+
+    def test_half_open_lets_one_probe_through(self):
+        for _ in range(2):
+            with self.assertRaises(MikroTikConnectionError):
+                self.manager.get_users()
+        with mock.patch('utils.circuit_breaker.time.time', return_value=time.time() + 61):
+            self.assertTrue(self.manager.breaker.allow_request())
+            self.assertFalse(self.manager.breaker.allow_request())
+            self.manager.breaker.record_success()
+        self.assertFalse(self.manager.breaker.is_open())
+        self.request.side_effect = None
+        self.request.return_value = mock.Mock(ok=True, status_code=200, text='[]')
+        self.request.return_value.json.return_value = []
+        self.assertEqual(self.manager.get_users(), [])
+
+
+class TestAsyncMikroTikTransport(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.requests = []
+        self.responses = []
+
+    def _manager(self, **options):
+        def handler(request):
+            self.requests.append(request)
+            response = self.responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        options = {'max_retries': 2, 'retry_backoff': 0.001, 'retry_backoff_max': 0.001, **options}
+        return AsyncMikroTikUserManager(
+            'http://10.0.0.1', 'admin', 'secret', transport=httpx.MockTransport(handler), **options
+        )
+
+    async def test_listings_are_projected_and_filtered(self):
+        self.responses = [httpx.Response(200, json=[{'.id': '*1'}]), httpx.Response(200, json=[])]
+        async with self._manager() as manager:
+            self.assertEqual(await manager.get_user_sessions('alice', proplist=['.id', 'download']), [{'.id': '*1'}])
+            await manager.query('rest/user-manager/session', proplist=['.id'], query=['download>1000'])
+        listing, print_command = self.requests
+        self.assertEqual(listing.url.path, '/rest/user-manager/session')
+        self.assertEqual(dict(listing.url.params), {'user': 'alice', '.proplist': '.id,download'})
+        self.assertEqual((print_command.method, print_command.url.path), ('POST', '/rest/user-manager/session/print'))
+        self.assertEqual(json.loads(print_command.content), {'.proplist': ['.id'], '.query': ['download>1000']})
+
+    async def test_errors_are_typed_and_transient_ones_retried(self):
+        self.responses = [httpx.Response(404, text='no such item'), *[httpx.ReadTimeout('slow router')] * 3]
+        async with self._manager() as manager:
+            with self.assertRaises(MikroTikNotFound):
+                await manager.get_user('*1A')
+            with self.assertRaises(MikroTikTimeout):
+                await manager.get_users()
+        self.assertEqual(len(self.requests), 4)
+        self.assertEqual(manager.latency.snapshot()['GET rest/user-manager/user/{id}']['count'], 1)
+
+    async def test_circuit_breaker_is_shared_with_the_sync_client(self):
+        self.responses = [httpx.ConnectError('unreachable')] * 2
+        async with self._manager(max_retries=0, breaker_failures=2) as manager:
+            for _ in range(2):
+                with self.assertRaises(MikroTikConnectionError):
+                    await manager.get_users()
+            with self.assertRaises(MikroTikCircuitOpen):
+                await manager.get_users()
+        self.assertEqual(len(self.requests), 2)
+        self.assertTrue(MikroTikUserManager('http://10.0.0.1', 'admin', 'secret', breaker_failures=2).breaker.is_open())
+
+    async def test_sessions_are_streamed(self):
+        body = json.dumps([{'.id': f'*{i}', 'user': 'alice'} for i in range(3)]).encode()
+        self.responses = [httpx.Response(200, stream=httpx.ByteStream(body))]
+        async with self._manager(stream_chunk_size=7) as manager:
+            sessions = [session['.id'] async for session in manager.iter_sessions(proplist=['.id', 'user'])]
+        self.assertEqual(sessions, ['*0', '*1', '*2'])
+        self.assertEqual(self.requests[0].url.params['.proplist'], '.id,user')
+
+    async def test_failed_monitor_calls_are_left_out(self):
+        self.responses = [httpx.Response(200, json=[{'total-download': '10'}]), httpx.Response(400, text='no such item')]
+        async with self._manager(max_concurrency=1) as manager:
+            usage = await manager.monitor_users_usage(['*1', '*2'])
+        self.assertEqual(usage, {'*1': [{'total-download': '10'}]})
+
+
+class TestFakeRouter(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.router = FakeRouter().synthesize(users=20, sessions_per_user=2, profiles=2)
+
+    def _manager(self, **kwargs):
+        adapter = FakeRouterAdapter(self.router, **kwargs)
+        return MikroTikUserManager('http://fake-router', 'admin', 'secret', max_retries=0, adapter=adapter)
+
+    def test_serves_listings_and_writes(self):
+        manager = self._manager()
+        self.assertEqual(len(manager.get_users()), 20)
+        self.assertEqual(len(list(manager.iter_sessions())), 40)
+        self.assertEqual(len(manager.get_user_sessions('user000003', proplist=['.id'])), 2)
+        created = manager.create_user({'name': 'carol'})
+        self.assertEqual(manager.get_users(filters={'name': 'carol'})[0]['.id'], created['.id'])
+        manager.delete_user(created['.id'])
+        self.assertEqual(manager.get_users(filters={'name': 'carol'}), [])
+
+    def test_error_injection(self):
+        manager = self._manager(error_rate=1, seed=1)
+        with self.assertRaises((MikroTikConnectionError, MikroTikHTTPError)):
+            manager.get_users()
@@ -0,0 +1,203 @@
+import logging
+import os
+import time
+from datetime import timedelta
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from appshere.accounts.models import Organization, User, UserUsage
+from ..models import Payment, Profile, Session, UserProfile
+from ..sync import refresh_daily_usage
+
+logger = logging.getLogger(__name__)
+
+# Multiplies the volumes generated by the benchmark fixtures, e.g. GMTISP_BENCHMARK_SCALE=10
+BENCHMARK_SCALE = int(os.environ.get('GMTISP_BENCHMARK_SCALE', 1))
+
+
+def scaled(count):
+    return count * BENCHMARK_SCALE
+
+
+# ------------------------------- fixtures
+def make_organization(name='acme'):
+    return Organization.objects.create(name=name, slug=name, email=f'info@{name}.test')
+
+
+def make_users(count, organization=None, prefix='user'):
+    users = [
+        User(
+            username=f'{prefix}{index:06d}',
+            name=f'{prefix}{index:06d}',
+            email=f'{prefix}{index:06d}@example.test',
+            password='!',
+            organization=organization,
+            mikrotik_id=f'*{prefix}{index:X}',
+        )
+        for index in range(count)
+    ]
+    return User.objects.bulk_create(users, batch_size=1000)
+
+
+def make_profiles(count=5, organization=None):
+    profiles = [
+        Profile(
+            name=f'plan-{index}',
+            name_for_users=f'Plan {index}',
+            price=f'{(index + 1) * 10}.00',
+            validity='30d',
+            validity_duration=timedelta(days=30),
+            organization=organization,
+        )
+        for index in range(count)
+    ]
+    return Profile.objects.bulk_create(profiles)
+
+
+def make_user_profiles(users, profiles, per_user=1):
+    now = timezone.now()
+    user_profiles = [
+        UserProfile(
+            user=user,
+            profile=profiles[(index + number) % len(profiles)],
+            organization=user.organization,
+            state='running-active' if number == per_user - 1 else 'used',
+            end_time=now + timedelta(days=30),
+        )
+        for index, user in enumerate(users)
+        for number in range(per_user)
+    ]
+    return UserProfile.objects.bulk_create(user_profiles, batch_size=1000)
+
+
+def make_sessions(users, per_user=20, active_ratio=0.1):
+    """`per_user` sessions per user, spread over the last two months; the most recent one may still be open."""
+    now = timezone.now().replace(microsecond=0)
+    sessions = []
+    for index, user in enumerate(users):
+        for number in range(per_user):
+            started = now - timedelta(days=60 * (number + 1) / per_user, minutes=index % 60)
+            uptime = 600 + (index * 37 + number * 113) % 7200
+            active = number == 0 and (index % 100) < active_ratio * 100
+            ended = None if active else started + timedelta(seconds=uptime)
+            sessions.append(Session(
+                session_id=f'{user.pk.hex[:12]}{number:05x}',
+                user=user,
+                organization=user.organization,
+                nas_port_id='ether2',
+                nas_port_type='ethernet',
+                calling_station_id=f'02:00:00:00:{index >> 8 & 255:02X}:{index & 255:02X}',
+                user_address=f'10.0.{index >> 8 & 255}.{index & 255}',
+                download=1000000 + (index * 7919 + number * 104729) % 900000000,
+                upload=100000 + (index * 104729 + number * 7919) % 90000000,
+                uptime=uptime,
+                status='start,interim' if active else 'stop',
+                started=started,
+                ended=ended,
+                last_accounting_packet=ended or now,
+            ))
+    sessions = Session.objects.bulk_create(sessions, batch_size=1000)
+    refresh_daily_usage(sessions)
+    return sessions
+
+
+def make_payments(users, profiles, per_user=3):
+    now = timezone.now()
+    payments = [
+        Payment(
+            user=user,
+            organization=user.organization,
+            profile=profiles[number % len(profiles)],
+            trans_status='success',
+            price=profiles[number % len(profiles)].price,
+            trans_start=now - timedelta(days=30 * number),
+            trans_end=now - timedelta(days=30 * number),
+        )
+        for user in users
+        for number in range(per_user)
+    ]
+    return Payment.objects.bulk_create(payments, batch_size=1000)
+
+
+def make_usage(users):
+    usage = [
+        UserUsage(
+            user=user,
+            organization=user.organization,
+            mikrotik_id=user.mikrotik_id,
+            total_download=10 ** 9,
+            total_upload=10 ** 8,
+            total_uptime=36000,
+        )
+        for user in users
+    ]
+    return UserUsage.objects.bulk_create(usage, batch_size=1000)
+
+
+def walk(rows, *paths):
+    """Read dotted attribute `paths` on every row, like a template rendering the list would."""
+    rows = list(rows)
+    for row in rows:
+        for path in paths:
+            value = row
+            for name in path.split('.'):
+                value = getattr(value, name)
+                if value is None:
+                    break
+            if callable(value):
+                value()
+    return rows
+
+
+class SubscriberDataMixin:
+    """
+    Test data of one organization: `scaled(200)` subscribers with a short history, one heavy
+    subscriber with a long one, their user profiles, payments and usage, and a superuser.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.organization = make_organization()
+        cls.profiles = make_profiles(organization=cls.organization)
+        cls.users = make_users(scaled(200), organization=cls.organization)
+        # one heavy subscriber with a long session history
+        cls.heavy_user = make_users(1, organization=cls.organization, prefix='heavy')[0]
+        make_sessions(cls.users, per_user=scaled(10))
+        make_sessions([cls.heavy_user], per_user=scaled(2000))
+        cls.user_profiles = make_user_profiles(cls.users + [cls.heavy_user], cls.profiles, per_user=3)
+        make_payments(cls.users, cls.profiles)
+        make_usage(cls.users)
+        cls.superuser = User.objects.create(username='root', is_superuser=True, is_staff=True, organization=cls.organization)
+
+    def _view(self, view_class, user=None):
+        request = RequestFactory().get('/')
+        request.user = user or self.superuser
+        view = view_class()
+        view.setup(request)
+        return view
+
+
+# ------------------------------- benchmarking
+class BenchmarkMixin:
+    """
+    Time a hot path and hold it to a query budget: exceeding `max_queries` fails the test,
+    so an N+1 or a dropped aggregate shows up in CI. Timings are logged, best of `repeat` runs.
+    """
+
+    def benchmark(self, func, *args, max_queries, repeat=3, **kwargs):
+        best = None
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                result = func(*args, **kwargs)
+                elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+            self.assertLessEqual(
+                len(queries), max_queries,
+                f"{func.__qualname__} ran {len(queries)} queries (budget {max_queries}):\n"
+                + '\n'.join(query['sql'] for query in queries.captured_queries),
+            )
+        logger.info(f"{self.id()}: {func.__qualname__} {best * 1000:.1f}ms, {len(queries)} queries")
+        return result
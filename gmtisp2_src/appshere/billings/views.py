@@ -3,7 +3,7 @@ import uuid
 import logging
 import requests
 import paystack
-import datetime
+from django.utils import timezone
 
 from django.shortcuts import render, redirect, get_object_or_404
 from django.conf import settings
@@ -44,7 +44,7 @@ class UserProfileListView(OrganizationMixin, ListView):
     context_object_name = 'user_profiles'
 
     def get_queryset(self):
-        queryset = UserProfile.objects.all()
+        queryset = UserProfile.objects.select_related('user', 'profile', 'organization')
         return self.get_queryset_filtered_by_organization(queryset)
 
     def get_context_data(self, **kwargs):
@@ -59,7 +59,7 @@ class PaymentListView(OrganizationMixin, ListView):
     context_object_name = 'payments'
 
     def get_queryset(self):
-        queryset = Payment.objects.all()
+        queryset = Payment.objects.select_related('user', 'profile', 'organization')
         return self.get_queryset_filtered_by_organization(queryset)
 
     def get_context_data(self, **kwargs):
@@ -73,7 +73,7 @@ class SessionListView(OrganizationMixin, ListView):
     context_object_name = 'user_sessions'
 
     def get_queryset(self):
-        queryset = Session.objects.all()
+        queryset = Session.objects.select_related('user', 'organization')
         return self.get_queryset_filtered_by_organization(queryset)
 
     def get_context_data(self, **kwargs):
@@ -161,7 +161,7 @@ class VerifyPaymentView(View):
                     profile=profile,
                     organization=user_organization,
                     method="ONLINE",
-                    trans_end=datetime.datetime.now(),
+                    trans_end=timezone.now(),
                     trans_status="completed",
                     price=response_data['data']['amount'] / 100,
                     paystack_reference=reference
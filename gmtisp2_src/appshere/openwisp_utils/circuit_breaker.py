@@ -0,0 +1,69 @@
+# mpi_src/usermanager/circuit_breaker.py
+import logging
+import time
+
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """
+    Cache-backed circuit breaker for one router, shared by every process using the cache.
+
+    After `failure_threshold` consecutive failures the breaker opens and calls fail fast for
+    `reset_timeout` seconds. Then it is half-open: a single caller is let through as a probe;
+    its success closes the breaker, its failure opens it again for another `reset_timeout`.
+    """
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=60):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        # separate keys so that concurrent processes update them atomically
+        self.failures_key = f'mikrotik-breaker-failures:{name}'
+        self.opened_key = f'mikrotik-breaker-opened:{name}'
+        self.probe_key = f'mikrotik-breaker-probe:{name}'
+
+    def _opened_at(self):
+        return cache.get(self.opened_key)
+
+    def is_open(self):
+        """Whether calls are currently refused (open and not yet due for a probe)."""
+        opened_at = self._opened_at()
+        return opened_at is not None and time.time() - opened_at < self.reset_timeout
+
+    def allow_request(self):
+        """Whether a call may go through now; in half-open state only one probe is allowed."""
+        opened_at = self._opened_at()
+        if opened_at is None:
+            return True
+        if time.time() - opened_at < self.reset_timeout:
+            return False
+        # half-open: the first caller to claim the probe slot tries the router
+        return cache.add(self.probe_key, True, timeout=self.reset_timeout)
+
+    def record_success(self):
+        state = cache.get_many([self.failures_key, self.opened_key])
+        if state:
+            if self.opened_key in state:
+                logger.info(f"Circuit breaker for {self.name} closed")
+            cache.delete_many([self.failures_key, self.opened_key, self.probe_key])
+
+    def record_failure(self):
+        cache.add(self.failures_key, 0, timeout=None)
+        try:
+            failures = cache.incr(self.failures_key)
+        except ValueError:
+            # reset by a concurrent success in between
+            cache.add(self.failures_key, 1, timeout=None)
+            failures = 1
+        if failures < self.failure_threshold:
+            return
+        now = time.time()
+        if cache.add(self.opened_key, now, timeout=None):
+            logger.warning(f"Circuit breaker for {self.name} opened after {failures} consecutive failures")
+        elif not self.is_open():
+            # the half-open probe failed: refuse calls for another reset_timeout
+            cache.set(self.opened_key, now, timeout=None)
+            cache.delete(self.probe_key)
@@ -1,19 +1,15 @@
 # mpi_src/usermanager/data_preparation.py
 import logging
+from .durations import format_duration, parse_duration
+from .metrics import format_router_datetime, format_uptime
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 def format_uptime_limit(value: str) -> str:
+    """Normalize a stored uptime limit ('30d', '1 00:00:00', '1w2d03:04:05') to RouterOS' compact form."""
     if not value:
         return ''
-    parts = value.split()
-    if len(parts) == 1:
-        return parts[0]
-    elif len(parts) == 2:
-        days, time_str = parts[0], parts[1]
-        time_parts = time_str.split(':')
-        return f"{days}d {time_parts[0]}:{time_parts[1]}:{time_parts[2]}"
-    return value
+    return format_duration(parse_duration(value))
 
 
 # def prepare_user_data(user) -> dict:
@@ -112,17 +108,17 @@ def prepare_session_data(session) -> dict:
         'acct-session-id': session.acct_session_id or '',
         'active': str(session.active).lower(),
         'calling-station-id': session.calling_station_id or '',
-        'download': session.download or '',
-        'ended': session.ended or '',
-        'last-accounting-packet': session.last_accounting_packet or '',
+        'download': str(session.download),
+        'ended': format_router_datetime(session.ended),
+        'last-accounting-packet': format_router_datetime(session.last_accounting_packet),
         'nas-ip-address': session.nas_ip_address or '',
         'nas-port-id': session.nas_port_id or '',
         'nas-port-type': session.nas_port_type or '',
-        'started': session.started or '',
+        'started': format_router_datetime(session.started),
         'status': session.status or '',
         'terminate-cause': session.terminate_cause or '',
-        'upload': session.upload or '',
-        'uptime': session.uptime or '',
+        'upload': str(session.upload),
+        'uptime': format_uptime(session.uptime),
         'user': session.user or '',
         'user-address': session.user_address or '',
     }
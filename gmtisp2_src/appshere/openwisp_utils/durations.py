@@ -0,0 +1,67 @@
+# mpi_src/usermanager/durations.py
+"""
+RouterOS duration codec.
+
+The router writes durations in several shapes: '3h50m45s' (REST, v7), '1w2d03:04:05'
+(v6 and the terminal), '15d 00:45:00' or '15 00:45:00' (profile validity), bare seconds
+('3600') and '0' or '' for none. All of them are read by `parse_duration`.
+"""
+import re
+from datetime import timedelta
+from functools import lru_cache
+
+UNIT_SECONDS = {'w': 604800, 'd': 86400, 'h': 3600, 'm': 60, 's': 1}
+
+# a number with a unit ('2d', '500ms'), or a clock ('03:04:05', '0:45') optionally preceded by bare days
+DURATION_TOKEN = re.compile(r'(\d+)(ms|[wdhms])|(?:(\d+)\s+)?(\d+):(\d{1,2})(?::(\d{1,2}))?(?:\.\d+)?')
+PLAIN_SECONDS = re.compile(r'\d+')
+
+
+@lru_cache(maxsize=4096)
+def _parse(text):
+    # the distinct strings seen in production are few ('1h', '30d', ...), so parsing is memoized
+    if PLAIN_SECONDS.fullmatch(text):
+        return int(text)
+    seconds = 0
+    for number, unit, days, hours, minutes, clock_seconds in DURATION_TOKEN.findall(text):
+        if unit == 'ms':
+            seconds += int(number) // 1000
+        elif unit:
+            seconds += int(number) * UNIT_SECONDS[unit]
+        else:
+            seconds += int(days or 0) * 86400 + int(hours) * 3600 + int(minutes) * 60 + int(clock_seconds or 0)
+    return seconds
+
+
+def parse_duration(value):
+    """Whole seconds in a RouterOS duration; 0 for None, '' or anything unreadable."""
+    if not value:
+        return 0
+    if isinstance(value, timedelta):
+        return int(value.total_seconds())
+    if isinstance(value, (int, float)):
+        return int(value)
+    return _parse(value.strip())
+
+
+def parse_timedelta(value):
+    """`parse_duration` as a timedelta."""
+    return timedelta(seconds=parse_duration(value))
+
+
+def parse_durations(values):
+    """Parse a column of durations at once, each distinct value only once."""
+    values = list(values)
+    parsed = {value: parse_duration(value) for value in set(values)}
+    return [parsed[value] for value in values]
+
+
+def format_duration(seconds):
+    """Seconds as a compact RouterOS duration, e.g. 788645 -> '1w2d3h4m5s' ('0s' for none)."""
+    remainder = int(seconds)
+    parts = []
+    for unit, size in UNIT_SECONDS.items():
+        count, remainder = divmod(remainder, size)
+        if count:
+            parts.append(f'{count}{unit}')
+    return ''.join(parts) or '0s'
@@ -1,3 +1,8 @@
+import re
+from datetime import datetime
+from django.utils import timezone
+
+
 def format_traffic_size(bytes_size):
     """Convert bytes to a human-readable format."""
     if bytes_size < 1024:
@@ -10,19 +15,60 @@ def format_traffic_size(bytes_size):
         return f"{bytes_size / 1024**3:.2f} GB"
     
 
-import re
-def parse_uptime(uptime_str):
-    """Parse uptime string (like '1h30m45s') into total seconds."""
-    total_seconds = 0
-    matches = re.findall(r'(\d+)([hms])', uptime_str)
-
-    for value, unit in matches:
-        value = int(value)
-        if unit == 'h':
-            total_seconds += value * 3600
-        elif unit == 'm':
-            total_seconds += value * 60
-        elif unit == 's':
-            total_seconds += value
-
-    return total_seconds
\ No newline at end of file
+def format_uptime(total_seconds):
+    """Format a number of seconds as an uptime string (like '1h30m45s')."""
+    hours, remainder = divmod(int(total_seconds), 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{hours}h{minutes}m{seconds}s"
+
+
+TRAFFIC_SIZE = re.compile(r'(\d+(?:\.\d+)?)\s*([kmgt]?)i?b?', re.IGNORECASE)
+TRAFFIC_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+
+
+def parse_traffic_size(value):
+    """Bytes in a RouterOS traffic size such as '100M', '10G' or '1048576'; 0 for none or unreadable."""
+    if not value:
+        return 0
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = TRAFFIC_SIZE.fullmatch(value.strip())
+    if match is None:
+        return 0
+    return int(float(match.group(1)) * TRAFFIC_UNITS[match.group(2).lower()])
+
+
+ROUTER_DATETIME_FORMATS = (
+    '%Y-%m-%d %H:%M:%S',  # RouterOS v7 REST
+    '%b/%d/%Y %H:%M:%S',  # RouterOS v6, e.g. 'jan/02/2024 10:00:00'
+)
+
+def parse_router_datetime(value):
+    """Parse a RouterOS timestamp into an aware datetime, or return None if it cannot be parsed."""
+    if not value:
+        return None
+    if isinstance(value, datetime):
+        parsed = value
+    else:
+        parsed = None
+        for fmt in ROUTER_DATETIME_FORMATS:
+            try:
+                parsed = datetime.strptime(value.strip().capitalize(), fmt)
+                break
+            except ValueError:
+                continue
+        if parsed is None:
+            try:
+                parsed = datetime.fromisoformat(value)
+            except ValueError:
+                return None
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def format_router_datetime(value):
+    """Format an aware datetime the way RouterOS v7 REST expects it, in local time; '' for None."""
+    if not value:
+        return ''
+    return timezone.localtime(value).strftime(ROUTER_DATETIME_FORMATS[0])
@@ -0,0 +1,255 @@
+# mpi_src/usermanager/mikrotik_fake.py
+import io
+import json
+import logging
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import parse_qsl, urlsplit
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+logger = logging.getLogger(__name__)
+
+API_PREFIX = '/rest/user-manager/'
+RESOURCES = ('user', 'profile', 'limitation', 'user-profile', 'profile-limitation', 'payment', 'session')
+ROUTER_DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+class FakeRouter:
+    """
+    In-memory stand-in for a RouterOS User Manager: rows per resource, filled by `synthesize`
+    or loaded from a recording made with `RecordingAdapter`. Served over HTTP-less requests
+    by `FakeRouterAdapter`.
+    """
+
+    def __init__(self, rows=None):
+        self._lock = threading.Lock()
+        self.rows = {resource: [] for resource in RESOURCES}
+        self._next_id = 1
+        for resource, resource_rows in (rows or {}).items():
+            for row in resource_rows:
+                self.add(resource, row)
+
+    @classmethod
+    def load(cls, path):
+        """Build a router from a recording file: ``{resource: [rows]}``."""
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def add(self, resource, row):
+        with self._lock:
+            row = dict(row)
+            if '.id' not in row:
+                row['.id'] = f'*{self._next_id:X}'
+            self._next_id = max(self._next_id, int(row['.id'].lstrip('*'), 16)) + 1
+            self.rows[resource].append(row)
+            return row
+
+    def synthesize(self, users=1000, sessions_per_user=3, profiles=5, active_ratio=0.1, seed=0):
+        """
+        Fill the router with `users` subscribers, each assigned one of `profiles` profiles, and
+        `sessions_per_user` sessions per subscriber of which about `active_ratio` are still open.
+        """
+        rng = random.Random(seed)
+        now = datetime.now().replace(microsecond=0)
+        for index in range(profiles):
+            self.add('limitation', {
+                'name': f'limit-{index}',
+                'transfer-limit': str((index + 1) * 10 ** 9),
+                'uptime-limit': '0s',
+                'rate-limit-rx': '10M',
+                'rate-limit-tx': '10M',
+                'reset-counters-interval': 'monthly',
+            })
+            self.add('profile', {
+                'name': f'plan-{index}',
+                'name-for-users': f'Plan {index}',
+                'price': f'{(index + 1) * 10}.00',
+                'validity': '30d',
+                'starts-when': 'assigned',
+                'override-shared-users': 'off',
+            })
+            self.add('profile-limitation', {'profile': f'plan-{index}', 'limitation': f'limit-{index}'})
+        for index in range(users):
+            name = f'user{index:06d}'
+            self.add('user', {
+                'name': name,
+                'group': 'default',
+                'disabled': 'false',
+                'shared-users': '1',
+                'password': f'secret{index}',
+                'otp-secret': '',
+                'attributes': '',
+            })
+            self.add('user-profile', {
+                'user': name,
+                'profile': f'plan-{index % profiles}',
+                'state': 'running-active',
+                'end-time': (now + timedelta(days=rng.randint(1, 30))).strftime(ROUTER_DATETIME_FORMAT),
+            })
+            for number in range(sessions_per_user):
+                started = now - timedelta(hours=rng.randint(1, 24 * 60), minutes=rng.randint(0, 59))
+                uptime = rng.randint(60, 12 * 3600)
+                active = number == sessions_per_user - 1 and rng.random() < active_ratio
+                self.add('session', {
+                    'acct-session-id': f'{index:06x}{number:04x}',
+                    'user': name,
+                    'nas-ip-address': '10.0.0.1',
+                    'nas-port-id': 'ether2',
+                    'nas-port-type': 'ethernet',
+                    'calling-station-id': f'02:00:00:{index >> 16 & 255:02X}:{index >> 8 & 255:02X}:{index & 255:02X}',
+                    'user-address': f'10.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}',
+                    'download': str(rng.randint(10 ** 5, 10 ** 9)),
+                    'upload': str(rng.randint(10 ** 4, 10 ** 8)),
+                    'uptime': f'{uptime // 3600}h{uptime % 3600 // 60}m{uptime % 60}s',
+                    'status': 'start,interim' if active else 'stop',
+                    'started': started.strftime(ROUTER_DATETIME_FORMAT),
+                    'last-accounting-packet': (started + timedelta(seconds=uptime)).strftime(ROUTER_DATETIME_FORMAT),
+                    **({} if active else {
+                        'ended': (started + timedelta(seconds=uptime)).strftime(ROUTER_DATETIME_FORMAT),
+                        'terminate-cause': 'user-request',
+                    }),
+                })
+        return self
+
+    # ------------------------------------------------ REST semantics
+    def _find(self, resource, row_id):
+        return next((row for row in self.rows[resource] if row['.id'] == row_id), None)
+
+    @staticmethod
+    def _project(rows, proplist):
+        if not proplist:
+            return rows
+        return [{key: row[key] for key in proplist if key in row} for row in rows]
+
+    def _monitor(self, user_id):
+        user = self._find('user', user_id)
+        if user is None:
+            return 404, {'error': 404, 'message': 'no such item'}
+        sessions = [row for row in self.rows['session'] if row.get('user') == user['name']]
+        return 200, [{
+            'active-sessions': str(sum(1 for row in sessions if 'stop' not in row.get('status', ''))),
+            'active-sub-sessions': '0',
+            'total-download': str(sum(int(row.get('download', 0)) for row in sessions)),
+            'total-upload': str(sum(int(row.get('upload', 0)) for row in sessions)),
+            'total-uptime': '0s',
+            'attributes-details': '',
+        }]
+
+    def handle(self, method, path, params=None, body=None):
+        """Answer one REST call; returns (status code, JSON-serializable body)."""
+        parts = path[len(API_PREFIX):].strip('/').split('/') if path.startswith(API_PREFIX) else []
+        if not parts or parts[0] not in self.rows:
+            return 400, {'error': 400, 'message': 'no such command'}
+        resource, rest = parts[0], parts[1:]
+        params = dict(params or {})
+        body = body or {}
+        proplist = [key for key in params.pop('.proplist', '').split(',') if key]
+
+        with self._lock:
+            if not rest and method == 'GET':
+                rows = [row for row in self.rows[resource] if all(row.get(k) == v for k, v in params.items())]
+                return 200, self._project(rows, proplist)
+            if rest == ['print'] and method == 'POST':
+                # only equality query words are supported
+                words = [word.split('=', 1) for word in body.get('.query', []) if '=' in word]
+                rows = [row for row in self.rows[resource] if all(row.get(k) == v for k, v in words)]
+                return 200, self._project(rows, body.get('.proplist'))
+            if rest == ['monitor'] and method == 'POST' and resource == 'user':
+                return self._monitor(body.get('.id'))
+        if not rest and method == 'PUT':
+            return 201, self.add(resource, body)
+        with self._lock:
+            row = self._find(resource, rest[0]) if len(rest) == 1 else None
+            if row is None:
+                return 404, {'error': 404, 'message': 'no such item'}
+            if method == 'GET':
+                return 200, row
+            if method == 'PATCH':
+                row.update(body)
+                return 200, row
+            if method == 'DELETE':
+                self.rows[resource].remove(row)
+                return 204, None
+        return 400, {'error': 400, 'message': 'unsupported request'}
+
+
+def build_response(request, status_code, body):
+    """Wrap a JSON body in a `requests.Response`, readable whole or streamed."""
+    content = b'' if body is None else json.dumps(body).encode()
+    response = requests.Response()
+    response.status_code = status_code
+    response.reason = 'OK' if status_code < 400 else 'Error'
+    response.headers = CaseInsensitiveDict({'Content-Type': 'application/json', 'Content-Length': str(len(content))})
+    response.raw = io.BytesIO(content)
+    response.encoding = 'utf-8'
+    response.url = request.url
+    response.request = request
+    return response
+
+
+class FakeRouterAdapter(BaseAdapter):
+    """
+    requests transport adapter serving a `FakeRouter`, mounted on a `MikroTikUserManager`
+    session instead of a real connection pool.
+
+    `latency` seconds (plus up to `jitter`) are slept per request; `error_rate` of the
+    requests fail, half with a connection error and half with a 503, to exercise retries
+    and the circuit breaker.
+    """
+
+    def __init__(self, router, latency=0, jitter=0, error_rate=0, seed=None):
+        super().__init__()
+        self.router = router
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.requests = 0
+        self._random = random.Random(seed)
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        self.requests += 1
+        if self.latency or self.jitter:
+            time.sleep(self.latency + self._random.uniform(0, self.jitter))
+        if self.error_rate and self._random.random() < self.error_rate:
+            if self._random.random() < 0.5:
+                raise requests.exceptions.ConnectionError('Injected connection error', request=request)
+            return build_response(request, 503, {'error': 503, 'message': 'injected error'})
+        url = urlsplit(request.url)
+        body = json.loads(request.body) if request.body else None
+        status_code, payload = self.router.handle(request.method, url.path, parse_qsl(url.query), body)
+        return build_response(request, status_code, payload)
+
+    def close(self):
+        pass
+
+
+class RecordingAdapter(HTTPAdapter):
+    """
+    Regular HTTP adapter that also keeps the last full listing of each resource it saw, so a
+    live router's data can be saved with `save` and replayed with `FakeRouter.load`.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.recording = {}
+
+    def send(self, request, stream=False, **kwargs):
+        response = super().send(request, stream=stream, **kwargs)
+        url = urlsplit(request.url)
+        resource = url.path[len(API_PREFIX):].strip('/') if url.path.startswith(API_PREFIX) else None
+        # only unfiltered listings describe the whole resource
+        if request.method == 'GET' and resource in RESOURCES and not url.query and response.ok and not stream:
+            try:
+                self.recording[resource] = response.json()
+            except ValueError:
+                logger.warning(f"Not recording {request.url}: the body is not JSON")
+        return response
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.recording, f, indent=1)
@@ -1,48 +1,367 @@
 # mpi_src/usermanager/mikrotik_userman.py
+import codecs
+import json
+import re
+import threading
+import time
 import requests
-from typing import Optional, List, Dict, Any
+from urllib.parse import urlencode
+from requests.adapters import BaseAdapter, HTTPAdapter
+from typing import Optional, List, Dict, Any, Iterable, Iterator
 import logging
-from tenacity import retry, wait_fixed, stop_after_attempt, retry_if_exception_type
+from tenacity import Retrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+from .circuit_breaker import CircuitBreaker
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Verbs that can be repeated safely against the RouterOS REST API (PUT creates a new row)
+IDEMPOTENT_METHODS = frozenset({'GET', 'PATCH', 'DELETE'})
+# HTTP statuses worth retrying: the router (or a proxy in front of it) is busy or restarting
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+# Row ids such as '*1A' at the end of an endpoint
+ROW_ID_RE = re.compile(r'/\*[0-9A-Fa-f]+$')
+
+
+def endpoint_template(endpoint):
+    """Fold row ids so that latencies are grouped per endpoint, e.g. 'rest/user-manager/user/{id}'."""
+    return ROW_ID_RE.sub('/{id}', endpoint.split('?', 1)[0])
+
+
+def listing_endpoint(endpoint, proplist=None, filters=None):
+    """
+    Add RouterOS REST projection and filters to a listing endpoint: only the `proplist`
+    properties of the rows whose properties equal `filters` are returned,
+    e.g. 'rest/user-manager/session?user=alice&.proplist=.id,download'.
+    """
+    params = dict(filters or {})
+    if proplist:
+        params['.proplist'] = ','.join(proplist)
+    if not params:
+        return endpoint
+    return f"{endpoint}?{urlencode(params, safe=',*')}"
+
+
+class MikroTikError(Exception):
+    """A request to the MikroTik REST API failed."""
+
+    def __init__(self, message, method=None, url=None):
+        super().__init__(message)
+        self.method = method
+        self.url = url
+
+
+class MikroTikConnectionError(MikroTikError):
+    """The router could not be reached (connection refused, DNS, connect timeout...)."""
+
+
+class MikroTikTimeout(MikroTikError):
+    """The router accepted the connection but did not answer within the read timeout."""
+
+
+class MikroTikHTTPError(MikroTikError):
+    """The router answered with an error status."""
+
+    def __init__(self, message, status_code, method=None, url=None):
+        super().__init__(message, method, url)
+        self.status_code = status_code
+
+
+class MikroTikNotFound(MikroTikHTTPError):
+    """The requested row does not exist on the router (HTTP 404)."""
+
+
+class MikroTikResponseError(MikroTikError):
+    """The router answered with a body that is not valid JSON."""
+
+
+class MikroTikCircuitOpen(MikroTikError):
+    """The router's circuit breaker is open after repeated failures; the call was not attempted."""
+
+
+def is_transient(exc):
+    """Whether a failed request may succeed if retried."""
+    if isinstance(exc, MikroTikHTTPError):
+        return exc.status_code in RETRY_STATUSES
+    return isinstance(exc, (MikroTikConnectionError, MikroTikTimeout))
+
+
+class JsonArrayParser:
+    """
+    Incremental parser for a JSON array received in text chunks: `feed` returns the items
+    completed by each chunk, so only the item being parsed is held in memory, and `close`
+    checks that the array was complete. Raises ValueError on invalid or truncated input; an
+    empty input yields nothing.
+    """
+
+    def __init__(self):
+        self.decoder = json.JSONDecoder()
+        self.buffer = ''
+        self.opened = self.closed = False
+
+    def feed(self, chunk: str) -> List[Any]:
+        buffer = self.buffer + chunk
+        items = []
+        pos = 0
+        while pos < len(buffer):
+            char = buffer[pos]
+            if char in ' \t\r\n' or (self.opened and char == ','):
+                pos += 1
+            elif self.closed:
+                raise ValueError(f"Unexpected data after the end of the JSON array: {buffer[pos:pos + 20]!r}")
+            elif not self.opened:
+                if char != '[':
+                    raise ValueError(f"Expected a JSON array, got {buffer[pos:pos + 20]!r}")
+                self.opened = True
+                pos += 1
+            elif char == ']':
+                self.closed = True
+                pos += 1
+            else:
+                try:
+                    item, pos = self.decoder.raw_decode(buffer, pos)
+                except ValueError:
+                    # the item is not complete yet, wait for the next chunk
+                    break
+                items.append(item)
+        self.buffer = buffer[pos:]
+        return items
+
+    def close(self) -> None:
+        if self.buffer.strip() or (self.opened and not self.closed):
+            raise ValueError("Truncated JSON array")
+
+
+def iter_json_array(chunks: Iterable[str]) -> Iterator[Any]:
+    """Incrementally parse a JSON array received in text `chunks`, yielding its items one at a time."""
+    parser = JsonArrayParser()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    parser.close()
+
+
+class LatencyHistogram:
+    """Thread-safe per-endpoint latency histogram, in seconds."""
+
+    BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+
+    def observe(self, endpoint, seconds):
+        with self._lock:
+            entry = self._endpoints.get(endpoint)
+            if entry is None:
+                entry = self._endpoints[endpoint] = {'count': 0, 'sum': 0.0, 'buckets': [0] * (len(self.BUCKETS) + 1)}
+            entry['count'] += 1
+            entry['sum'] += seconds
+            index = next((i for i, bound in enumerate(self.BUCKETS) if seconds <= bound), len(self.BUCKETS))
+            entry['buckets'][index] += 1
+
+    def snapshot(self, reset=False):
+        """
+        Return ``{endpoint: {'count', 'sum', 'avg', 'buckets'}}``, where buckets maps each upper
+        bound (``'+Inf'`` for the last one) to the number of requests that took at most that long.
+        """
+        labels = [str(bound) for bound in self.BUCKETS] + ['+Inf']
+        with self._lock:
+            endpoints, data = self._endpoints, {}
+            for endpoint, entry in endpoints.items():
+                cumulative, buckets = 0, {}
+                for label, count in zip(labels, entry['buckets']):
+                    cumulative += count
+                    buckets[label] = cumulative
+                data[endpoint] = {
+                    'count': entry['count'],
+                    'sum': round(entry['sum'], 3),
+                    'avg': round(entry['sum'] / entry['count'], 3),
+                    'buckets': buckets,
+                }
+            if reset:
+                self._endpoints = {}
+        return data
+
+    @staticmethod
+    def merge(*snapshots):
+        """Combine snapshots taken by different processes, e.g. the steps of one router sync."""
+        data = {}
+        for snapshot in snapshots:
+            for endpoint, entry in (snapshot or {}).items():
+                merged = data.setdefault(endpoint, {'count': 0, 'sum': 0.0, 'buckets': {}})
+                merged['count'] += entry['count']
+                merged['sum'] = round(merged['sum'] + entry['sum'], 3)
+                for label, count in entry['buckets'].items():
+                    merged['buckets'][label] = merged['buckets'].get(label, 0) + count
+        for entry in data.values():
+            entry['avg'] = round(entry['sum'] / entry['count'], 3) if entry['count'] else 0
+        return data
+
 
 class MikroTikUserManager:
-    def __init__(self, router_ip: str, router_username: str, router_password: str):
+    """
+    Client for the RouterOS User Manager REST API.
+
+    Requests share one pooled session per router (`pool_size` keep-alive connections), use
+    separate connect/read timeouts, and idempotent requests are retried with jittered
+    exponential backoff on transient failures. Failures raise `MikroTikError` subclasses;
+    per-endpoint latencies are collected in `self.latency`. After `breaker_failures`
+    consecutive transient failures the router's circuit breaker opens and calls fail fast
+    with `MikroTikCircuitOpen` (0 disables the breaker). A requests `adapter`, such as
+    `mikrotik_fake.FakeRouterAdapter`, replaces the HTTP connection pool.
+    """
+
+    def __init__(
+        self,
+        router_ip: str,
+        router_username: str,
+        router_password: str,
+        pool_size: int = 10,
+        connect_timeout: float = 3.05,
+        read_timeout: float = 10,
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
+        retry_backoff_max: float = 8,
+        breaker_failures: int = 5,
+        breaker_reset_timeout: float = 60,
+        stream_chunk_size: int = 64 * 1024,
+        adapter: Optional[BaseAdapter] = None,
+    ):
         self.router_ip = router_ip.rstrip('/')
         self.session = requests.Session()
         self.session.auth = (router_username, router_password)
         self.session.headers.update({'Content-Type': 'application/json'})
-
-    # @retry(
-    #     wait=wait_fixed(3),  # Wait 3 seconds between retries
-    #     stop=stop_after_attempt(5),  # Stop after 5 attempts
-    #     retry=retry_if_exception_type((requests.exceptions.RequestException,))
-    # )
-    def _request(self, method: str, endpoint: str, data: Optional[Dict[str, Any]] = None) -> Any:
-        url = f"{self.router_ip}/{endpoint.lstrip('/')}"
+        adapter = adapter or HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+        self.latency = LatencyHistogram()
+        self.stream_chunk_size = stream_chunk_size
+        self.breaker = CircuitBreaker(self.router_ip, breaker_failures, breaker_reset_timeout) if breaker_failures else None
+
+    def _request(
+        self, method: str, endpoint: str, data: Optional[Dict[str, Any]] = None, idempotent: Optional[bool] = None,
+        stream: bool = False,
+    ) -> Any:
+        """
+        Send a request and return the decoded JSON body (None when empty), or the open
+        response when `stream` is set. `idempotent` defaults to whether the verb may be
+        retried; read-only commands sent with POST can opt in.
+        """
+        method = method.upper()
+        if self.breaker is None:
+            return self._send_with_retries(method, endpoint, data, idempotent, stream)
+        if not self.breaker.allow_request():
+            raise MikroTikCircuitOpen(f"Circuit breaker for {self.router_ip} is open, not sending {method} {endpoint}", method)
+        try:
+            result = self._send_with_retries(method, endpoint, data, idempotent, stream)
+        except MikroTikError as e:
+            # only failures of the router itself count; e.g. a 404 is a healthy answer
+            if is_transient(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        return result
+
+    def _send_with_retries(
+        self, method: str, endpoint: str, data: Optional[Dict[str, Any]] = None, idempotent: Optional[bool] = None,
+        stream: bool = False,
+    ) -> Any:
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        if not idempotent or self.max_retries <= 0:
+            return self._send(method, endpoint, data, stream)
+        retrying = Retrying(
+            stop=stop_after_attempt(self.max_retries + 1),
+            wait=wait_random_exponential(multiplier=self.retry_backoff, max=self.retry_backoff_max),
+            retry=retry_if_exception(is_transient),
+            before_sleep=lambda state: logger.warning(
+                f"{method} {endpoint} failed ({state.outcome.exception()}), retry {state.attempt_number}/{self.max_retries}"
+            ),
+            reraise=True,
+        )
+        return retrying(self._send, method, endpoint, data, stream)
+
+    def _send(self, method: str, endpoint: str, data: Optional[Dict[str, Any]] = None, stream: bool = False) -> Any:
+        endpoint = endpoint.lstrip('/')
+        url = f"{self.router_ip}/{endpoint}"
+        logger.debug(f"{method} request to {url} with data: {data}")
+        start = time.monotonic()
         try:
-            logger.info(f"{method.upper()} request to {url} with data: {data}")
-            response = self.session.request(method=method.upper(), url=url, json=data, timeout=10)
-            response.raise_for_status()
-            return response.json() if response.content else None
-        except:
-            pass
-        # except requests.exceptions.HTTPError as http_err:
-        #     # Log detailed error response for debugging 400 errors
-        #     if response.status_code == 400:
-        #         logger.error(f"400 Bad Request: {response.text}")
-        #     else:
-        #         logger.error(f"HTTP error {response.status_code} for {url}: {response.text}")
-        #     raise
-        # except requests.exceptions.RequestException as req_err:
-        #     logger.error(f"Request exception for {url}: {req_err}")
-        #     raise
+            response = self.session.request(method=method, url=url, json=data, timeout=self.timeout, stream=stream)
+        except requests.exceptions.ConnectTimeout as e:
+            raise MikroTikConnectionError(f"Timed out connecting to {url}: {e}", method, url) from e
+        except requests.exceptions.Timeout as e:
+            raise MikroTikTimeout(f"Timed out waiting for {url}: {e}", method, url) from e
+        except requests.exceptions.ConnectionError as e:
+            raise MikroTikConnectionError(f"Could not connect to {url}: {e}", method, url) from e
+        except requests.exceptions.RequestException as e:
+            raise MikroTikError(f"{method} request to {url} failed: {e}", method, url) from e
+        finally:
+            self.latency.observe(f"{method} {endpoint_template(endpoint)}", time.monotonic() - start)
+
+        if not response.ok:
+            error_class = MikroTikNotFound if response.status_code == 404 else MikroTikHTTPError
+            raise error_class(
+                f"{method} request to {url} returned {response.status_code}: {response.text[:200]}",
+                response.status_code, method, url,
+            )
+        if stream:
+            return response
+        if not response.content:
+            return None
+        try:
+            return response.json()
+        except ValueError as e:
+            raise MikroTikResponseError(f"Invalid JSON from {url}: {e}", method, url) from e
+
+    def _iter_rows(self, endpoint: str) -> Iterator[Dict[str, Any]]:
+        """
+        Stream the rows of a listing endpoint, parsing them as they arrive instead of loading
+        the whole body. Only establishing the response is retried: rows already yielded
+        cannot be taken back, so a failure mid-body is raised to the consumer.
+        """
+        response = self._request('GET', endpoint, stream=True)
+        url = response.url
+        decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')()
+        try:
+            chunks = (decoder.decode(chunk) for chunk in response.iter_content(self.stream_chunk_size))
+            yield from iter_json_array(chunks)
+        except requests.exceptions.Timeout as e:
+            raise MikroTikTimeout(f"Timed out reading {url}: {e}", 'GET', url) from e
+        except requests.exceptions.RequestException as e:
+            raise MikroTikConnectionError(f"Connection lost while reading {url}: {e}", 'GET', url) from e
+        except ValueError as e:
+            raise MikroTikResponseError(f"Invalid JSON from {url}: {e}", 'GET', url) from e
+        finally:
+            response.close()
+
+    def _list(self, endpoint: str, proplist: Optional[List[str]] = None, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        return self._request('GET', listing_endpoint(endpoint, proplist, filters)) or []
+
+    def query(self, endpoint: str, proplist: Optional[List[str]] = None, query: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Run a `print` command on a listing endpoint, for filters plain GET parameters cannot
+        express: `query` is a list of RouterOS query words evaluated by the router, e.g.
+        ``['user=alice', 'status=start', '#&']`` or ``['download>1000000']``.
+        """
+        data = {}
+        if proplist:
+            data['.proplist'] = list(proplist)
+        if query:
+            data['.query'] = list(query)
+        # `print` is read-only, so it is retried like a GET
+        return self._request('POST', f"{endpoint.rstrip('/')}/print", data=data, idempotent=True) or []
 
     # ------------------------------------------------ users
-    def get_users(self) -> List[Dict[str, Any]]:
-        return self._request('GET', 'rest/user-manager/user') or []
+    def get_users(self, proplist: Optional[List[str]] = None, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        return self._list('rest/user-manager/user', proplist, filters)
 
     def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
         return self._request('GET', f'rest/user-manager/user/{user_id}')
@@ -59,16 +378,12 @@ class MikroTikUserManager:
     # -- user usage
     def monitor_user_usage(self, user_id: str) -> Optional[Dict[str, Any]]:
         data = {"once": True, ".id": user_id}
-
-        try:
-            return self._request('POST', 'rest/user-manager/user/monitor', data=data)
-        except Exception as e:
-            logger.error(f"Error monitoring usage for user '{user_id}': {e}")
-            raise RuntimeError(f"Error monitoring usage for user '{user_id}': {e}")
+        # `monitor` is a read-only command, so it is retried like a GET
+        return self._request('POST', 'rest/user-manager/user/monitor', data=data, idempotent=True)
         
     # ------------------------------------------------ profiles
-    def get_profiles(self) -> List[Dict[str, Any]]:
-        return self._request('GET', 'rest/user-manager/profile') or []
+    def get_profiles(self, proplist: Optional[List[str]] = None, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        return self._list('rest/user-manager/profile', proplist, filters)
 
     def create_profile(self, profile_data: Dict[str, Any]) -> Dict[str, Any]:
         return self._request('PUT', 'rest/user-manager/profile', data=profile_data)
@@ -80,8 +395,8 @@ class MikroTikUserManager:
         self._request('DELETE', f'rest/user-manager/profile/{profile_id}')
 
     # ------------------------------------------------ user profiles
-    def get_user_profiles(self) -> List[Dict[str, Any]]:
-        return self._request('GET', 'rest/user-manager/user-profile') or []
+    def get_user_profiles(self, proplist: Optional[List[str]] = None, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        return self._list('rest/user-manager/user-profile', proplist, filters)
 
     def get_user_profile(self, user_profile_id: str) -> Optional[Dict[str, Any]]:
         return self._request('GET', f'rest/user-manager/user-profile/{user_profile_id}')
@@ -96,8 +411,8 @@ class MikroTikUserManager:
         self._request('DELETE', f'rest/user-manager/user-profile/{user_profile_id}')
 
     # ------------------------------------------------ limitation
-    def get_limitations(self) -> List[Dict[str, Any]]:
-        return self._request('GET', 'rest/user-manager/limitation') or []
+    def get_limitations(self, proplist: Optional[List[str]] = None, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        return self._list('rest/user-manager/limitation', proplist, filters)
 
     def create_limitation(self, limitation_data: Dict[str, Any]) -> Dict[str, Any]:
         return self._request('PUT', 'rest/user-manager/limitation', data=limitation_data)
@@ -109,8 +424,8 @@ class MikroTikUserManager:
         self._request('DELETE', f'rest/user-manager/limitation/{limitation_id}')
 
     # ------------------------------------------------ profile limitation
-    def get_profile_limitations(self) -> List[Dict[str, Any]]:
-        return self._request('GET', 'rest/user-manager/profile-limitation') or []
+    def get_profile_limitations(self, proplist: Optional[List[str]] = None, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        return self._list('rest/user-manager/profile-limitation', proplist, filters)
 
     def create_profile_limitation(self, profile_limitation_data: Dict[str, Any]) -> Dict[str, Any]:
         return self._request('PUT', 'rest/user-manager/profile-limitation', data=profile_limitation_data)
@@ -122,42 +437,90 @@ class MikroTikUserManager:
         self._request('DELETE', f'rest/user-manager/profile-limitation/{profile_limitation_id}')
 
     # ------------------------------------------------ payments
-    def get_payments(self) -> List[Dict[str, Any]]:
-        return self._request('GET', 'rest/user-manager/payment') or []
+    def get_payments(self, proplist: Optional[List[str]] = None, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        return self._list('rest/user-manager/payment', proplist, filters)
 
     def get_payment(self, payment_id: str) -> Optional[Dict[str, Any]]:
         return self._request('GET', f'rest/user-manager/payment/{payment_id}')
 
     def create_payment(self, payment_data: Dict[str, Any]) -> Dict[str, Any]:
-        return self._request('PUT', 'rest/user-manager/payment', json=payment_data)
+        return self._request('PUT', 'rest/user-manager/payment', data=payment_data)
 
     def update_payment(self, payment_id: str, update_data: Dict[str, Any]) -> Dict[str, Any]:
-        return self._request('PATCH', f'rest/user-manager/payment/{payment_id}', json=update_data)
+        return self._request('PATCH', f'rest/user-manager/payment/{payment_id}', data=update_data)
 
     def delete_payment(self, payment_id: str) -> None:
         self._request('DELETE', f'rest/user-manager/payment/{payment_id}')
 
     # ------------------------------------------------ sessions
-    def get_sessions(self) -> List[Dict[str, Any]]:
-        return self._request('GET', 'rest/user-manager/session') or []
+    def get_sessions(self, proplist: Optional[List[str]] = None, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        return self._list('rest/user-manager/session', proplist, filters)
+
+    def iter_sessions(self, proplist: Optional[List[str]] = None, filters: Optional[Dict[str, Any]] = None) -> Iterator[Dict[str, Any]]:
+        """Like `get_sessions`, but yields the sessions while the (potentially huge) listing is downloaded."""
+        return self._iter_rows(listing_endpoint('rest/user-manager/session', proplist, filters))
 
     def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
         return self._request('GET', f'rest/user-manager/session/{session_id}')
 
-    def get_user_sessions(self, user_id: str) -> List[Dict[str, Any]]:
-        sessions = self.get_sessions()
-        return [session for session in sessions if session.get('user') == user_id]
+    def get_user_sessions(self, user_id: str, proplist: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Sessions of the user named `user_id`, filtered by the router."""
+        return self.get_sessions(proplist, {'user': user_id})
 
     def delete_session(self, session_id: str) -> None:
         self._request('DELETE', f'rest/user-manager/session/{session_id}')
 
+    def disconnect_user(self, username: str) -> int:
+        """
+        Drop the live PPP and hotspot connections of `username`, so the subscriber has to
+        authenticate again. Services the router does not run are skipped. Returns the number
+        of connections removed.
+        """
+        removed = 0
+        for endpoint, field in (('rest/ppp/active', 'name'), ('rest/ip/hotspot/active', 'user')):
+            try:
+                connections = self._list(endpoint, ['.id'], {field: username})
+            except MikroTikHTTPError as e:
+                logger.debug(f"Not disconnecting {username} from {endpoint}: {e}")
+                continue
+            for connection in connections:
+                try:
+                    self._request('DELETE', f"{endpoint}/{connection['.id']}")
+                except MikroTikNotFound:
+                    continue  # closed in the meantime
+                removed += 1
+        return removed
+
 
 # Initialize the MikroTik manager
 from django.conf import settings
+from django.utils.module_loading import import_string
+def transport_settings():
+    """
+    Transport options for `MikroTikUserManager` from the MIKROTIK_* Django settings.
+    MIKROTIK_TRANSPORT_ADAPTER, a factory (or its dotted path) returning a requests adapter,
+    swaps the HTTP transport, e.g. for a `FakeRouterAdapter` in benchmarks.
+    """
+    adapter_factory = getattr(settings, 'MIKROTIK_TRANSPORT_ADAPTER', None)
+    if isinstance(adapter_factory, str):
+        adapter_factory = import_string(adapter_factory)
+    return {
+        'adapter': adapter_factory() if adapter_factory else None,
+        'pool_size': getattr(settings, 'MIKROTIK_POOL_SIZE', 10),
+        'connect_timeout': getattr(settings, 'MIKROTIK_CONNECT_TIMEOUT', 3.05),
+        'read_timeout': getattr(settings, 'MIKROTIK_READ_TIMEOUT', 10),
+        'max_retries': getattr(settings, 'MIKROTIK_MAX_RETRIES', 3),
+        'retry_backoff': getattr(settings, 'MIKROTIK_RETRY_BACKOFF', 0.5),
+        'retry_backoff_max': getattr(settings, 'MIKROTIK_RETRY_BACKOFF_MAX', 8),
+        'breaker_failures': getattr(settings, 'MIKROTIK_BREAKER_FAILURES', 5),
+        'breaker_reset_timeout': getattr(settings, 'MIKROTIK_BREAKER_RESET_TIMEOUT', 60),
+    }
+
+
 def init_mikrotik_manager():
     return MikroTikUserManager(
         router_ip=settings.ROUTER_IP,
         router_username=settings.ROUTER_USERNAME,
-        router_password=settings.ROUTER_PASSWORD
+        router_password=settings.ROUTER_PASSWORD,
+        **transport_settings(),
     )
-
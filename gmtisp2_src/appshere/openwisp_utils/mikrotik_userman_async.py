@@ -0,0 +1,353 @@
+# mpi_src/usermanager/mikrotik_userman_async.py
+import asyncio
+import logging
+import time
+from typing import Optional, List, Dict, Any, Iterable, AsyncIterator
+
+import httpx
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+from .circuit_breaker import CircuitBreaker
+from .mikrotik_userman import (
+    IDEMPOTENT_METHODS,
+    JsonArrayParser,
+    LatencyHistogram,
+    MikroTikCircuitOpen,
+    MikroTikConnectionError,
+    MikroTikError,
+    MikroTikHTTPError,
+    MikroTikNotFound,
+    MikroTikResponseError,
+    MikroTikTimeout,
+    endpoint_template,
+    is_transient,
+    listing_endpoint,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncMikroTikUserManager:
+    """
+    asyncio counterpart of `MikroTikUserManager` with the same method surface.
+
+    Requests share one pooled `httpx.AsyncClient` (`pool_size` connections), and at most
+    `max_concurrency` of them are in flight at once, so callers can fan out with
+    `asyncio.gather` safely. Timeouts, retries, typed `MikroTikError` failures, latency
+    histogram and the per-router circuit breaker behave as in the sync client; both clients
+    share the breaker state of a router. An httpx `transport`, such as `httpx.MockTransport`,
+    replaces the HTTP connection pool.
+
+    An instance is bound to the event loop it is first used in; use it as an async
+    context manager (or call `aclose()`) so pooled connections are released.
+    """
+
+    def __init__(
+        self,
+        router_ip: str,
+        router_username: str,
+        router_password: str,
+        pool_size: int = 10,
+        connect_timeout: float = 3.05,
+        read_timeout: float = 10,
+        max_retries: int = 3,
+        retry_backoff: float = 0.5,
+        retry_backoff_max: float = 8,
+        breaker_failures: int = 5,
+        breaker_reset_timeout: float = 60,
+        stream_chunk_size: int = 64 * 1024,
+        max_concurrency: int = 10,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.router_ip = router_ip.rstrip('/')
+        self.client = httpx.AsyncClient(
+            base_url=self.router_ip,
+            auth=(router_username, router_password),
+            headers={'Content-Type': 'application/json'},
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            transport=transport,
+        )
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.retry_backoff_max = retry_backoff_max
+        self.latency = LatencyHistogram()
+        self.stream_chunk_size = stream_chunk_size
+        self.breaker = CircuitBreaker(self.router_ip, breaker_failures, breaker_reset_timeout) if breaker_failures else None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self.client.aclose()
+
+    async def _request(
+        self, method: str, endpoint: str, data: Optional[Dict[str, Any]] = None, idempotent: Optional[bool] = None,
+        stream: bool = False,
+    ) -> Any:
+        """
+        Send a request and return the decoded JSON body (None when empty), or the open
+        response when `stream` is set. `idempotent` defaults to whether the verb may be
+        retried; read-only commands sent with POST can opt in.
+        """
+        method = method.upper()
+        if self.breaker is None:
+            return await self._send_with_retries(method, endpoint, data, idempotent, stream)
+        if not self.breaker.allow_request():
+            raise MikroTikCircuitOpen(f"Circuit breaker for {self.router_ip} is open, not sending {method} {endpoint}", method)
+        try:
+            result = await self._send_with_retries(method, endpoint, data, idempotent, stream)
+        except MikroTikError as e:
+            # only failures of the router itself count; e.g. a 404 is a healthy answer
+            if is_transient(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        self.breaker.record_success()
+        return result
+
+    async def _send_with_retries(
+        self, method: str, endpoint: str, data: Optional[Dict[str, Any]] = None, idempotent: Optional[bool] = None,
+        stream: bool = False,
+    ) -> Any:
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        if not idempotent or self.max_retries <= 0:
+            return await self._send(method, endpoint, data, stream)
+        retrying = AsyncRetrying(
+            stop=stop_after_attempt(self.max_retries + 1),
+            wait=wait_random_exponential(multiplier=self.retry_backoff, max=self.retry_backoff_max),
+            retry=retry_if_exception(is_transient),
+            before_sleep=lambda state: logger.warning(
+                f"{method} {endpoint} failed ({state.outcome.exception()}), retry {state.attempt_number}/{self.max_retries}"
+            ),
+            reraise=True,
+        )
+        return await retrying(self._send, method, endpoint, data, stream)
+
+    async def _send(self, method: str, endpoint: str, data: Optional[Dict[str, Any]] = None, stream: bool = False) -> Any:
+        endpoint = endpoint.lstrip('/')
+        url = f"{self.router_ip}/{endpoint}"
+        logger.debug(f"{method} request to {url} with data: {data}")
+        request = self.client.build_request(method, f'/{endpoint}', json=data)
+        async with self.semaphore:
+            start = time.monotonic()
+            try:
+                response = await self.client.send(request, stream=stream)
+            except httpx.ConnectTimeout as e:
+                raise MikroTikConnectionError(f"Timed out connecting to {url}: {e}", method, url) from e
+            except httpx.TimeoutException as e:
+                raise MikroTikTimeout(f"Timed out waiting for {url}: {e}", method, url) from e
+            except httpx.TransportError as e:
+                raise MikroTikConnectionError(f"Could not connect to {url}: {e}", method, url) from e
+            except httpx.HTTPError as e:
+                raise MikroTikError(f"{method} request to {url} failed: {e}", method, url) from e
+            finally:
+                self.latency.observe(f"{method} {endpoint_template(endpoint)}", time.monotonic() - start)
+
+        if not response.is_success:
+            if stream:
+                await response.aread()
+                await response.aclose()
+            error_class = MikroTikNotFound if response.status_code == 404 else MikroTikHTTPError
+            raise error_class(
+                f"{method} request to {url} returned {response.status_code}: {response.text[:200]}",
+                response.status_code, method, url,
+            )
+        if stream:
+            return response
+        if not response.content:
+            return None
+        try:
+            return response.json()
+        except ValueError as e:
+            raise MikroTikResponseError(f"Invalid JSON from {url}: {e}", method, url) from e
+
+    async def _iter_rows(self, endpoint: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Stream the rows of a listing endpoint, parsing them as they arrive instead of loading
+        the whole body. Only establishing the response is retried: rows already yielded
+        cannot be taken back, so a failure mid-body is raised to the consumer.
+        """
+        response = await self._request('GET', endpoint, stream=True)
+        url = str(response.url)
+        parser = JsonArrayParser()
+        try:
+            async for chunk in response.aiter_text(self.stream_chunk_size):
+                for row in parser.feed(chunk):
+                    yield row
+            parser.close()
+        except httpx.TimeoutException as e:
+            raise MikroTikTimeout(f"Timed out reading {url}: {e}", 'GET', url) from e
+        except httpx.HTTPError as e:
+            raise MikroTikConnectionError(f"Connection lost while reading {url}: {e}", 'GET', url) from e
+        except ValueError as e:
+            raise MikroTikResponseError(f"Invalid JSON from {url}: {e}", 'GET', url) from e
+        finally:
+            await response.aclose()
+
+    async def _list(self, endpoint: str, proplist: Optional[List[str]] = None, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        return await self._request('GET', listing_endpoint(endpoint, proplist, filters)) or []
+
+    async def query(self, endpoint: str, proplist: Optional[List[str]] = None, query: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Run a `print` command on a listing endpoint with RouterOS query words, see `MikroTikUserManager.query`."""
+        data = {}
+        if proplist:
+            data['.proplist'] = list(proplist)
+        if query:
+            data['.query'] = list(query)
+        # `print` is read-only, so it is retried like a GET
+        return await self._request('POST', f"{endpoint.rstrip('/')}/print", data=data, idempotent=True) or []
+
+    async def gather(self, calls: Iterable) -> List[Any]:
+        """Run many manager coroutines concurrently, bounded by the manager's concurrency limit."""
+        return await asyncio.gather(*calls)
+
+    # ------------------------------------------------ users
+    async def get_users(self, proplist: Optional[List[str]] = None, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        return await self._list('rest/user-manager/user', proplist, filters)
+
+    async def get_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        return await self._request('GET', f'rest/user-manager/user/{user_id}')
+
+    async def create_user(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._request('PUT', 'rest/user-manager/user', data=user_data)
+
+    async def update_user(self, user_id: str, user_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return await self._request('PATCH', f'rest/user-manager/user/{user_id}', data=user_data)
+
+    async def delete_user(self, user_id: str) -> None:
+        await self._request('DELETE', f'rest/user-manager/user/{user_id}')
+
+    # -- user usage
+    async def monitor_user_usage(self, user_id: str) -> Optional[Dict[str, Any]]:
+        data = {"once": True, ".id": user_id}
+        # `monitor` is a read-only command, so it is retried like a GET
+        return await self._request('POST', 'rest/user-manager/user/monitor', data=data, idempotent=True)
+
+    async def monitor_users_usage(self, user_ids: Iterable[str]) -> Dict[str, Any]:
+        """
+        Monitor many users concurrently; returns the monitor reply keyed by user ID. Users
+        whose call failed are left out and logged, as `billings.sync.monitor_users_usage` does.
+        """
+        user_ids = list(user_ids)
+        replies = await asyncio.gather(*(self.monitor_user_usage(user_id) for user_id in user_ids), return_exceptions=True)
+        usage = {}
+        for user_id, reply in zip(user_ids, replies):
+            if isinstance(reply, MikroTikError):
+                logger.debug(f"Error monitoring usage for user ID {user_id}: {reply}")
+            elif isinstance(reply, BaseException):
+                raise reply
+            elif reply:
+                usage[user_id] = reply
+        return usage
+
+    # ------------------------------------------------ profiles
+    async def get_profiles(self, proplist: Optional[List[str]] = None, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        return await self._list('rest/user-manager/profile', proplist, filters)
+
+    async def create_profile(self, profile_data: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._request('PUT', 'rest/user-manager/profile', data=profile_data)
+
+    async def update_profile(self, profile_id: str, profile_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return await self._request('PATCH', f'rest/user-manager/profile/{profile_id}', data=profile_data)
+
+    async def delete_profile(self, profile_id: str) -> None:
+        await self._request('DELETE', f'rest/user-manager/profile/{profile_id}')
+
+    # ------------------------------------------------ user profiles
+    async def get_user_profiles(self, proplist: Optional[List[str]] = None, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        return await self._list('rest/user-manager/user-profile', proplist, filters)
+
+    async def get_user_profile(self, user_profile_id: str) -> Optional[Dict[str, Any]]:
+        return await self._request('GET', f'rest/user-manager/user-profile/{user_profile_id}')
+
+    async def create_user_profile(self, user_profile_data: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._request('PUT', 'rest/user-manager/user-profile', data=user_profile_data)
+
+    async def update_user_profile(self, user_profile_id: str, user_profile_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return await self._request('PATCH', f'rest/user-manager/user-profile/{user_profile_id}', data=user_profile_data)
+
+    async def delete_user_profile(self, user_profile_id: str) -> None:
+        await self._request('DELETE', f'rest/user-manager/user-profile/{user_profile_id}')
+
+    # ------------------------------------------------ limitation
+    async def get_limitations(self, proplist: Optional[List[str]] = None, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        return await self._list('rest/user-manager/limitation', proplist, filters)
+
+    async def create_limitation(self, limitation_data: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._request('PUT', 'rest/user-manager/limitation', data=limitation_data)
+
+    async def update_limitation(self, limitation_id: str, limitation_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return await self._request('PATCH', f'rest/user-manager/limitation/{limitation_id}', data=limitation_data)
+
+    async def delete_limitation(self, limitation_id: str) -> None:
+        await self._request('DELETE', f'rest/user-manager/limitation/{limitation_id}')
+
+    # ------------------------------------------------ profile limitation
+    async def get_profile_limitations(self, proplist: Optional[List[str]] = None, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        return await self._list('rest/user-manager/profile-limitation', proplist, filters)
+
+    async def create_profile_limitation(self, profile_limitation_data: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._request('PUT', 'rest/user-manager/profile-limitation', data=profile_limitation_data)
+
+    async def update_profile_limitation(self, profile_limitation_id: str, profile_limitation_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return await self._request('PATCH', f'rest/user-manager/profile-limitation/{profile_limitation_id}', data=profile_limitation_data)
+
+    async def delete_profile_limitation(self, profile_limitation_id: str) -> None:
+        await self._request('DELETE', f'rest/user-manager/profile-limitation/{profile_limitation_id}')
+
+    # ------------------------------------------------ payments
+    async def get_payments(self, proplist: Optional[List[str]] = None, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        return await self._list('rest/user-manager/payment', proplist, filters)
+
+    async def get_payment(self, payment_id: str) -> Optional[Dict[str, Any]]:
+        return await self._request('GET', f'rest/user-manager/payment/{payment_id}')
+
+    async def create_payment(self, payment_data: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._request('PUT', 'rest/user-manager/payment', data=payment_data)
+
+    async def update_payment(self, payment_id: str, update_data: Dict[str, Any]) -> Dict[str, Any]:
+        return await self._request('PATCH', f'rest/user-manager/payment/{payment_id}', data=update_data)
+
+    async def delete_payment(self, payment_id: str) -> None:
+        await self._request('DELETE', f'rest/user-manager/payment/{payment_id}')
+
+    # ------------------------------------------------ sessions
+    async def get_sessions(self, proplist: Optional[List[str]] = None, filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        return await self._list('rest/user-manager/session', proplist, filters)
+
+    def iter_sessions(self, proplist: Optional[List[str]] = None, filters: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Like `get_sessions`, but yields the sessions while the (potentially huge) listing is downloaded."""
+        return self._iter_rows(listing_endpoint('rest/user-manager/session', proplist, filters))
+
+    async def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        return await self._request('GET', f'rest/user-manager/session/{session_id}')
+
+    async def get_user_sessions(self, user_id: str, proplist: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Sessions of the user named `user_id`, filtered by the router."""
+        return await self.get_sessions(proplist, {'user': user_id})
+
+    async def delete_session(self, session_id: str) -> None:
+        await self._request('DELETE', f'rest/user-manager/session/{session_id}')
+
+
+# Initialize the async MikroTik manager
+from django.conf import settings
+from .mikrotik_userman import transport_settings
+def init_async_mikrotik_manager():
+    options = transport_settings()
+    # a requests adapter cannot drive httpx; tests pass an httpx `transport` instead
+    options.pop('adapter')
+    return AsyncMikroTikUserManager(
+        router_ip=settings.ROUTER_IP,
+        router_username=settings.ROUTER_USERNAME,
+        router_password=settings.ROUTER_PASSWORD,
+        max_concurrency=getattr(settings, 'MIKROTIK_ASYNC_MAX_CONCURRENCY', 10),
+        **options,
+    )
@@ -269,9 +269,19 @@ CELERYD_CONCURRENCY = 4
 CELERYD_PREFETCH_MULTIPLIER = 1
 
 CELERY_BEAT_SCHEDULE = {
-    'sync_data_from_mikrotik_every_30_seconds': {
+    'sync_data_from_mikrotik_heartbeat': {
+        # routers are synced every MIKROTIK_SYNC_INTERVAL seconds or slower, see billings.scheduler
         'task': 'appshere.billings.tasks.sync_data_from_mikrotik',
-        'schedule': timedelta(seconds=30),
+        'schedule': timedelta(seconds=10),
+    },
+    'drain_mikrotik_outbox_every_minute': {
+        'task': 'appshere.billings.tasks.drain_outbox',
+        'schedule': timedelta(seconds=60),
+    },
+    'enforce_mikrotik_quotas_every_minute': {
+        # breaches are enforced right after the sync records them; this retries and lifts them
+        'task': 'appshere.billings.tasks.enforce_quotas',
+        'schedule': timedelta(seconds=60),
     },
     'password_expiry_email': {
         'task': 'openwisp_users.tasks.password_expiration_email',
@@ -19,4 +19,6 @@ django-widget-tweaks
 django-recaptcha
 django-debug-toolbar
 django-redis
-pillow
\ No newline at end of file
+pillow
+httpx
+tenacity